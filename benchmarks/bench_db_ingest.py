@@ -0,0 +1,123 @@
+"""
+SQLite 寫入負載測試
+
+以 32 個併發上傳者持續寫入檢測記錄（含統計彙總），比較：
+  - direct: 每筆記錄各自 commit（舊做法，預設 journal 模式）
+  - writer: WAL + 單一寫入執行緒 group commit（DetectionWriter）
+
+用法:
+    python benchmarks/bench_db_ingest.py --uploaders 32 --rows 5000 --output ingest.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from src.models.user import db  # noqa: E402
+from src.models.detection import Detection  # noqa: E402
+from src.services.database import configure_engine, engine_options  # noqa: E402
+from src.services.db_writer import DetectionWriter  # noqa: E402
+from src.services.rollups import record_detection  # noqa: E402
+
+
+def make_app(db_path, tuned):
+    app = Flask(__name__)
+    uri = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri) if tuned else {
+        'connect_args': {'timeout': 15, 'check_same_thread': False}
+    }
+    db.init_app(app)
+    with app.app_context():
+        if tuned:
+            configure_engine(db.engine)
+        db.create_all()
+    return app
+
+
+def fields(i):
+    return dict(
+        camera_id=f'cam{i % 50:03d}',
+        location='負載測試',
+        bear_detected=i % 20 == 0,
+        confidence=0.9,
+        detected_at=datetime.utcnow(),
+        image_filename=f'{i}.jpg'
+    )
+
+
+def run_direct(app, rows, uploaders):
+    errors = []
+
+    def insert(i):
+        with app.app_context():
+            try:
+                detection = Detection(**fields(i))
+                db.session.add(detection)
+                record_detection(detection)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=uploaders) as pool:
+        list(pool.map(insert, range(rows)))
+    return time.perf_counter() - start, errors
+
+
+def run_writer(app, rows, uploaders):
+    writer = DetectionWriter(app, batch_size=64, flush_ms=10)
+    errors = []
+
+    def insert(i):
+        try:
+            writer.write(fields(i))
+        except Exception as e:
+            errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=uploaders) as pool:
+        list(pool.map(insert, range(rows)))
+    return time.perf_counter() - start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 寫入負載測試')
+    parser.add_argument('--uploaders', type=int, default=32)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    results = {}
+    for mode, runner, tuned in (('direct', run_direct, False), ('writer', run_writer, True)):
+        with tempfile.TemporaryDirectory() as workdir:
+            app = make_app(os.path.join(workdir, 'ingest.db'), tuned)
+            elapsed, errors = runner(app, args.rows, args.uploaders)
+            with app.app_context():
+                written = Detection.query.count()
+                db.engine.dispose()
+        results[mode] = {
+            'rows': args.rows,
+            'uploaders': args.uploaders,
+            'seconds': elapsed,
+            'inserts_per_second': written / elapsed,
+            'written': written,
+            'errors': len(errors),
+        }
+        print(f"{mode:>7}: {written / elapsed:9.1f} 筆/秒  寫入 {written}  錯誤 {len(errors)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
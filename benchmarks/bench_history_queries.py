@@ -0,0 +1,124 @@
+"""
+檢測歷史查詢基準測試
+
+在暫存 SQLite 資料庫中逐步灌入檢測記錄（預設到 100 萬筆），於每個檢查點量測
+/api/recent-detections 使用的查詢（第一頁、深層游標分頁、相機篩選、只看有熊）
+的 p50/p99 延遲，確認延遲不隨歷史資料量增加。
+
+用法:
+    python benchmarks/bench_history_queries.py --rows 1000000 --output history.json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from src.models.user import db  # noqa: E402
+from src.models.detection import Detection  # noqa: E402,F401
+from src.services.detection_queries import ensure_indexes, query_detections  # noqa: E402
+
+CAMERAS = [f'cam{i:03d}' for i in range(200)]
+LOCATIONS = [f'樣區{i:02d}' for i in range(20)]
+
+
+def seed(db_path, start_id, count, base_time):
+    connection = sqlite3.connect(db_path)
+    rng = random.Random(start_id)
+    rows = []
+    for i in range(start_id, start_id + count):
+        bear = rng.random() < 0.05
+        rows.append((
+            i,
+            rng.choice(CAMERAS),
+            rng.choice(LOCATIONS),
+            bear,
+            rng.random() if bear else 0.0,
+            (base_time + timedelta(seconds=i * 3)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+            f'{i}.jpg',
+            f'{i}_detected.jpg' if bear else None,
+        ))
+    connection.executemany(
+        'INSERT INTO detections (id, camera_id, location, bear_detected, confidence, detected_at, '
+        'image_filename, result_image_filename) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows
+    )
+    connection.commit()
+    connection.close()
+
+
+def measure(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'p50_ms': timings[len(timings) // 2],
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+
+def deep_page():
+    cursor = None
+    for _ in range(20):
+        _, cursor = query_detections(cursor=cursor, limit=100)
+
+
+def run(total_rows, checkpoints, iterations):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            ensure_indexes()
+
+        base_time = datetime(2024, 1, 1)
+        seeded = 0
+        for checkpoint in checkpoints:
+            seed(db_path, seeded + 1, checkpoint - seeded, base_time)
+            seeded = checkpoint
+            with app.app_context():
+                result = {
+                    'rows': seeded,
+                    'first_page': measure(lambda: query_detections(limit=100), iterations),
+                    'deep_cursor_20_pages': measure(deep_page, max(1, iterations // 10)),
+                    'camera_filter': measure(lambda: query_detections(camera_id=random.choice(CAMERAS), limit=100), iterations),
+                    'bear_only': measure(lambda: query_detections(bear_only=True, limit=100), iterations),
+                }
+            results.append(result)
+            print(f"{seeded:>9} 筆  第一頁 p99 {result['first_page']['p99_ms']:6.2f} ms  "
+                  f"相機篩選 p99 {result['camera_filter']['p99_ms']:6.2f} ms  "
+                  f"只看有熊 p99 {result['bear_only']['p99_ms']:6.2f} ms")
+            if seeded >= total_rows:
+                break
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='檢測歷史查詢基準測試')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    checkpoints = sorted({c for c in (10_000, 100_000, 500_000, args.rows) if c <= args.rows})
+    results = run(args.rows, checkpoints, args.iterations)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+圖片處理流程基準測試
+
+比較舊流程（存檔 → 讀檔送推論 → cv2.imread → img.copy() → cv2.imwrite）
+與記憶體流程（解碼一次、原地標註、記憶體編碼後寫檔一次）在 1080p 與 4K
+相機影像上的每張耗時與複製位元組數。
+
+用法:
+    python benchmarks/bench_image_pipeline.py --iterations 20 --output results.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.image_pipeline import UploadedImage  # noqa: E402
+
+RESOLUTIONS = {
+    '1080p': (1080, 1920),
+    '4k': (2160, 3840),
+}
+
+# 模擬檢測結果
+DETECTIONS = [
+    {'box': [120, 200, 620, 780], 'score': 0.91, 'label': 'taiwan black bear'},
+    {'box': [900, 300, 1300, 900], 'score': 0.67, 'label': 'bear'},
+]
+
+
+def make_trail_camera_jpeg(height, width, seed=0):
+    """產生帶有雜訊與漸層的合成相機影像"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 25, (height, width, 3)).astype(np.float32)
+    frame = np.clip(gradient * 0.6 + noise + 40, 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    assert ok
+    return encoded.tobytes()
+
+
+def draw(img):
+    for det in DETECTIONS:
+        xmin, ymin, xmax, ymax = map(int, det['box'])
+        cv2.rectangle(img, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+        cv2.putText(img, f"{det['label']}: {det['score']:.2f}", (xmin, ymin - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2, cv2.LINE_AA)
+
+
+def legacy_pipeline(data, workdir):
+    """舊流程：三次讀寫檔、兩次整張解碼/複製"""
+    copied = 0
+    path = os.path.join(workdir, 'legacy.jpg')
+    with open(path, 'wb') as f:
+        f.write(data)
+    copied += len(data)
+
+    # detect_bear 重新讀檔送往推論端
+    with open(path, 'rb') as f:
+        payload = f.read()
+    copied += len(payload)
+
+    # _draw_detections 再次讀檔並解碼
+    img = cv2.imread(path)
+    copied += len(data) + img.nbytes
+    img_display = img.copy()
+    copied += img_display.nbytes
+    draw(img_display)
+
+    out_path = os.path.join(workdir, 'legacy_detected.jpg')
+    cv2.imwrite(out_path, img_display)
+    copied += os.path.getsize(out_path)
+    return copied
+
+
+def in_memory_pipeline(data, workdir):
+    """記憶體流程：解碼一次、原地標註、每個產出只寫一次"""
+    copied = 0
+    image = UploadedImage(data, 'memory.jpg')
+
+    with open(os.path.join(workdir, 'memory.jpg'), 'wb') as f:
+        f.write(image.data)
+    copied += len(data)
+
+    img = image.array
+    copied += img.nbytes
+    draw(img)
+
+    ok, encoded = cv2.imencode('.jpg', img)
+    with open(os.path.join(workdir, 'memory_detected.jpg'), 'wb') as f:
+        f.write(encoded)
+    copied += encoded.nbytes
+    return copied
+
+
+def run(iterations):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (height, width) in RESOLUTIONS.items():
+            data = make_trail_camera_jpeg(height, width)
+            results[name] = {'jpeg_bytes': len(data)}
+            for label, fn in (('legacy', legacy_pipeline), ('in_memory', in_memory_pipeline)):
+                fn(data, workdir)  # 暖機
+                timings = []
+                copied = 0
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    copied = fn(data, workdir)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                results[name][label] = {
+                    'bytes_copied': copied,
+                    'mean_ms': sum(timings) / len(timings) * 1000,
+                    'p50_ms': timings[len(timings) // 2] * 1000,
+                    'max_ms': timings[-1] * 1000,
+                }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='圖片處理流程基準測試')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    for name, result in results.items():
+        for label in ('legacy', 'in_memory'):
+            r = result[label]
+            print(f"{name:>6} {label:>10}: {r['mean_ms']:8.2f} ms/張  複製 {r['bytes_copied'] / 1e6:8.2f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
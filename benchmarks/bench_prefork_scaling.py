@@ -0,0 +1,108 @@
+"""
+pre-fork worker 擴展基準測試
+
+以不同 worker 數啟動 gunicorn（gunicorn.conf.py），對 /api/detect 施加固定併發，
+量測吞吐量，以及每個 worker 的 RSS 與 PSS（PSS 會把 copy-on-write 共用的
+頁面平均分攤，可看出模型記憶體是否維持共用）。
+
+用法:
+    python benchmarks/bench_prefork_scaling.py --workers 1 2 4 --requests 400 --output prefork.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.harness import child_pids, post_image, read_memory_kb, wait_ready  # noqa: E402
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+
+
+def make_image(height=1080, width=1920):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def run_once(workers, requests_total, concurrency, image, stub_url, port):
+    env = dict(os.environ)
+    env.update({
+        'HF_API_URL': stub_url,
+        'HF_API_TOKEN': 'stub',
+        'WEB_CONCURRENCY': str(workers),
+        'PORT': str(port),
+        'JOB_WORKERS': '0',
+        'RESULT_CACHE_SIZE': '1',
+        'RESULT_CACHE_TTL': '0',
+    })
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'src.wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_ready(base_url)
+        url = f'{base_url}/api/detect'
+        post_image(url, image)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda _: post_image(url, image), range(requests_total)))
+        elapsed = time.perf_counter() - start
+
+        worker_memory = [read_memory_kb(pid) for pid in child_pids(process.pid)]
+        return {
+            'workers': workers,
+            'requests': requests_total,
+            'concurrency': concurrency,
+            'seconds': elapsed,
+            'throughput_rps': requests_total / elapsed,
+            'master_memory_kb': read_memory_kb(process.pid),
+            'worker_memory_kb': worker_memory,
+        }
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pre-fork worker 擴展基準測試')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, max(1, multiprocessing.cpu_count())}))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub_server(latency_ms=args.latency_ms, boxes=2)
+    image = make_image()
+    results = []
+    try:
+        for workers in args.workers:
+            result = run_once(workers, args.requests, args.concurrency, image, stub_url, args.port)
+            results.append(result)
+            pss = [m.get('pss', 0) for m in result['worker_memory_kb']]
+            print(f"workers={workers:>2}  {result['throughput_rps']:8.1f} req/s  "
+                  f"worker PSS 平均 {sum(pss) / max(len(pss), 1) / 1024:7.1f} MB")
+    finally:
+        stub.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
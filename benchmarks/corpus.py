@@ -0,0 +1,54 @@
+"""
+合成相機影像
+
+以固定亂數種子產生帶有雜訊、漸層與植被紋理的影像，日間為彩色、夜間模擬紅外線灰階，
+每次執行產生相同的位元組，結果可以跨 commit 比較。
+"""
+import cv2
+import numpy as np
+
+# 常見的自動相機解析度
+RESOLUTIONS = {
+    '720p': (720, 1280),
+    '1080p': (1080, 1920),
+    '4k': (2160, 3840),
+}
+
+
+def make_trail_camera_jpeg(height, width, seed=0, night=False, quality=90):
+    """產生一張合成相機影像的 JPEG 位元組"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 25, (height, width, 3)).astype(np.float32)
+    frame = np.clip(gradient * 0.6 + noise + 40, 0, 255).astype(np.uint8)
+
+    # 隨機的深色區塊模擬樹幹與植被
+    for _ in range(6):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(width // 20, width // 6)), int(rng.integers(height // 10, height // 2))
+        color = tuple(int(c) for c in rng.integers(10, 90, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+
+    if night:
+        frame = cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return encoded.tobytes()
+
+
+def make_corpus(count, resolutions=('720p', '1080p'), night_ratio=0.3, seed=0):
+    """
+    產生 count 張影像，解析度輪流使用、約 night_ratio 比例為夜間影像
+
+    Returns:
+        list: [(檔名, JPEG 位元組), ...]
+    """
+    corpus = []
+    for i in range(count):
+        name = resolutions[i % len(resolutions)]
+        height, width = RESOLUTIONS[name]
+        night = (i * 7919 % 100) < night_ratio * 100
+        data = make_trail_camera_jpeg(height, width, seed=seed + i, night=night)
+        corpus.append((f"IMG_{i:04d}_{name}{'_ir' if night else ''}.jpg", data))
+    return corpus
@@ -0,0 +1,70 @@
+"""
+基準測試共用工具：送出上傳請求、等待服務就緒、讀取行程記憶體
+"""
+import math
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def post_image(url, image, filename='bench.jpg', timeout=60):
+    """以 multipart 上傳圖片，回傳 HTTP 狀態碼"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + image + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': f'multipart/form-data; boundary={boundary}'
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/ready', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('服務未在時限內就緒')
+
+
+def read_memory_kb(pid):
+    """讀取 /proc/<pid>/smaps_rollup 的 Rss 與 Pss（KB）"""
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    memory[key.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+
+def child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def percentile(sorted_values, fraction):
+    """已排序數列的百分位數（最近秩法）"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
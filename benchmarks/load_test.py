@@ -0,0 +1,284 @@
+"""
+/api/detect 負載測試
+
+啟動本地替身推論伺服器與應用程式（gunicorn、uvicorn 或 Flask 開發伺服器），以合成相機影像在
+固定併發下送出上傳請求，回報每個併發等級的吞吐量、p50/p95/p99 延遲與每個 worker 的 RSS。
+結果連同 git commit 寫成 JSON，可用 --compare 與先前的結果比較。
+
+用法:
+    python benchmarks/load_test.py --concurrency 1 8 32 --requests 300 --output base.json
+    python benchmarks/load_test.py --env BATCHING_ENABLED=0 --compare base.json --output no-batching.json
+    python benchmarks/load_test.py --server uvicorn --workers 1 --concurrency 64 256
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --pid 1234
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import RESOLUTIONS, make_corpus  # noqa: E402
+from benchmarks.harness import child_pids, percentile, post_image, read_memory_kb, wait_ready  # noqa: E402
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+
+
+class MemorySampler:
+    """在背景定期讀取服務行程（含子行程）的 RSS，記錄每個行程的峰值"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_kb = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def _pids(self):
+        # gunicorn 只量 worker；單一行程的服務量自己
+        return child_pids(self.pid) or [self.pid]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        current = {}
+        for pid in self._pids():
+            memory = read_memory_kb(pid)
+            if 'rss' in memory:
+                current[pid] = memory
+                self.peak_rss_kb[pid] = max(self.peak_rss_kb.get(pid, 0), memory['rss'])
+        return current
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_app(server, workers, port, stub_url, workdir, extra_env):
+    env = dict(os.environ)
+    env.update({
+        'HF_API_URL': stub_url,
+        'HF_API_TOKEN': 'stub',
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(workers),
+        'FLASK_ENV': 'production',
+        'JOB_WORKERS': '0',
+        # 語料會重複使用，關閉結果快取以量測完整流程
+        'RESULT_CACHE_SIZE': '1',
+        'RESULT_CACHE_TTL': '0',
+        # 資料庫與上傳檔案寫到暫存目錄，不影響開發資料
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_ROOT': os.path.join(workdir, 'uploads'),
+        'COLD_STORAGE_ROOT': os.path.join(workdir, 'cold'),
+    })
+    env.update(extra_env)
+
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'src.wsgi:app']
+    elif server == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', 'src.asgi:app', '--port', str(port),
+                   '--workers', str(workers), '--log-level', 'warning']
+    else:
+        command = [sys.executable, os.path.join('src', 'main.py')]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_level(url, corpus, concurrency, requests_total):
+    """以固定併發送出 requests_total 個請求，回傳延遲與狀態碼統計"""
+    counter = itertools.count()
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= requests_total:
+                return
+            filename, image = corpus[i % len(corpus)]
+            start = time.perf_counter()
+            try:
+                status = post_image(url, image, filename)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ok = statuses.get('200', 0)
+    return {
+        'concurrency': concurrency,
+        'requests': requests_total,
+        'seconds': elapsed,
+        'throughput_rps': requests_total / elapsed,
+        'success_rps': ok / elapsed,
+        'error_rate': 1.0 - ok / requests_total,
+        'statuses': dict(statuses),
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000,
+            'mean': sum(latencies) / len(latencies) * 1000,
+        },
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=ROOT, text=True).strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['concurrency']: r for r in json.load(f)['results']}
+
+    print(f"\n與 {baseline_path} 比較:")
+    for result in results:
+        base = baseline.get(result['concurrency'])
+        if base is None:
+            continue
+        throughput = (result['throughput_rps'] / base['throughput_rps'] - 1) * 100
+        p95 = (result['latency_ms']['p95'] / base['latency_ms']['p95'] - 1) * 100
+        print(f"  c={result['concurrency']:>3}  吞吐量 {throughput:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise SystemExit(f'--env 格式應為 KEY=VALUE: {pair}')
+        env[key] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/detect 負載測試')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='每個併發等級的請求數')
+    parser.add_argument('--warmup', type=int, default=10, help='正式量測前的暖機請求數')
+    parser.add_argument('--corpus-size', type=int, default=32)
+    parser.add_argument('--resolutions', nargs='+', default=['720p', '1080p'], choices=sorted(RESOLUTIONS))
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=max(1, multiprocessing.cpu_count()))
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--url', help='測試已啟動的服務（不啟動替身伺服器與應用程式）')
+    parser.add_argument('--pid', type=int, help='搭配 --url，量測該行程的 RSS')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='替身推論延遲')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--boxes', type=int, default=1)
+    parser.add_argument('--empty-rate', type=float, default=0.8, help='替身回傳沒有熊的比例')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='傳給應用程式的額外環境變數，可重複指定')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔案')
+    parser.add_argument('--compare', help='與先前輸出的 JSON 比較')
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.corpus_size, tuple(args.resolutions))
+    stub = None
+    process = None
+    workdir = None
+    results = []
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+            pid = args.pid
+        else:
+            stub, stub_url = start_stub_server(
+                latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                boxes=args.boxes, empty_rate=args.empty_rate
+            )
+            workdir = tempfile.mkdtemp(prefix='bear-load-test-')
+            process = start_app(args.server, args.workers, args.port, stub_url, workdir, parse_env(args.env))
+            base_url = f'http://127.0.0.1:{args.port}'
+            pid = process.pid
+
+        wait_ready(base_url, timeout=120)
+        url = f'{base_url}/api/detect'
+        if args.warmup:
+            run_level(url, corpus, min(args.warmup, max(args.concurrency)), args.warmup)
+
+        for concurrency in args.concurrency:
+            sampler = MemorySampler(pid).start() if pid else None
+            result = run_level(url, corpus, concurrency, args.requests)
+            if sampler is not None:
+                sampler.stop()
+                final = sampler.sample()
+                result['worker_rss_kb'] = [
+                    {'pid': p, 'rss': m['rss'], 'peak_rss': sampler.peak_rss_kb.get(p, m['rss'])}
+                    for p, m in sorted(final.items())
+                ]
+            results.append(result)
+
+            latency = result['latency_ms']
+            rss = [w['peak_rss'] for w in result.get('worker_rss_kb', [])]
+            rss_text = f"  worker RSS 峰值 {max(rss) / 1024:7.1f} MB" if rss else ''
+            print(f"c={concurrency:>3}  {result['throughput_rps']:8.1f} req/s  "
+                  f"p50 {latency['p50']:7.1f} ms  p95 {latency['p95']:7.1f} ms  p99 {latency['p99']:7.1f} ms  "
+                  f"錯誤率 {result['error_rate'] * 100:5.1f}%{rss_text}")
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if stub is not None:
+            stub.shutdown()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    if args.output:
+        report = {
+            'meta': {
+                **git_revision(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': multiprocessing.cpu_count(),
+                'args': vars(args),
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+本地推論替身伺服器
+
+模擬 Hugging Face 物件檢測 API 的回應格式：
+[{"box": {"xmin", "ymin", "xmax", "ymax"}, "score", "label"}, ...]
+
+用法:
+    python benchmarks/stub_server.py --port 8900 --latency-ms 80 --boxes 2
+    HF_API_URL=http://127.0.0.1:8900/ HF_API_TOKEN=stub python src/main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency_ms=50.0, jitter_ms=0.0, boxes=1, label='taiwan black bear', score=0.9, empty_rate=0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+
+            delay = latency_ms + (random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+
+            # 依 empty_rate 比例回傳沒有物件的結果，模擬大部分影像沒有熊的情況
+            predictions = []
+            count = 0 if empty_rate and random.random() < empty_rate else boxes
+            for i in range(count):
+                x = 40 + i * 60
+                predictions.append({
+                    'box': {'xmin': x, 'ymin': 40, 'xmax': x + 50, 'ymax': 120},
+                    'score': score,
+                    'label': label
+                })
+
+            body = json.dumps(predictions).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(port=0, **options):
+    """在背景執行緒啟動替身伺服器，回傳 (server, url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(**options))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='stub-inference', daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地推論替身伺服器')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--boxes', type=int, default=1)
+    parser.add_argument('--label', default='taiwan black bear')
+    parser.add_argument('--score', type=float, default=0.9)
+    parser.add_argument('--empty-rate', type=float, default=0.0, help='回傳空結果的比例')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(
+        args.latency_ms, args.jitter_ms, args.boxes, args.label, args.score, args.empty_rate
+    ))
+    print(f'替身推論伺服器: http://127.0.0.1:{args.port}/')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
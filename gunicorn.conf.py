@@ -0,0 +1,43 @@
+# gunicorn pre-fork 設定
+#   gunicorn -c gunicorn.conf.py src.wsgi:app
+#
+# 模型在 master 行程載入一次（preload_app）。Ultralytics 後端的權重由 worker 以 copy-on-write 共用；
+# ONNX 後端的 session 無法跨 fork，每個 worker 重新建立並各自持有一份權重（見 DEPLOYMENT.md）。
+
+import gc
+import multiprocessing
+import os
+
+# 讓 src/main.py 在 master 同步預熱模型，並延後啟動背景工作池
+os.environ.setdefault('PREFORK', '1')
+
+
+def _default_workers():
+    # 推論以 CPU 為主，worker 數預設等於核心數
+    return multiprocessing.cpu_count()
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', _default_workers()))
+# 准入控制依 worker 數平分整個服務的上限（src/main.py 在 master 載入時讀取）
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# gthread 下每個 SSE 連線 (/api/live-detections) 佔用一個執行緒，調整時一併考慮 LIVE_EVENTS_MAX_SUBSCRIBERS
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = '-'
+
+
+def when_ready(server):
+    # 將 master 已建立的物件移出 GC 追蹤，避免 worker 觸發 GC 時改寫共用頁面
+    gc.freeze()
+    server.log.info("模型已在 master 載入，開始 fork %s 個 worker", workers)
+
+
+def post_fork(server, worker):
+    from src.wsgi import init_worker
+    init_worker()
@@ -0,0 +1,390 @@
+# asyncio 服務入口：檢測與查詢端點由 FastAPI 處理，其餘路由交給原本的 Flask app
+#   uvicorn src.asgi:app --host 0.0.0.0 --port 8000
+#
+# 遠端推論在事件迴圈上以非同步連線池等待，一個行程可同時保有數百個上游請求，
+# 不需要每個請求佔用一個執行緒；檔案與資料庫 I/O 交給執行緒池，不阻塞事件迴圈。
+
+import asyncio
+import math
+import mimetypes
+import os
+import sys
+import time
+import uuid
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anyio  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.middleware.wsgi import WSGIMiddleware  # noqa: E402
+from fastapi.responses import FileResponse, JSONResponse, Response  # noqa: E402
+from starlette.concurrency import run_in_threadpool  # noqa: E402
+from starlette.routing import Match, Mount  # noqa: E402
+from werkzeug.datastructures import MultiDict  # noqa: E402
+from werkzeug.utils import secure_filename  # noqa: E402
+
+from src.main import app as flask_app, server_timing_enabled  # noqa: E402
+from src.models.detection import Detection, db  # noqa: E402
+from src.routes.detection import (  # noqa: E402
+    allowed_file, build_statistics, ensure_upload_folder, get_bear_detector, is_backfill,
+    list_recent_detections, model_registry, parse_confidence_threshold, result_cache
+)
+from src.services.admission import AdmissionRejected  # noqa: E402
+from src.services.async_http import AsyncRemoteInference, AsyncResilientClient  # noqa: E402
+from src.services.backends.remote_hf import RemoteHFBackend  # noqa: E402
+from src.services.detection_pipeline import build_detection_response, record_detection_result  # noqa: E402
+from src.services.image_pipeline import UploadedImage, artifact_writer  # noqa: E402
+from src.services.metrics import begin_request_timings, end_request_timings, registry, time_stage  # noqa: E402
+from src.services.result_cache import make_cache_key  # noqa: E402
+from src.services.storage import sharded_path, upload_storage  # noqa: E402
+
+app = FastAPI(title='Bear Detection API', docs_url=None, redoc_url=None, openapi_url=None)
+
+# 本地模型推論佔用 CPU，另外限制同時推論的數量，避免把執行緒池佔滿
+local_inference_limit = asyncio.Semaphore(int(os.getenv('ASGI_LOCAL_CONCURRENCY', 4)))
+async_client = None
+
+requests_in_flight = registry.gauge('http_requests_in_flight', '進行中的請求數')
+
+
+def error_response(message, status_code):
+    return JSONResponse({'success': False, 'error': message}, status_code=status_code)
+
+
+def in_app_context(fn, *args, **kwargs):
+    """在執行緒池中以 Flask app context 執行（資料庫 session 與 current_app）"""
+    def call():
+        with flask_app.app_context():
+            return fn(*args, **kwargs)
+    return run_in_threadpool(call)
+
+
+@app.on_event('startup')
+async def start_async_clients():
+    global async_client
+    # 檔案、資料庫與本地推論共用的執行緒池大小
+    anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv('ASGI_THREADPOOL_SIZE', 40))
+
+    # 模型版本可在執行中切換為遠端後端，客戶端一律建立；熔斷器依各版本的後端而定
+    async_client = AsyncResilientClient(
+        pool_size=int(os.getenv('ASGI_HTTP_POOL_SIZE', 100)),
+        connect_timeout=float(os.getenv('HF_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=float(os.getenv('HF_READ_TIMEOUT', 30)),
+        max_retries=int(os.getenv('HF_MAX_RETRIES', 3)),
+        backoff_base=float(os.getenv('HF_BACKOFF_BASE', 0.5)),
+        backoff_max=float(os.getenv('HF_BACKOFF_MAX', 8)),
+        max_in_flight=int(os.getenv('ASGI_MAX_INFLIGHT', 256))
+    )
+    await async_client.start()
+    get_bear_detector()
+
+
+@app.on_event('shutdown')
+async def close_async_clients():
+    if async_client is not None:
+        await async_client.close()
+
+
+def match_route(scope):
+    """回傳由 FastAPI 處理的路由；轉給 Flask 的請求回傳 None"""
+    for route in app.router.routes:
+        if not isinstance(route, Mount) and route.matches(scope)[0] == Match.FULL:
+            return route
+    return None
+
+
+@app.middleware('http')
+async def request_metrics(request, call_next):
+    """與 Flask 的請求指標相同；轉給 Flask 的請求由 Flask 自己記錄"""
+    route = match_route(request.scope)
+    if route is None:
+        return await call_next(request)
+
+    started_at = time.perf_counter()
+    requests_in_flight.inc()
+    begin_request_timings()
+    try:
+        response = await call_next(request)
+    finally:
+        requests_in_flight.dec()
+    timings = end_request_timings()
+
+    elapsed = time.perf_counter() - started_at
+    registry.histogram(
+        'http_request_duration_seconds', description='請求處理時間',
+        labels={'endpoint': f'asgi.{route.name}'}
+    ).observe(elapsed)
+    if server_timing_enabled:
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings]
+        entries.append(f'total;dur={elapsed * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+
+async def run_inference(detector, image, upload_folder, threshold=None):
+    """遠端後端以非同步客戶端等待推論；本地模型在執行緒池推論"""
+    if async_client is None or not isinstance(detector.backend, RemoteHFBackend):
+        async with local_inference_limit:
+            return await run_in_threadpool(detector.detect_bear, image, upload_folder, threshold=threshold)
+
+    remote_inference = AsyncRemoteInference(detector.backend, async_client)
+    try:
+        started = time.perf_counter()
+        with time_stage('inference'):
+            slicer = detector.slicer
+            if slicer is not None and await run_in_threadpool(slicer.applies_to, image):
+                tiles, offsets = await run_in_threadpool(slicer.split, image)
+                results = await asyncio.gather(
+                    *(remote_inference.infer(tile) for tile in tiles), return_exceptions=True
+                )
+                hf_results = slicer.merge(results, offsets)
+            else:
+                hf_results = await remote_inference.infer(image)
+        detector.observe_inference(time.perf_counter() - started)
+        return await run_in_threadpool(detector.build_result, image, hf_results, upload_folder, threshold=threshold)
+    except Exception as e:
+        return detector.error_result(e)
+
+
+@app.post('/api/detect')
+async def detect(request: Request):
+    """處理圖片上傳和台灣黑熊檢測（與 Flask 的 POST /api/detect 相同）"""
+    detector = None
+    try:
+        content_length = request.headers.get('content-length')
+        if content_length and int(content_length) > flask_app.config['MAX_CONTENT_LENGTH']:
+            return error_response('上傳檔案過大', 413)
+
+        form = await request.form()
+        file = form.get('image')
+        if file is None or isinstance(file, str):
+            return error_response('沒有上傳圖片檔案', 400)
+        camera_id = form.get('camera_id', 'unknown')
+        location = form.get('location', '未知位置')
+
+        if not file.filename:
+            return error_response('沒有選擇檔案', 400)
+        if not allowed_file(file.filename):
+            return error_response('不支援的檔案格式', 400)
+
+        admission = flask_app.extensions.get('admission')
+        lane = None
+        if admission is not None:
+            lane = admission.lane_for(camera_id, is_backfill(form) or is_backfill(request.query_params))
+            if camera_id != 'unknown':
+                admission.check_rate(camera_id, lane)
+
+        with time_stage('upload_read'):
+            image_bytes = await file.read()
+        # 請求期間持有租約，切換版本後舊版本等請求結束才釋放
+        detector = model_registry.acquire()
+        threshold = form.get('confidence_threshold') or request.query_params.get('confidence_threshold')
+        try:
+            threshold = detector.confidence_threshold if not threshold else parse_confidence_threshold(threshold)
+        except ValueError as e:
+            return error_response(f'信心度閾值格式錯誤: {e}', 400)
+
+        # 相同圖片、模型與閾值已檢測過時，直接沿用既有記錄與結果圖片
+        cache_key = make_cache_key(image_bytes, detector.get_model_identity(), threshold)
+        cached_id = result_cache.get(cache_key)
+        if cached_id is not None:
+            def load_cached():
+                cached_detection = db.session.get(Detection, cached_id)
+                return build_detection_response(cached_detection) if cached_detection is not None else None
+
+            response_data = await in_app_context(load_cached)
+            if response_data is not None:
+                response_data['cached'] = True
+                return JSONResponse(response_data)
+            result_cache.invalidate(cache_key)
+
+        # 同一台相機時間窗內的近似重複影格沿用先前的檢測記錄
+        tracker = flask_app.extensions.get('event_tracker')
+        frame_hash = None
+        if tracker is not None:
+            frame_hash, duplicate_response = await in_app_context(
+                tracker.check, camera_id, image_bytes, (detector.get_model_identity(), threshold)
+            )
+            if duplicate_response is not None:
+                return JSONResponse(duplicate_response)
+
+        upload_folder = await run_in_threadpool(ensure_upload_folder)
+        unique_filename = f"{uuid.uuid4()}_{secure_filename(file.filename)}"
+        filepath = sharded_path(upload_folder, unique_filename)
+
+        # 非同步模式：保存原始圖片後排入背景工作佇列，立即回傳工作 id
+        if request.query_params.get('async') in ('1', 'true'):
+            job_pool = flask_app.extensions.get('detection_jobs')
+            if job_pool is None:
+                return error_response('未啟用非同步檢測', 400)
+
+            def save_and_enqueue():
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                with open(filepath, 'wb') as f:
+                    f.write(image_bytes)
+                job = job_pool.enqueue(unique_filename, camera_id, location)
+                return {
+                    'success': True,
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': f'/api/jobs/{job.id}'
+                }
+
+            return JSONResponse(await in_app_context(save_and_enqueue), status_code=202)
+
+        # 取得推論名額後才保存圖片，等候時不佔用執行緒
+        async with admission.slot_async(lane) if admission is not None else nullcontext():
+            # 保存原始圖片（背景寫入），檢測直接使用記憶體中的圖片；寫入積壓時會等待，不可阻塞事件迴圈
+            await run_in_threadpool(artifact_writer.write, filepath, image_bytes)
+            image = UploadedImage(image_bytes, unique_filename)
+
+            detection_result = await run_inference(detector, image, upload_folder, threshold)
+        # 抽樣的請求在背景以影子版本推論比較，不影響回應
+        model_registry.maybe_shadow(image, detection_result, threshold)
+        detection, response_data = await in_app_context(
+            record_detection_result, detection_result, unique_filename, camera_id, location
+        )
+
+        # 失敗的結果不寫入快取
+        if 'error' not in detection_result:
+            result_cache.set(cache_key, detection.id)
+
+        if tracker is not None:
+            event_id = await in_app_context(
+                tracker.observe, camera_id, location, frame_hash, (detector.get_model_identity(), threshold),
+                detection, detection_result
+            )
+            if event_id is not None:
+                response_data['event_id'] = event_id
+
+        return JSONResponse(response_data)
+
+    except AdmissionRejected as e:
+        retry_after = math.ceil(e.retry_after)
+        return JSONResponse(
+            {'success': False, 'error': str(e), 'reason': e.reason, 'retry_after': retry_after},
+            status_code=429, headers={'Retry-After': str(retry_after)}
+        )
+    except Exception as e:
+        return error_response(f'檢測過程發生錯誤: {str(e)}', 500)
+    finally:
+        if detector is not None:
+            model_registry.release(detector)
+
+
+@app.get('/api/statistics')
+async def statistics(request: Request):
+    """獲取系統統計資料（參數與 Flask 的 GET /api/statistics 相同）"""
+    try:
+        statistics = await in_app_context(build_statistics, MultiDict(request.query_params.multi_items()))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+    return JSONResponse({
+        'success': True,
+        'statistics': statistics
+    })
+
+
+@app.get('/api/recent-detections')
+async def recent_detections(request: Request):
+    """獲取最近的檢測記錄（參數與 Flask 的 GET /api/recent-detections 相同）"""
+    try:
+        result, next_cursor = await in_app_context(
+            list_recent_detections, MultiDict(request.query_params.multi_items())
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+    response = JSONResponse(result)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def parse_range(header, size):
+    """解析單一區段的 Range 標頭，回傳 (start, end)；無法處理時回傳 None"""
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+
+@app.get('/api/uploads/{filename}')
+async def uploads(filename: str, request: Request):
+    """提供上傳檔案的存取（size / format 參數與 Flask 的 GET /api/uploads 相同）"""
+    # 剛上傳的檔案可能仍在背景寫入中
+    await run_in_threadpool(artifact_writer.wait, filename)
+    max_age = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 31536000))
+    # 檔名皆含 uuid，內容不會改變
+    cache_control = f'public, max-age={max_age}, immutable'
+
+    try:
+        location = await run_in_threadpool(
+            upload_storage.resolve, filename, request.query_params.get('size'), request.query_params.get('format')
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+    if location is None:
+        return error_response('找不到檔案', 404)
+
+    tier, path = location
+    stat = await run_in_threadpool(os.stat, path)
+    if tier == 'cold' and path.endswith('.gz'):
+        # 冷儲存中 gzip 壓縮的原始圖片解壓縮後回傳，ETag 以壓縮檔的修改時間與大小產生；
+        # 原樣搬移的圖片與熱儲存相同，直接串流檔案並支援 Range
+        etag = f'"cold-{int(stat.st_mtime)}-{stat.st_size}"'
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+        content = await run_in_threadpool(upload_storage.read, filename)
+        return Response(content, media_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                        headers={'ETag': etag, 'Cache-Control': cache_control})
+
+    response = FileResponse(path, stat_result=stat, headers={'Cache-Control': cache_control})
+    etag = response.headers['etag']
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': cache_control})
+
+    byte_range = request.headers.get('range')
+    if byte_range:
+        parsed = parse_range(byte_range, stat.st_size)
+        if parsed is None:
+            return Response(status_code=416, headers={'Content-Range': f'bytes */{stat.st_size}'})
+        start, end = parsed
+        content = await run_in_threadpool(read_range, path, start, end)
+        return Response(content, status_code=206, media_type=response.media_type, headers={
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            'Accept-Ranges': 'bytes',
+            'Content-Range': f'bytes {start}-{end}/{stat.st_size}'
+        })
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+# 其餘路由（工作查詢、影片、批次、SSE、靜態頁面等）仍由 Flask 在執行緒池處理
+app.mount('/', WSGIMiddleware(flask_app))
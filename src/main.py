@@ -3,25 +3,83 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+import time
+import click
+from src.services.startup import startup_report
+from flask import Flask, g, request, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
-from src.models.detection import Detection
+from src.models.detection import Detection, DetectionEvent
+from src.models.job import DetectionJob
+from src.models.task import BackgroundTask
 from src.routes.user import user_bp
-from src.routes.detection import detection_bp
+from src.routes.detection import detection_bp, get_bear_detector, model_registry
+from src.services.job_queue import JobWorkerPool
+from src.services.rollups import rebuild_rollups
+from src.services.detection_queries import ensure_indexes
+from src.services.database import configure_engine, database_uri, engine_options, ensure_columns
+from src.services.db_writer import DetectionWriter
+from src.services.tasks import TaskRegistry
+from src.services.event_tracker import EventTracker
+from src.services.admission import AdmissionController
+from src.services.image_pipeline import artifact_writer
+from src.services.storage import upload_storage
+from src.services.live_events import EventHub, event_hub
+from src.services.metrics import begin_request_timings, end_request_timings, registry
+
+startup_report.record('imports', time.perf_counter() - startup_report.started_at)
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # 啟用CORS支援
-CORS(app, origins="*")
+CORS(app, origins="*", expose_headers=["X-Next-Cursor"])
 
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(detection_bp, url_prefix='/api')
 
+# 請求指標：進行中的請求數與各端點耗時；SERVER_TIMING=1 時在回應附上各階段耗時
+requests_in_flight = registry.gauge('http_requests_in_flight', '進行中的請求數')
+server_timing_enabled = os.getenv('SERVER_TIMING') == '1'
+
+# pre-fork 多 worker 時各 worker 的指標寫到共用目錄，/api/metrics 回傳所有 worker 合併後的數值
+if os.getenv('PREFORK') == '1':
+    registry.enable_multiprocess(
+        os.getenv('METRICS_MULTIPROC_DIR') or os.path.join(os.path.dirname(__file__), 'database', 'metrics'),
+        flush_interval=float(os.getenv('METRICS_FLUSH_SECONDS', 5)),
+        clear=True
+    )
+
+@app.before_request
+def start_request_metrics():
+    g.request_started_at = time.perf_counter()
+    requests_in_flight.inc()
+    begin_request_timings()
+
+@app.after_request
+def add_server_timing(response):
+    timings = end_request_timings()
+    if server_timing_enabled:
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings]
+        entries.append(f'total;dur={(time.perf_counter() - g.request_started_at) * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'request_started_at' not in g:
+        return
+    requests_in_flight.dec()
+    registry.histogram(
+        'http_request_duration_seconds', description='請求處理時間',
+        labels={'endpoint': request.endpoint or 'unmatched'}
+    ).observe(time.perf_counter() - g.request_started_at)
+
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# DATABASE_URL 可改用 PostgreSQL 等資料庫，預設為本地 SQLite
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.path.join(os.path.dirname(__file__), 'database', 'app.db'))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
@@ -30,8 +88,116 @@ database_dir = os.path.join(os.path.dirname(__file__), 'database')
 if not os.path.exists(database_dir):
     os.makedirs(database_dir)
 
-with app.app_context():
+with startup_report.stage('db_init'), app.app_context():
+    # SQLite 啟用 WAL 等 PRAGMA，需在第一個連線建立前設定
+    configure_engine(db.engine)
     db.create_all()
+    ensure_indexes()
+    ensure_columns(db.engine, DetectionJob.__table__)
+
+# 檢測記錄由單一寫入執行緒 group commit，DB_WRITER_ENABLED=0 則每個請求自行 commit
+if os.getenv('DB_WRITER_ENABLED', '1') == '1':
+    app.extensions['detection_writer'] = DetectionWriter(
+        app,
+        batch_size=int(os.getenv('DB_WRITER_BATCH_SIZE', 64)),
+        flush_ms=float(os.getenv('DB_WRITER_FLUSH_MS', 10))
+    )
+
+# 背景檢測工作池（POST /api/detect?async=1），JOB_WORKERS=0 可停用
+job_workers = int(os.getenv('JOB_WORKERS', 2))
+if job_workers > 0:
+    job_pool = JobWorkerPool(
+        app,
+        model_registry.lease,
+        workers=job_workers,
+        mode=os.getenv('JOB_WORKER_MODE', 'thread'),
+        poll_interval=float(os.getenv('JOB_POLL_INTERVAL', 1.0)),
+        stale_after=float(os.getenv('JOB_STALE_SECONDS', 300)),
+        heartbeat_interval=float(os.getenv('JOB_HEARTBEAT_SECONDS', 30)),
+        max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    )
+    app.extensions['detection_jobs'] = job_pool
+    # pre-fork 模式下 master 行程不處理工作，由 worker 在 post_fork 時啟動
+    if os.getenv('PREFORK') != '1':
+        job_pool.ensure_started()
+
+# 影片、串流等長時間背景任務（/api/tasks/<id> 查詢進度，狀態存於資料庫供各 worker 查詢）
+app.extensions['background_tasks'] = TaskRegistry(
+    app,
+    workers=int(os.getenv('TASK_WORKERS', 2)),
+    flush_interval=float(os.getenv('TASK_FLUSH_SECONDS', 2)),
+    stale_after=float(os.getenv('TASK_STALE_SECONDS', 60))
+)
+
+# 各相機的近似重複影格略過推論，連續的熊檢測合併為事件（/api/events），EVENT_TRACKING=0 可停用
+if os.getenv('EVENT_TRACKING', '1') == '1':
+    app.extensions['event_tracker'] = EventTracker(
+        window_seconds=float(os.getenv('DEDUP_WINDOW_SECONDS', 60)),
+        negative_window_seconds=float(os.getenv('DEDUP_NEGATIVE_WINDOW_SECONDS', 5)),
+        max_distance=int(os.getenv('DEDUP_MAX_DISTANCE', 6)),
+        gap_seconds=float(os.getenv('EVENT_GAP_SECONDS', 120)),
+        history=int(os.getenv('DEDUP_HISTORY', 32)),
+        max_cameras=int(os.getenv('DEDUP_MAX_CAMERAS', 1024))
+    )
+
+# /api/detect 的准入控制：每台相機的速率限制、同時推論數上限與依車道優先順序的等候佇列
+# 限制在各行程內計算，pre-fork 時設定值為整個服務的上限，由 WEB_CONCURRENCY 個 worker 平分
+if os.getenv('ADMISSION_CONTROL', '1') == '1':
+    app.extensions['admission'] = AdmissionController(
+        max_concurrent=int(os.getenv('MAX_CONCURRENT_INFERENCES', 16)),
+        queue_size=int(os.getenv('ADMISSION_QUEUE_SIZE', 64)),
+        max_wait=float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', 10)),
+        camera_rate=float(os.getenv('CAMERA_RATE_LIMIT', 5)),
+        camera_burst=int(os.getenv('CAMERA_BURST', 20)),
+        critical_cameras=[c.strip() for c in os.getenv('CRITICAL_CAMERAS', '').split(',') if c.strip()],
+        max_cameras=int(os.getenv('ADMISSION_MAX_CAMERAS', 4096)),
+        workers=int(os.getenv('WEB_CONCURRENCY', 1)) if os.getenv('PREFORK') == '1' else 1
+    )
+
+# 即時檢測事件：單一行程時寫入後直接推送，pre-fork 多 worker 時每個行程輪詢新記錄
+# gthread worker 的每個 SSE 連線佔用一個執行緒，未指定上限時保留 LIVE_EVENTS_RESERVED_THREADS 個執行緒給一般請求
+live_events_max_subscribers = os.getenv('LIVE_EVENTS_MAX_SUBSCRIBERS')
+if live_events_max_subscribers is None and os.getenv('PREFORK') == '1':
+    live_events_max_subscribers = max(
+        1, int(os.getenv('GUNICORN_THREADS', 4)) - int(os.getenv('LIVE_EVENTS_RESERVED_THREADS', 2))
+    )
+event_hub.init_app(
+    app,
+    source=os.getenv('LIVE_EVENTS_SOURCE') or (EventHub.POLL if os.getenv('PREFORK') == '1' else EventHub.LOCAL),
+    poll_interval=float(os.getenv('LIVE_EVENTS_POLL_INTERVAL', 1.0)),
+    max_subscribers=int(live_events_max_subscribers) if live_events_max_subscribers is not None else None
+)
+
+# 上傳圖片寫入後在背景預先產生縮圖，THUMBNAIL_EAGER=0 則在第一次請求時產生
+if os.getenv('THUMBNAIL_EAGER', '1') == '1':
+    artifact_writer.add_listener(upload_storage.generate_derivatives)
+
+def warm_up_model():
+    """建立檢測服務並載入模型權重"""
+    get_bear_detector().backend.warmup()
+
+# 模型在背景執行緒預熱，服務可以立即回應 /api/health；WARMUP_ON_START=0 則延遲到第一次檢測
+# pre-fork 模式下在 master 行程同步載入後才 fork（ONNX 後端的 worker 會各自重建 session，見 DEPLOYMENT.md）
+if os.getenv('PREFORK') == '1':
+    startup_report.warm_up(warm_up_model, background=False)
+elif os.getenv('WARMUP_ON_START', '1') == '1':
+    startup_report.warm_up(warm_up_model)
+else:
+    startup_report.set_status(startup_report.READY)
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """從既有檢測記錄重建統計彙總表"""
+    processed = rebuild_rollups()
+    print(f"已重建 {processed} 筆檢測記錄的統計彙總")
+
+@app.cli.command('archive-uploads')
+@click.option('--days', type=int, default=lambda: int(os.getenv('UPLOAD_RETENTION_DAYS', 30)),
+              help='保留在熱儲存的天數')
+def archive_uploads_command(days):
+    """將超過保留天數的原始圖片壓縮移到冷儲存"""
+    result = upload_storage.archive_originals(days)
+    print(f"已移動 {result['moved']} 張原始圖片到冷儲存，釋放 {result['freed_bytes'] / 1024 / 1024:.1f} MB")
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -51,4 +217,4 @@ def serve(path):
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)), debug=os.getenv('FLASK_ENV') != 'production')
@@ -1,20 +1,15 @@
-# detection.py 最上方新增
-from flask import Blueprint, request, jsonify
-from ultralytics import YOLO
-import os
-import uuid
-
-# 建立 Blueprint
-detection_bp = Blueprint("detection", __name__)
-
-# 載入模型（只載一次）
-model = YOLO("/bear-detection-backend/models/best.pt")  # 換成你的模型實際路徑
-
 from datetime import datetime
 from src.models.user import db
 
 class Detection(db.Model):
     __tablename__ = 'detections'
+    __table_args__ = (
+        # 歷史查詢以 (detected_at, id) 做 keyset 分頁，各篩選條件都有對應的複合索引
+        db.Index('ix_detections_detected_at_id', 'detected_at', 'id'),
+        db.Index('ix_detections_camera_detected_at', 'camera_id', 'detected_at', 'id'),
+        db.Index('ix_detections_location_detected_at', 'location', 'detected_at', 'id'),
+        db.Index('ix_detections_bear_detected_at', 'bear_detected', 'detected_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     camera_id = db.Column(db.String(50), nullable=False)
@@ -37,43 +32,67 @@ class Detection(db.Model):
             'result_image_filename': self.result_image_filename
         }
 
-@detection_bp.route("/predict", methods=["POST"])
-def predict():
-    if 'image' not in request.files:
-        return jsonify({"error": "No image provided"}), 400
 
-    image = request.files["image"]
-    if image.filename == '':
-        return jsonify({"error": "Empty filename"}), 400
+class DetectionRollup(db.Model):
+    """檢測數量的彙總表，與每筆檢測記錄在同一個交易中更新"""
+    __tablename__ = 'detection_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_key', 'granularity', 'bucket_start', name='uq_detection_rollup'),
+    )
 
-    # 儲存圖片到 temp 資料夾
-    filename = f"{uuid.uuid4().hex}.jpg"
-    save_path = os.path.join("temp", filename)
-    os.makedirs("temp", exist_ok=True)
-    image.save(save_path)
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)          # all / camera / location
+    scope_key = db.Column(db.String(200), nullable=False)     # camera_id 或 location，all 為空字串
+    granularity = db.Column(db.String(10), nullable=False)    # total / hour / day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    bear_count = db.Column(db.Integer, nullable=False, default=0)
 
-    try:
-        # 做推論
-        results = model(save_path)
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'scope_key': self.scope_key,
+            'granularity': self.granularity,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'total_count': self.total_count,
+            'bear_count': self.bear_count
+        }
 
-        detections = []
-        for r in results:
-            for box in r.boxes:
-                cls_id = int(box.cls[0])
-                label = model.names[cls_id]
-                confidence = float(box.conf[0])
-                xyxy = box.xyxy[0].tolist()
 
-                detections.append({
-                    "label": label,
-                    "confidence": round(confidence, 2),
-                    "bbox": xyxy  # [x1, y1, x2, y2]
-                })
+class DetectionEvent(db.Model):
+    """同一台相機連續出現熊的檢測合併成的事件"""
+    __tablename__ = 'detection_events'
+    __table_args__ = (
+        db.Index('ix_detection_events_camera_started_at', 'camera_id', 'started_at', 'id'),
+        db.Index('ix_detection_events_started_at_id', 'started_at', 'id'),
+    )
 
-        return jsonify({
-            "detections": detections,
-            "image": filename
-        })
+    id = db.Column(db.Integer, primary_key=True)
+    camera_id = db.Column(db.String(50), nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime, nullable=False)
+    detection_count = db.Column(db.Integer, nullable=False, default=0)   # 寫入檢測記錄的影格數
+    duplicate_count = db.Column(db.Integer, nullable=False, default=0)   # 近似重複而略過推論的影格數
+    peak_confidence = db.Column(db.Float, nullable=False, default=0.0)
+    peak_detection_id = db.Column(db.Integer, nullable=True)
+    peak_image_filename = db.Column(db.String(200), nullable=True)
+    peak_result_image_filename = db.Column(db.String(200), nullable=True)
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'camera_id': self.camera_id,
+            'location': self.location,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None,
+            'duration_seconds': (self.ended_at - self.started_at).total_seconds()
+            if self.started_at and self.ended_at else 0.0,
+            'detection_count': self.detection_count,
+            'duplicate_count': self.duplicate_count,
+            'peak_confidence': self.peak_confidence,
+            'peak_detection_id': self.peak_detection_id,
+            'peak_image_url': f'/api/uploads/{self.peak_image_filename}' if self.peak_image_filename else None,
+            'peak_result_image_url': f'/api/uploads/{self.peak_result_image_filename}'
+            if self.peak_result_image_filename else None
+        }
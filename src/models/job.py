@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class DetectionJob(db.Model):
+    __tablename__ = 'detection_jobs'
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default=PENDING, index=True)
+    camera_id = db.Column(db.String(50), nullable=False)
+    location = db.Column(db.String(200), nullable=False)
+    image_filename = db.Column(db.String(200), nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # 處理中的 worker 定期更新；停止更新代表 worker 已中斷
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'camera_id': self.camera_id,
+            'location': self.location,
+            'image_filename': self.image_filename,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
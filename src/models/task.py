@@ -0,0 +1,36 @@
+import json
+from src.models.user import db
+
+class BackgroundTask(db.Model):
+    """影片、批次上傳等背景任務的狀態；pre-fork 的任何 worker 都能查詢"""
+    __tablename__ = 'background_tasks'
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=PENDING, index=True)
+    params = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    # 與 API 相同以 epoch 秒記錄；updated_at 為執行中任務的心跳
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+    finished_at = db.Column(db.Float, nullable=True)
+
+    def to_dict(self):
+        return {
+            'task_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'progress': json.loads(self.progress) if self.progress else {},
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
@@ -1,70 +1,264 @@
+import io
+import json
+import math
+import mimetypes
 import os
+import tempfile
 import uuid
-from datetime import datetime
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, g, has_request_context, jsonify, request, current_app, send_file, stream_with_context
 from werkzeug.utils import secure_filename
-from src.models.detection import Detection, db
+from src.models.detection import Detection, DetectionEvent, db
+from src.models.job import DetectionJob
 from src.services.bear_detection import BearDetectionService
-import cv2
-import numpy as np
+from src.services.startup import startup_report
+from src.services.metrics import registry, time_stage
+from src.services import rollups
+from src.services.detection_queries import clamp_page_size, query_detections, query_detections_after
+from src.services.detection_export import EXPORT_FORMATS, export_statement, parquet_available, stream_export
+from src.services.analytics import compute_activity
+from src.services.live_events import event_hub
+from src.services.event_tracker import query_events
+from src.services.model_registry import ModelRegistry, ModelSpec
+from src.services.admission import AdmissionRejected
+from src.services.result_cache import ResultCache, make_cache_key
+from src.services.detection_pipeline import build_detection_response, run_detection
+from src.services.image_pipeline import UploadedImage, artifact_writer
+from src.services.video_ingest import process_video
+from src.services.storage import sharded_path, upload_storage
+from src.services.bulk_ingest import (
+    count_archive_images, iter_archive_entries, iter_stored_entries, process_bulk, unique_upload_name
+)
 
 detection_bp = Blueprint('detection', __name__)
 
 # 允許的檔案類型
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'http://', 'https://')
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
 
-# 初始化檢測服務
-bear_detector = None
+# 個別路由的上傳大小上限（影片遠大於單張圖片）
+ROUTE_CONTENT_LIMITS = {
+    'detection.detect_video': int(os.getenv('VIDEO_MAX_CONTENT_LENGTH', 512 * 1024 * 1024)),
+    'detection.detect_bulk': int(os.getenv('BULK_MAX_CONTENT_LENGTH', 8 * 1024 * 1024 * 1024))
+}
+
+# multipart 一次上傳多張圖片時，表單欄位數需高於預設的 1000
+ROUTE_FORM_PART_LIMITS = {
+    'detection.detect_bulk': int(os.getenv('BULK_MAX_FILES', 100000))
+}
+
+# 以圖片內容雜湊為鍵的檢測結果快取（值為 Detection id）
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.getenv('RESULT_CACHE_TTL', 3600))
+)
+
+# 歷史分析結果快取：已結束的時間範圍保留 ANALYTICS_CACHE_TTL 秒，包含現在的範圍只保留 ANALYTICS_LIVE_TTL 秒
+analytics_cache = ResultCache(
+    max_entries=int(os.getenv('ANALYTICS_CACHE_SIZE', 256)),
+    ttl_seconds=float(os.getenv('ANALYTICS_CACHE_TTL', 3600)),
+    metric_prefix='analytics_cache',
+    description='歷史分析快取'
+)
+
+def create_default_detector():
+    """建立預設的檢測服務（尚未透過 /api/models/load 切換版本時）"""
+    # 尋找best.pt模型檔案
+    model_path = None
+    possible_paths = [
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'models', 'best.pt'),
+        '/home/ubuntu/bear-detection-backend/models/best.pt',
+        '/home/ubuntu/bear-detection-backend/best.pt',
+        '/home/ubuntu/best.pt'
+    ]
+    
+    for path in possible_paths:
+        if os.path.exists(path):
+            model_path = path
+            break
+    
+    return BearDetectionService(model_path)
+
+# 可熱切換的模型版本；目前版本記錄在 MODEL_REGISTRY_STATE，pre-fork 的各 worker 據此同步
+model_registry = ModelRegistry(
+    create_default_detector,
+    state_path=os.getenv('MODEL_REGISTRY_STATE') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'model_registry.json'
+    ),
+    check_interval=float(os.getenv('MODEL_REGISTRY_CHECK_SECONDS', 5)),
+    shadow_workers=int(os.getenv('SHADOW_WORKERS', 2))
+)
 
 def get_bear_detector():
-    """獲取檢測服務實例"""
-    global bear_detector
-    if bear_detector is None:
-        # 尋找best.pt模型檔案
-        model_path = None
-        possible_paths = [
-            '/home/ubuntu/bear-detection-backend/models/best.pt',
-            '/home/ubuntu/bear-detection-backend/best.pt',
-            '/home/ubuntu/best.pt'
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                model_path = path
-                break
-        
-        bear_detector = BearDetectionService(model_path)
-    return bear_detector
+    """
+    獲取目前版本的檢測服務實例
+
+    在請求中第一次呼叫時登記租約、請求結束時歸還，切換版本不影響進行中的請求；
+    超出請求範圍使用的背景任務改以 model_registry.lease() 自行持有租約。
+    """
+    if not has_request_context():
+        return model_registry.get()
+    if 'bear_detector' not in g:
+        g.bear_detector = model_registry.acquire()
+    return g.bear_detector
+
+@detection_bp.teardown_request
+def release_bear_detector(exc):
+    detector = g.pop('bear_detector', None)
+    if detector is not None:
+        model_registry.release(detector)
+
+def parse_confidence_threshold(value):
+    """解析 0 到 1 之間的信心度閾值，格式錯誤時拋出 ValueError"""
+    threshold = float(value)
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError('信心度閾值必須介於 0 到 1 之間')
+    return threshold
+
+def request_confidence_threshold(detector):
+    """本次請求的信心度閾值（表單或查詢參數 confidence_threshold），未指定時使用預設值"""
+    value = request.form.get('confidence_threshold') or request.args.get('confidence_threshold')
+    if value is None or value == '':
+        return detector.confidence_threshold
+    return parse_confidence_threshold(value)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_time_range(args):
+    """解析 start / end 查詢參數（ISO 8601），格式錯誤時拋出 ValueError"""
+    start = args.get('start')
+    end = args.get('end')
+    return (datetime.fromisoformat(start) if start else None,
+            datetime.fromisoformat(end) if end else None)
+
+def get_job_pool():
+    """獲取背景檢測工作池（未啟用時為 None）"""
+    return current_app.extensions.get('detection_jobs')
+
+def get_task_registry():
+    """獲取長時間背景任務的執行池"""
+    return current_app.extensions.get('background_tasks')
+
+def get_event_tracker():
+    """獲取相機事件追蹤（未啟用時為 None）"""
+    return current_app.extensions.get('event_tracker')
+
+def get_admission():
+    """獲取推論准入控制（未啟用時為 None）"""
+    return current_app.extensions.get('admission')
+
+def is_backfill(values):
+    """表單或查詢參數 backfill=1 表示回補歷史影像，排在 bulk 車道"""
+    return values.get('backfill') in ('1', 'true')
+
+def admission_rejected_response(error):
+    """准入控制拒絕時回傳 429 與 Retry-After"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'reason': error.reason,
+        'retry_after': math.ceil(error.retry_after)
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(error.retry_after))
+    return response
+
+@detection_bp.before_request
+def apply_route_content_limit():
+    limit = ROUTE_CONTENT_LIMITS.get(request.endpoint)
+    if limit is not None:
+        request.max_content_length = limit
+    part_limit = ROUTE_FORM_PART_LIMITS.get(request.endpoint)
+    if part_limit is not None:
+        request.max_form_parts = part_limit
+
 def ensure_upload_folder():
     """確保上傳資料夾存在"""
-    upload_folder = os.path.join(current_app.static_folder, 'uploads')
+    upload_folder = upload_storage.root
     if not os.path.exists(upload_folder):
         os.makedirs(upload_folder)
     return upload_folder
 
+def build_statistics(args):
+    """
+    依查詢參數讀取統計彙總（Flask 與 ASGI 路由共用）
+
+    Raises:
+        ValueError: 參數格式錯誤
+    """
+    scope, scope_key = 'all', ''
+    if args.get('camera_id'):
+        scope, scope_key = 'camera', args['camera_id']
+    elif args.get('location'):
+        scope, scope_key = 'location', args['location']
+
+    granularity = args.get('granularity', 'hour')
+    if granularity not in ('hour', 'day'):
+        raise ValueError('granularity 只支援 hour 或 day')
+
+    try:
+        start, end = parse_time_range(args)
+    except ValueError:
+        raise ValueError('時間格式錯誤，請使用 ISO 8601')
+
+    series = None
+    if start or end:
+        buckets = rollups.get_series(scope, scope_key, granularity, start, end)
+        total_detections = sum(b.total_count for b in buckets)
+        bear_detections = sum(b.bear_count for b in buckets)
+        series = [b.to_dict() for b in buckets]
+    else:
+        total_detections, bear_detections = rollups.get_totals(scope, scope_key)
+
+    # 計算檢測率
+    detection_rate = (bear_detections / total_detections * 100) if total_detections > 0 else 0
+
+    statistics = {
+        'total_detections': total_detections,
+        'bear_detections': bear_detections,
+        'detection_rate': round(detection_rate, 2),
+        'recent_count': min(total_detections, 10)
+    }
+    if series is not None:
+        statistics['series'] = series
+
+    breakdown = args.get('breakdown')
+    if breakdown in ('camera', 'location'):
+        statistics['breakdown'] = [
+            {
+                breakdown: r.scope_key,
+                'total_detections': r.total_count,
+                'bear_detections': r.bear_count
+            }
+            for r in rollups.get_breakdown(breakdown)
+        ]
+    return statistics
+
 @detection_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """獲取系統統計資料"""
+    """
+    獲取系統統計資料（讀取彙總表，不掃描檢測記錄）
+
+    可選參數:
+        camera_id / location: 只統計指定相機或位置
+        start / end: ISO 時間，回傳區間內的時間序列
+        granularity: hour (預設) 或 day
+        breakdown: camera 或 location，回傳各相機/位置的總數
+    """
     try:
-        total_detections = Detection.query.count()
-        bear_detections = Detection.query.filter_by(bear_detected=True).count()
-        recent_detections = Detection.query.order_by(Detection.detected_at.desc()).limit(10).all()
-        
-        # 計算檢測率
-        detection_rate = (bear_detections / total_detections * 100) if total_detections > 0 else 0
-        
-        statistics = {
-            'total_detections': total_detections,
-            'bear_detections': bear_detections,
-            'detection_rate': round(detection_rate, 2),
-            'recent_count': len(recent_detections)
-        }
-        
+        try:
+            statistics = build_statistics(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
         return jsonify({
             'success': True,
             'statistics': statistics
@@ -97,55 +291,94 @@ def detect_bear():
             }), 400
         
         if file and allowed_file(file.filename):
+            # 每台相機的速率限制在讀取圖片前檢查，重試迴圈中的相機不會佔用其他相機的資源
+            admission = get_admission()
+            lane = None
+            if admission is not None:
+                lane = admission.lane_for(camera_id, is_backfill(request.values))
+                if camera_id != 'unknown':
+                    admission.check_rate(camera_id, lane)
+
+            with time_stage('upload_read'):
+                image_bytes = file.read()
+            detector = get_bear_detector()
+            try:
+                threshold = request_confidence_threshold(detector)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'信心度閾值格式錯誤: {e}'
+                }), 400
+
+            # 相同圖片、模型與閾值已檢測過時，直接沿用既有記錄與結果圖片
+            cache_key = make_cache_key(image_bytes, detector.get_model_identity(), threshold)
+            cached_id = result_cache.get(cache_key)
+            if cached_id is not None:
+                cached_detection = db.session.get(Detection, cached_id)
+                if cached_detection is not None:
+                    response_data = build_detection_response(cached_detection)
+                    response_data['cached'] = True
+                    return jsonify(response_data)
+                result_cache.invalidate(cache_key)
+
+            # 同一台相機時間窗內的近似重複影格沿用先前的檢測記錄
+            tracker = get_event_tracker()
+            frame_hash = None
+            if tracker is not None:
+                frame_hash, duplicate_response = tracker.check(camera_id, image_bytes, (detector.get_model_identity(), threshold))
+                if duplicate_response is not None:
+                    return jsonify(duplicate_response)
+
             # 確保上傳資料夾存在
             upload_folder = ensure_upload_folder()
             
             # 生成唯一檔名
             filename = secure_filename(file.filename)
             unique_filename = f"{uuid.uuid4()}_{filename}"
-            filepath = os.path.join(upload_folder, unique_filename)
-            
-            # 保存原始圖片
-            file.save(filepath)
-            
-            # 使用YOLO模型進行檢測
-            detector = get_bear_detector()
-            detection_result = detector.detect_bear(filepath, upload_folder)
-            
-            bear_detected = detection_result.get('bear_detected', False)
-            confidence = detection_result.get('confidence', 0.0)
-            result_image_filename = detection_result.get('result_image_path')
-            
-            # 創建檢測記錄
-            detection = Detection(
-                camera_id=camera_id,
-                location=location,
-                bear_detected=bear_detected,
-                confidence=confidence,
-                detected_at=datetime.utcnow(),
-                image_filename=unique_filename,
-                result_image_filename=result_image_filename
-            )
-            
-            db.session.add(detection)
-            db.session.commit()
+            filepath = sharded_path(upload_folder, unique_filename)
             
-            response_data = {
-                'bear_detected': bear_detected,
-                'confidence': confidence,
-                'detected_at': detection.detected_at.isoformat(),
-                'location': location,
-                'image_url': f'/api/uploads/{unique_filename}',
-                'detection_id': detection.id
-            }
+            # 非同步模式：保存原始圖片後排入背景工作佇列，立即回傳工作 id
+            if request.args.get('async') in ('1', 'true'):
+                job_pool = get_job_pool()
+                if job_pool is None:
+                    return jsonify({
+                        'success': False,
+                        'error': '未啟用非同步檢測'
+                    }), 400
+
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                with open(filepath, 'wb') as f:
+                    f.write(image_bytes)
+                job = job_pool.enqueue(unique_filename, camera_id, location)
+                return jsonify({
+                    'success': True,
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': f'/api/jobs/{job.id}'
+                }), 202
             
-            # 如果有檢測結果圖片，添加到回應中
-            if result_image_filename:
-                response_data['result_image_url'] = f'/api/uploads/{result_image_filename}'
+            # 取得推論名額後才保存圖片，被拒絕的請求不留下檔案
+            with admission.slot(lane) if admission is not None else nullcontext():
+                # 保存原始圖片（背景寫入），檢測直接使用記憶體中的圖片
+                artifact_writer.write(filepath, image_bytes)
+                image = UploadedImage(image_bytes, unique_filename)
+
+                # 使用YOLO模型進行檢測並創建檢測記錄
+                detection, detection_result, response_data = run_detection(
+                    detector, image, unique_filename, upload_folder, camera_id, location, threshold
+                )
+            # 抽樣的請求在背景以影子版本推論比較，不影響回應
+            model_registry.maybe_shadow(image, detection_result, threshold)
             
-            # 如果檢測過程有錯誤，添加錯誤信息
-            if 'error' in detection_result:
-                response_data['warning'] = detection_result['error']
+            # 失敗的結果不寫入快取
+            if 'error' not in detection_result:
+                result_cache.set(cache_key, detection.id)
+
+            if tracker is not None:
+                event_id = tracker.observe(camera_id, location, frame_hash, (detector.get_model_identity(), threshold),
+                                           detection, detection_result)
+                if event_id is not None:
+                    response_data['event_id'] = event_id
             
             return jsonify(response_data)
         
@@ -154,30 +387,313 @@ def detect_bear():
             'error': '不支援的檔案格式'
         }), 400
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': f'檢測過程發生錯誤: {str(e)}'
         }), 500
 
+@detection_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查詢非同步檢測工作狀態，可用 ?wait=秒數 長輪詢等待完成"""
+    try:
+        job_pool = get_job_pool()
+        wait = min(request.args.get('wait', 0, type=float), 30.0)
+
+        if job_pool is not None and wait > 0:
+            job = job_pool.wait_for(job_id, wait)
+        else:
+            job = db.session.get(DetectionJob, job_id)
+
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': '找不到檢測工作'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@detection_bp.route('/detect-video', methods=['POST'])
+def detect_video():
+    """
+    上傳影片檔（video）或提供串流網址（stream_url），於背景抽樣影格檢測
+
+    每個熊出沒事件寫入一筆檢測記錄；立即回傳任務 id，以 /api/tasks/<id> 查詢進度。
+    """
+    try:
+        task_registry = get_task_registry()
+        if task_registry is None:
+            return jsonify({
+                'success': False,
+                'error': '未啟用背景任務'
+            }), 400
+
+        camera_id = request.form.get('camera_id', 'unknown')
+        location = request.form.get('location', '未知位置')
+        stream_url = request.form.get('stream_url', '').strip()
+        video = request.files.get('video')
+        max_seconds = request.form.get('max_seconds', type=float)
+
+        if video is not None and video.filename:
+            extension = video.filename.rsplit('.', 1)[-1].lower() if '.' in video.filename else ''
+            if extension not in VIDEO_EXTENSIONS:
+                return jsonify({
+                    'success': False,
+                    'error': '不支援的影片格式'
+                }), 400
+            # 影片以串流方式寫入暫存檔，不整個讀入記憶體
+            fd, source = tempfile.mkstemp(suffix=f'.{extension}')
+            with os.fdopen(fd, 'wb') as f:
+                video.save(f)
+            is_temporary = True
+        elif stream_url:
+            if not stream_url.lower().startswith(STREAM_SCHEMES):
+                return jsonify({
+                    'success': False,
+                    'error': '不支援的串流網址'
+                }), 400
+            source = stream_url
+            is_temporary = False
+            # 串流沒有結尾，預設只處理 STREAM_MAX_SECONDS 秒
+            if max_seconds is None:
+                max_seconds = float(os.getenv('STREAM_MAX_SECONDS', 300))
+        else:
+            return jsonify({
+                'success': False,
+                'error': '沒有上傳影片檔案或串流網址'
+            }), 400
+
+        upload_folder = ensure_upload_folder()
+
+        tracker = get_event_tracker()
+
+        def run(task):
+            # 任務可能比請求長得多，整段期間持有租約，切換版本後舊版本等任務結束才釋放
+            try:
+                with model_registry.lease() as detector:
+                    return process_video(
+                        task, detector, source, camera_id, location, upload_folder,
+                        sample_fps=float(os.getenv('VIDEO_SAMPLE_FPS', 1.0)),
+                        active_fps=float(os.getenv('VIDEO_ACTIVE_FPS', 4.0)),
+                        motion_threshold=float(os.getenv('VIDEO_MOTION_THRESHOLD', 0.01)),
+                        keyframe_seconds=float(os.getenv('VIDEO_KEYFRAME_SECONDS', 30)),
+                        event_gap_seconds=float(os.getenv('VIDEO_EVENT_GAP_SECONDS', 10)),
+                        max_seconds=max_seconds,
+                        tracker=tracker
+                    )
+            finally:
+                if is_temporary:
+                    os.remove(source)
+
+        task = task_registry.submit('video', run, {
+            'camera_id': camera_id,
+            'location': location,
+            'source': 'upload' if is_temporary else 'stream'
+        })
+        return jsonify({
+            'success': True,
+            'task_id': task.id,
+            'status': task.status,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'影片檢測發生錯誤: {str(e)}'
+        }), 500
+
+@detection_bp.route('/detect-bulk', methods=['POST'])
+def detect_bulk():
+    """
+    批次檢測：上傳 zip/tar 壓縮檔（archive），或以 multipart 一次上傳多張圖片（images）
+
+    立即回傳任務 id，以 /api/tasks/<id> 查詢進度；完成後任務結果包含每個檔案的檢測結果。
+    """
+    try:
+        task_registry = get_task_registry()
+        if task_registry is None:
+            return jsonify({
+                'success': False,
+                'error': '未啟用背景任務'
+            }), 400
+
+        camera_id = request.form.get('camera_id', 'unknown')
+        location = request.form.get('location', '未知位置')
+        archive = request.files.get('archive')
+        images = [f for f in request.files.getlist('images') if f.filename]
+        upload_folder = ensure_upload_folder()
+
+        if archive is not None and archive.filename:
+            lower_name = archive.filename.lower()
+            suffix = next((s for s in ARCHIVE_SUFFIXES if lower_name.endswith(s)), None)
+            if suffix is None:
+                return jsonify({
+                    'success': False,
+                    'error': '不支援的壓縮檔格式'
+                }), 400
+            # 壓縮檔本身以串流方式寫入暫存檔，項目在背景任務中逐一讀取
+            fd, archive_path = tempfile.mkstemp(suffix=suffix)
+            with os.fdopen(fd, 'wb') as f:
+                archive.save(f)
+            try:
+                total = count_archive_images(archive_path, ALLOWED_EXTENSIONS)
+            except ValueError as e:
+                os.remove(archive_path)
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            entries = iter_archive_entries(
+                archive_path, ALLOWED_EXTENSIONS, int(os.getenv('BULK_MAX_ENTRY_BYTES', 50 * 1024 * 1024))
+            )
+            source = 'archive'
+        elif images:
+            # multipart 上傳的圖片直接保存為原始圖片
+            stored_files = []
+            for image in images:
+                if not allowed_file(image.filename):
+                    continue
+                unique_filename = unique_upload_name(image.filename)
+                image_path = sharded_path(upload_folder, unique_filename)
+                os.makedirs(os.path.dirname(image_path), exist_ok=True)
+                image.save(image_path)
+                stored_files.append((image.filename, unique_filename))
+            if not stored_files:
+                return jsonify({
+                    'success': False,
+                    'error': '不支援的檔案格式'
+                }), 400
+            archive_path = None
+            total = len(stored_files)
+            entries = iter_stored_entries(stored_files, upload_folder)
+            source = 'multipart'
+        else:
+            return jsonify({
+                'success': False,
+                'error': '沒有上傳壓縮檔或圖片'
+            }), 400
+
+        admission = get_admission()
+
+        def run(task):
+            task.update(total=total, processed=0)
+            try:
+                with model_registry.lease() as detector:
+                    return process_bulk(
+                        task, detector, entries, camera_id, location, upload_folder,
+                        concurrency=int(os.getenv('BULK_CONCURRENCY', 8)),
+                        insert_batch_size=int(os.getenv('BULK_INSERT_BATCH_SIZE', 100)),
+                        admission=admission,
+                        max_files=int(os.getenv('BULK_RESULT_MAX_FILES', 100)),
+                        max_errors=int(os.getenv('BULK_RESULT_MAX_ERRORS', 100))
+                    )
+            finally:
+                if archive_path is not None:
+                    os.remove(archive_path)
+
+        task = task_registry.submit('bulk', run, {
+            'camera_id': camera_id,
+            'location': location,
+            'source': source
+        })
+        return jsonify({
+            'success': True,
+            'task_id': task.id,
+            'status': task.status,
+            'total': total,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'批次檢測發生錯誤: {str(e)}'
+        }), 500
+
+@detection_bp.route('/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """查詢背景任務進度"""
+    task_registry = get_task_registry()
+    task = task_registry.get(task_id) if task_registry is not None else None
+    if task is None:
+        return jsonify({
+            'success': False,
+            'error': '找不到任務'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'task': task.to_dict()
+    })
+
+def list_recent_detections(args):
+    """
+    依查詢參數分頁查詢檢測記錄（Flask 與 ASGI 路由共用）
+
+    Returns:
+        tuple: (記錄列表, 下一頁游標或 None)
+    Raises:
+        ValueError: 時間或游標格式錯誤
+    """
+    after_id = args.get('after_id')
+    if after_id is not None:
+        # 無法使用 SSE 時的輪詢：取 after_id 之後的新記錄（由舊到新），客戶端以最後一筆的 id 作為下次的 after_id
+        if not after_id.isdigit():
+            raise ValueError('after_id 必須為整數')
+        return query_detections_after(
+            int(after_id),
+            camera_id=args.get('camera_id'),
+            location=args.get('location'),
+            bear_only=args.get('bear_only') in ('1', 'true'),
+            limit=clamp_page_size(args.get('limit', type=int))
+        ), None
+    start, end = parse_time_range(args)
+    return query_detections(
+        camera_id=args.get('camera_id'),
+        location=args.get('location'),
+        bear_only=args.get('bear_only') in ('1', 'true'),
+        start=start,
+        end=end,
+        cursor=args.get('cursor'),
+        limit=args.get('limit', 10, type=int)
+    )
+
 @detection_bp.route('/recent-detections', methods=['GET'])
 def get_recent_detections():
-    """獲取最近的檢測記錄"""
+    """
+    獲取最近的檢測記錄
+
+    可選參數:
+        limit: 每頁筆數 (最多 100)
+        cursor: 上一頁回應標頭 X-Next-Cursor 的值
+        after_id: 只取此 id 之後的新記錄（由舊到新），供無法使用 SSE 的客戶端輪詢
+        camera_id / location / bear_only / start / end: 篩選條件
+    """
     try:
-        limit = request.args.get('limit', 10, type=int)
-        detections = Detection.query.order_by(Detection.detected_at.desc()).limit(limit).all()
-        
-        result = []
-        for detection in detections:
-            detection_data = detection.to_dict()
-            # 添加圖片URL
-            if detection.image_filename:
-                detection_data['image_url'] = f'/api/uploads/{detection.image_filename}'
-            if detection.result_image_filename:
-                detection_data['result_image_url'] = f'/api/uploads/{detection.result_image_filename}'
-            result.append(detection_data)
+        try:
+            result, next_cursor = list_recent_detections(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        return jsonify(result)
+        response = jsonify(result)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
         
     except Exception as e:
         return jsonify({
@@ -185,20 +701,332 @@ def get_recent_detections():
             'error': str(e)
         }), 500
 
+@detection_bp.route('/export', methods=['GET'])
+def export_detections():
+    """
+    串流匯出檢測記錄
+
+    可選參數:
+        format: csv (預設) / ndjson / parquet
+        camera_id / location / bear_only / start / end: 篩選條件
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f'format 只支援 {", ".join(EXPORT_FORMATS)}'
+        }), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({
+            'success': False,
+            'error': '匯出 Parquet 需要安裝 pyarrow'
+        }), 400
+
+    try:
+        start, end = parse_time_range(request.args)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '時間格式錯誤，請使用 ISO 8601'
+        }), 400
+
+    statement = export_statement(
+        camera_id=request.args.get('camera_id'),
+        location=request.args.get('location'),
+        bear_only=request.args.get('bear_only') in ('1', 'true'),
+        start=start,
+        end=end
+    )
+    extension, content_type = EXPORT_FORMATS[fmt]
+    filename = f"detections-{datetime.utcnow():%Y%m%dT%H%M%S}.{extension}"
+    chunks = stream_export(fmt, statement, chunk_size=int(os.getenv('EXPORT_CHUNK_SIZE', 10000)))
+    return Response(
+        stream_with_context(chunks),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@detection_bp.route('/analytics', methods=['GET'])
+def get_analytics():
+    """
+    各相機的每小時活動量與信心度分布
+
+    可選參數:
+        camera_id / location / start / end: 篩選條件 (未指定 start 時為最近 ANALYTICS_DEFAULT_DAYS 天)
+        tz_offset: 每小時統計使用的時區偏移小時數 (預設 ANALYTICS_TZ_OFFSET)
+    """
+    try:
+        try:
+            start, end = parse_time_range(request.args)
+        except ValueError:
+            raise ValueError('時間格式錯誤，請使用 ISO 8601')
+        tz_offset = float(request.args.get('tz_offset', os.getenv('ANALYTICS_TZ_OFFSET', 0)))
+        if not -12 <= tz_offset <= 14:
+            raise ValueError('tz_offset 必須介於 -12 到 14 之間')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        camera_id = request.args.get('camera_id')
+        location = request.args.get('location')
+        # 以查詢條件為鍵；未指定 start 時的預設範圍在計算時才決定，同一組參數可共用快取
+        cache_key = json.dumps([
+            camera_id, location, start and start.isoformat(), end and end.isoformat(), tz_offset
+        ])
+        analytics = analytics_cache.get(cache_key)
+        cached = analytics is not None
+        if not cached:
+            now = datetime.utcnow()
+            if start is None:
+                start = (end or now) - timedelta(days=int(os.getenv('ANALYTICS_DEFAULT_DAYS', 30)))
+            with time_stage('analytics'):
+                analytics = compute_activity(
+                    camera_id=camera_id, location=location, start=start, end=end, tz_offset_hours=tz_offset,
+                    chunk_size=int(os.getenv('ANALYTICS_CHUNK_SIZE', 50000))
+                )
+            analytics['window'] = {
+                'start': start.isoformat(),
+                'end': end.isoformat() if end else None,
+                'tz_offset': tz_offset
+            }
+            # 已結束的時間範圍不會再有新的檢測記錄
+            live = end is None or end > now
+            analytics_cache.set(cache_key, analytics, float(os.getenv('ANALYTICS_LIVE_TTL', 60)) if live else None)
+
+        return jsonify({
+            'success': True,
+            'cached': cached,
+            'analytics': analytics
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@detection_bp.route('/events', methods=['GET'])
+def get_events():
+    """
+    列出熊出沒事件（同一台相機連續的檢測合併為一筆）
+
+    可選參數:
+        camera_id / location / start / end: 篩選條件
+        limit: 筆數 (預設 20，最多 100)
+        before_id: 上一頁最後一筆事件的 id
+    """
+    try:
+        start, end = parse_time_range(request.args)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '時間格式錯誤，請使用 ISO 8601'
+        }), 400
+
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        events = query_events(
+            camera_id=request.args.get('camera_id'),
+            location=request.args.get('location'),
+            start=start,
+            end=end,
+            limit=limit,
+            before_id=request.args.get('before_id', type=int)
+        )
+        tracker = get_event_tracker()
+        results = []
+        for event in events:
+            data = event.to_dict()
+            if tracker is not None:
+                data['active'] = tracker.is_active(event)
+            results.append(data)
+
+        return jsonify({
+            'success': True,
+            'events': results,
+            'next_before_id': events[-1].id if len(events) == limit else None
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@detection_bp.route('/events/<int:event_id>', methods=['GET'])
+def get_event(event_id):
+    """查詢單一事件"""
+    event = db.session.get(DetectionEvent, event_id)
+    if event is None:
+        return jsonify({
+            'success': False,
+            'error': '找不到事件'
+        }), 404
+
+    data = event.to_dict()
+    tracker = get_event_tracker()
+    if tracker is not None:
+        data['active'] = tracker.is_active(event)
+    return jsonify({
+        'success': True,
+        'event': data
+    })
+
+def format_sse(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_name}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+@detection_bp.route('/live-detections', methods=['GET'])
+def live_detections():
+    """
+    以 Server-Sent Events 推送新的檢測記錄
+
+    可選參數:
+        camera_id / location / bear_only: 篩選條件
+    重新連線時瀏覽器會帶 Last-Event-ID 標頭，期間遺漏的記錄會先從資料庫補齊。
+    """
+    filters = {
+        'camera_id': request.args.get('camera_id'),
+        'location': request.args.get('location'),
+        'bear_only': request.args.get('bear_only') in ('1', 'true')
+    }
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    try:
+        subscription = event_hub.subscribe(**filters)
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+
+    # 先訂閱再補齊，兩者之間寫入的記錄可能重複，以 id 去除
+    missed = []
+    if last_event_id and last_event_id.isdigit():
+        missed = query_detections_after(int(last_event_id), **filters)
+    heartbeat = float(os.getenv('LIVE_EVENTS_HEARTBEAT', 15))
+
+    def stream():
+        replayed = {event['id'] for event in missed}
+        try:
+            yield f'retry: {int(os.getenv("LIVE_EVENTS_RETRY_MS", 3000))}\n\n'
+            for event in missed:
+                yield format_sse('detection', event, event['id'])
+
+            while True:
+                if subscription.evicted:
+                    # 客戶端太慢被移除，通知後關閉連線，重新連線時由 Last-Event-ID 補齊
+                    yield format_sse('evicted', {'reason': '事件佇列已滿'})
+                    return
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    # 定期送出註解行，偵測已斷線的客戶端並避免代理伺服器逾時
+                    yield ': keepalive\n\n'
+                    continue
+                if event['id'] in replayed:
+                    continue
+                yield format_sse('detection', event, event['id'])
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @detection_bp.route('/uploads/<filename>')
 def uploaded_file(filename):
-    """提供上傳檔案的存取"""
-    upload_folder = os.path.join(current_app.static_folder, 'uploads')
-    return send_from_directory(upload_folder, filename)
+    """
+    提供上傳檔案的存取
+
+    可選參數:
+        size: thumb / small / medium / full，回傳縮圖等衍生圖
+        format: webp（預設）/ jpeg
+    """
+    # 剛上傳的檔案可能仍在背景寫入中
+    artifact_writer.wait(filename)
+    max_age = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 31536000))
+
+    try:
+        location = upload_storage.resolve(filename, request.args.get('size'), request.args.get('format'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    if location is None:
+        return jsonify({'success': False, 'error': '找不到檔案'}), 404
+
+    tier, path = location
+    if tier == 'hot' or not path.endswith('.gz'):
+        # 冷儲存中原樣搬移的圖片同樣直接回傳檔案
+        response = send_file(path, conditional=True, max_age=max_age)
+    else:
+        # 冷儲存中 gzip 壓縮的原始圖片解壓縮後回傳，ETag 以壓縮檔的修改時間與大小產生
+        stat = os.stat(path)
+        response = send_file(
+            io.BytesIO(upload_storage.read(filename)),
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            download_name=filename,
+            conditional=True,
+            etag=f"cold-{int(stat.st_mtime)}-{stat.st_size}",
+            last_modified=stat.st_mtime,
+            max_age=max_age
+        )
+
+    # 檔名皆含 uuid，內容不會改變
+    response.cache_control.immutable = True
+    return response
+
+@detection_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 格式的指標；?format=json 回傳 JSON"""
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'metrics': registry.snapshot()
+        })
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 @detection_bp.route('/health', methods=['GET'])
 def health_check():
     """健康檢查端點"""
-    return jsonify({
+    response = {
         'status': 'healthy',
         'service': 'bear-detection-backend',
         'timestamp': datetime.utcnow().isoformat()
-    })
+    }
+
+    # 只回報已建立的檢測服務狀態，避免健康檢查觸發初始化
+    if model_registry.active is not None:
+        upstream = model_registry.active.get_health()
+        response['upstream'] = upstream
+        response['status'] = upstream['status']
+
+    return jsonify(response)
+
+
+@detection_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """就緒檢查端點：模型預熱完成且資料庫可用時才回傳 200"""
+    report = startup_report.snapshot()
+    ready = startup_report.is_ready
+
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        report['database'] = 'ok'
+    except Exception as e:
+        report['database'] = str(e)
+        ready = False
+
+    report['ready'] = ready
+    return jsonify(report), 200 if ready else 503
 
 
 @detection_bp.route('/model-info', methods=['GET'])
@@ -207,6 +1035,7 @@ def get_model_info():
     try:
         detector = get_bear_detector()
         model_info = detector.get_model_info()
+        model_info['result_cache'] = result_cache.stats()
         
         return jsonify({
             'success': True,
@@ -219,6 +1048,20 @@ def get_model_info():
             'error': str(e)
         }), 500
 
+@detection_bp.route('/admission', methods=['GET'])
+def get_admission_status():
+    """准入控制的設定、進行中的推論數與各車道的等候數"""
+    admission = get_admission()
+    if admission is None:
+        return jsonify({
+            'success': False,
+            'error': '未啟用准入控制'
+        }), 404
+    return jsonify({
+        'success': True,
+        'admission': admission.stats()
+    })
+
 @detection_bp.route('/set-confidence', methods=['POST'])
 def set_confidence_threshold():
     """設定信心度閾值"""
@@ -232,8 +1075,9 @@ def set_confidence_threshold():
                 'error': '請提供信心度閾值'
             }), 400
         
-        detector = get_bear_detector()
-        detector.set_confidence_threshold(threshold)
+        threshold = parse_confidence_threshold(threshold)
+        # 寫入版本記錄，pre-fork 的其他 worker 同步時套用同一閾值
+        model_registry.set_confidence_threshold(threshold)
         
         return jsonify({
             'success': True,
@@ -251,3 +1095,93 @@ def set_confidence_threshold():
             'error': str(e)
         }), 500
 
+@detection_bp.route('/models', methods=['GET'])
+def list_models():
+    """目前版本、影子版本的推論耗時與判定差異，以及背景載入狀態"""
+    get_bear_detector()
+    return jsonify({
+        'success': True,
+        'models': model_registry.snapshot()
+    })
+
+@detection_bp.route('/models/load', methods=['POST'])
+def load_model():
+    """
+    在背景載入並預熱新版本，完成後切換上線
+
+    JSON: {"version": "v2", "backend": "onnx", "model_path": "...", "api_url": "..."}
+    立即回傳 202，以 GET /api/models 查詢載入狀態；進行中的請求在舊版本上完成。
+    """
+    try:
+        spec = ModelSpec.from_dict(request.get_json(silent=True))
+        get_bear_detector()
+        loading = model_registry.load(spec)
+        return jsonify({
+            'success': True,
+            'loading': loading,
+            'status_url': '/api/models'
+        }), 202
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+
+@detection_bp.route('/models/shadow', methods=['POST'])
+def set_shadow_model():
+    """
+    設定影子版本：依 sample_rate 抽樣的請求在背景以影子版本推論並比較判定結果
+
+    JSON: {"version": "v2", ..., "sample_rate": 0.1}；{"enabled": false} 停用影子版本
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        get_bear_detector()
+        if data.get('enabled') is False:
+            model_registry.clear_shadow()
+            return jsonify({
+                'success': True,
+                'message': '已停用影子版本'
+            })
+
+        sample_rate = float(data.get('sample_rate', 0.1))
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError('sample_rate 必須介於 0 到 1 之間')
+        spec = ModelSpec.from_dict(data)
+        loading = model_registry.load(spec, shadow=True, shadow_rate=sample_rate)
+        return jsonify({
+            'success': True,
+            'loading': loading,
+            'status_url': '/api/models'
+        }), 202
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+
+@detection_bp.route('/models/promote', methods=['POST'])
+def promote_shadow_model():
+    """將已預熱的影子版本直接切換為目前版本"""
+    try:
+        get_bear_detector()
+        version = model_registry.promote_shadow()
+        return jsonify({
+            'success': True,
+            'message': f'版本 {version} 已切換上線'
+        })
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from src.services.metrics import registry
+
+# 依優先順序排列：critical 為靠近村落的高風險相機，bulk 為回補歷史影像等批次流量
+LANES = ('critical', 'normal', 'bulk')
+LANE_PRIORITY = {lane: i for i, lane in enumerate(LANES)}
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class AdmissionRejected(Exception):
+    """請求未獲准進入推論，路由回傳 429 與 Retry-After"""
+
+    def __init__(self, reason, retry_after, message):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """每秒補充 rate 個權杖、最多累積 burst 個"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = now
+
+    def take(self, now):
+        """取用一個權杖；不足時回傳需等待的秒數，成功回傳 0"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class _Waiter:
+    __slots__ = ('lane', 'bounded', 'granted', 'rejected', 'notify')
+
+    def __init__(self, lane, bounded, notify):
+        self.lane = lane
+        self.bounded = bounded
+        self.granted = False
+        self.rejected = None
+        self.notify = notify
+
+
+class AdmissionController:
+    """
+    /api/detect 的准入控制
+
+    - 每台相機一個權杖桶，重試迴圈中的相機只會被自己的速率限制擋下
+    - 同時推論數上限 max_concurrent；額滿時進入依車道優先順序排列的等候佇列，
+      釋放的名額直接交給佇列中優先順序最高、最早到的請求
+    - 佇列最多 queue_size 個請求，滿了時高優先的請求擠掉最低優先、最晚到的等候者，
+      否則立即回傳 429；等候超過 max_wait 秒同樣回傳 429
+    - 背景批次任務以不限等候時間的方式排在 bulk 車道，不佔佇列名額也不會被擠掉
+
+    Retry-After 依近期平均推論時間與前方等候數估算。
+
+    狀態在行程記憶體中；pre-fork 多 worker 時傳入 workers，設定值視為整個服務的上限，
+    平均分給各 worker（相機的請求由 gunicorn 大致平均分散到各 worker）。
+    """
+
+    def __init__(self, max_concurrent=16, queue_size=64, max_wait=10.0, camera_rate=5.0, camera_burst=20,
+                 critical_cameras=(), max_cameras=4096, workers=1):
+        self.workers = max(1, int(workers))
+        self.max_concurrent = max(1, math.ceil(max_concurrent / self.workers))
+        self.queue_size = max(1, math.ceil(queue_size / self.workers))
+        self.max_wait = max_wait
+        self.camera_rate = camera_rate / self.workers
+        self.camera_burst = max(1, math.ceil(camera_burst / self.workers))
+        self.critical_cameras = frozenset(critical_cameras)
+        self.max_cameras = max_cameras
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queue = []
+        self._bounded_waiting = 0
+        self._seq = itertools.count()
+        self._buckets = OrderedDict()
+        # 推論時間的指數移動平均，用於估算 Retry-After
+        self._service_time = 0.5
+
+        self.in_flight = registry.gauge('admission_in_flight', '已獲准進行中的推論數')
+        self.queue_depth = registry.gauge('admission_queue_depth', '等候推論名額的請求數')
+
+    def lane_for(self, camera_id, backfill=False):
+        if camera_id in self.critical_cameras:
+            return 'critical'
+        return 'bulk' if backfill else 'normal'
+
+    # ---- 每台相機的速率限制 ----
+
+    def check_rate(self, camera_id, lane):
+        """
+        Raises:
+            AdmissionRejected: 該相機超過速率限制
+        """
+        if self.camera_rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(camera_id)
+            if bucket is None:
+                bucket = self._buckets[camera_id] = TokenBucket(self.camera_rate, self.camera_burst, now)
+                while len(self._buckets) > self.max_cameras:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(camera_id)
+            wait = bucket.take(now)
+        if wait > 0:
+            self._rejected('rate_limited', lane)
+            raise AdmissionRejected('rate_limited', wait, f'相機 {camera_id} 請求過於頻繁')
+
+    # ---- 同時推論數與等候佇列 ----
+
+    def _retry_after(self, ahead):
+        return max(1.0, math.ceil(self._service_time * (ahead + 1) / self.max_concurrent))
+
+    def _rejected(self, reason, lane):
+        registry.counter(
+            'admission_rejected_total', '准入控制拒絕的請求數', {'reason': reason, 'lane': lane}
+        ).inc()
+
+    def _enter(self, waiter):
+        """在鎖內呼叫：取得名額回傳 True，排入佇列回傳 False"""
+        if self._active < self.max_concurrent and not self._queue:
+            self._active += 1
+            waiter.granted = True
+            return True
+
+        if waiter.bounded and self._bounded_waiting >= self.queue_size:
+            victim = max(
+                (entry for entry in self._queue if entry[2].bounded),
+                key=lambda entry: (entry[0], entry[1]),
+                default=None
+            )
+            if victim is None or victim[0] <= LANE_PRIORITY[waiter.lane]:
+                waiter.rejected = 'queue_full'
+                return False
+            # 擠掉最低優先、最晚到的等候者
+            self._queue.remove(victim)
+            heapq.heapify(self._queue)
+            self._bounded_waiting -= 1
+            victim[2].rejected = 'preempted'
+            victim[2].notify()
+
+        heapq.heappush(self._queue, (LANE_PRIORITY[waiter.lane], next(self._seq), waiter))
+        if waiter.bounded:
+            self._bounded_waiting += 1
+        self.queue_depth.set(len(self._queue))
+        return False
+
+    def _abandon(self, waiter):
+        """在鎖內呼叫：等候逾時，仍在佇列中時移除"""
+        for i, entry in enumerate(self._queue):
+            if entry[2] is waiter:
+                self._queue.pop(i)
+                heapq.heapify(self._queue)
+                if waiter.bounded:
+                    self._bounded_waiting -= 1
+                self.queue_depth.set(len(self._queue))
+                waiter.rejected = 'queue_timeout'
+                return
+
+    def _release(self, seconds):
+        with self._lock:
+            self._service_time = 0.9 * self._service_time + 0.1 * seconds
+            if self._queue:
+                # 名額直接交給下一個等候者，進行中的數量不變
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.bounded:
+                    self._bounded_waiting -= 1
+                self.queue_depth.set(len(self._queue))
+                waiter.granted = True
+                waiter.notify()
+            else:
+                self._active -= 1
+        self.in_flight.dec()
+
+    def _raise_rejected(self, waiter):
+        with self._lock:
+            retry_after = self._retry_after(self._bounded_waiting)
+        self._rejected(waiter.rejected, waiter.lane)
+        message = '推論等候逾時' if waiter.rejected == 'queue_timeout' else '推論佇列已滿'
+        raise AdmissionRejected(waiter.rejected, retry_after, message)
+
+    def _observe_wait(self, lane, started):
+        registry.histogram(
+            'admission_wait_seconds', WAIT_BUCKETS, '等候推論名額的時間', {'lane': lane}
+        ).observe(time.perf_counter() - started)
+
+    @contextmanager
+    def slot(self, lane='normal', bounded=True):
+        """
+        取得一個推論名額（同步版）
+
+        bounded 時最多等候 max_wait 秒且受佇列長度限制；背景任務傳 bounded=False 不限等候時間。
+
+        Raises:
+            AdmissionRejected: 佇列已滿、被高優先請求擠掉或等候逾時
+        """
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = _Waiter(lane, bounded, event.set)
+        with self._lock:
+            self._enter(waiter)
+        if not waiter.granted and waiter.rejected is None:
+            event.wait(self.max_wait if waiter.bounded else None)
+            with self._lock:
+                if not waiter.granted and waiter.rejected is None:
+                    self._abandon(waiter)
+        if not waiter.granted:
+            self._raise_rejected(waiter)
+
+        self.in_flight.inc()
+        self._observe_wait(lane, started)
+        admitted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - admitted_at)
+
+    @asynccontextmanager
+    async def slot_async(self, lane='normal'):
+        """取得一個推論名額（asyncio 版，等候時不佔用執行緒）"""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(lane, True, notify)
+        with self._lock:
+            self._enter(waiter)
+        if not waiter.granted and waiter.rejected is None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # 用戶端中斷連線：放棄等候，已交付的名額要歸還
+                with self._lock:
+                    if not waiter.granted:
+                        self._abandon(waiter)
+                if waiter.granted:
+                    self.in_flight.inc()
+                    self._release(0.0)
+                raise
+            with self._lock:
+                if not waiter.granted and waiter.rejected is None:
+                    self._abandon(waiter)
+        if not waiter.granted:
+            self._raise_rejected(waiter)
+
+        self.in_flight.inc()
+        self._observe_wait(lane, started)
+        admitted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - admitted_at)
+
+    def stats(self):
+        with self._lock:
+            waiting = {lane: 0 for lane in LANES}
+            for _, _, waiter in self._queue:
+                waiting[waiter.lane] += 1
+            return {
+                'workers': self.workers,
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self._active,
+                'waiting': waiting,
+                'queue_size': self.queue_size,
+                'max_wait_seconds': self.max_wait,
+                'camera_rate': self.camera_rate,
+                'camera_burst': self.camera_burst,
+                'critical_cameras': sorted(self.critical_cameras),
+                'tracked_cameras': len(self._buckets),
+                'mean_service_seconds': round(self._service_time, 4)
+            }
@@ -0,0 +1,119 @@
+import numpy as np
+
+from src.models.detection import Detection, db
+from src.services.detection_export import iter_row_chunks
+from src.services.detection_queries import filter_detections
+
+HOURS = 24
+CONFIDENCE_BINS = 20
+
+
+class ActivityAccumulator:
+    """
+    逐批累加各相機的每小時活動量與信心度分布
+
+    每批查詢結果轉成欄位陣列後以 np.bincount 一次累加，不逐列處理；
+    相機 id 以字典對應到累加矩陣的列（比排序物件陣列快），新相機出現時擴充矩陣。
+    """
+
+    def __init__(self, tz_offset_hours=0):
+        self.tz_offset_seconds = int(round(tz_offset_hours * 3600))
+        self.cameras = {}
+        self.hourly_total = np.zeros((0, HOURS), dtype=np.int64)
+        self.hourly_bear = np.zeros((0, HOURS), dtype=np.int64)
+        self.confidence = np.zeros((0, CONFIDENCE_BINS), dtype=np.int64)
+        self.confidence_sum = np.zeros(0, dtype=np.float64)
+
+    def _camera_indices(self, camera_ids):
+        cameras = self.cameras
+        codes = np.fromiter(
+            (cameras.setdefault(camera_id, len(cameras)) for camera_id in camera_ids),
+            dtype=np.int64, count=len(camera_ids)
+        )
+        grow = len(self.cameras) - len(self.confidence_sum)
+        if grow > 0:
+            self.hourly_total = np.vstack([self.hourly_total, np.zeros((grow, HOURS), dtype=np.int64)])
+            self.hourly_bear = np.vstack([self.hourly_bear, np.zeros((grow, HOURS), dtype=np.int64)])
+            self.confidence = np.vstack([self.confidence, np.zeros((grow, CONFIDENCE_BINS), dtype=np.int64)])
+            self.confidence_sum = np.concatenate([self.confidence_sum, np.zeros(grow)])
+        return codes
+
+    def add(self, rows):
+        """rows 為 (camera_id, detected_at, bear_detected, confidence) 的列"""
+        if not rows:
+            return
+        camera_ids, detected_at, bear_detected, confidence = zip(*rows)
+        codes = self._camera_indices(camera_ids)
+        n_cameras = len(self.cameras)
+
+        # SQLite 的時間為字串，由 NumPy 整批解析，比逐列建立 datetime 物件快得多
+        seconds = np.array(detected_at, dtype='datetime64[s]').astype(np.int64) + self.tz_offset_seconds
+        hours = (seconds // 3600) % HOURS
+        bear = np.array(bear_detected, dtype=bool)
+
+        cells = codes * HOURS + hours
+        self.hourly_total += np.bincount(cells, minlength=n_cameras * HOURS).reshape(n_cameras, HOURS)
+        self.hourly_bear += np.bincount(cells[bear], minlength=n_cameras * HOURS).reshape(n_cameras, HOURS)
+
+        # 信心度分布只統計判定為熊的檢測
+        scores = np.array(confidence, dtype=np.float64)[bear]
+        scores = np.nan_to_num(scores, nan=0.0)
+        bins = np.clip((scores * CONFIDENCE_BINS).astype(np.int64), 0, CONFIDENCE_BINS - 1)
+        bear_codes = codes[bear]
+        self.confidence += np.bincount(
+            bear_codes * CONFIDENCE_BINS + bins, minlength=n_cameras * CONFIDENCE_BINS
+        ).reshape(n_cameras, CONFIDENCE_BINS)
+        self.confidence_sum += np.bincount(bear_codes, weights=scores, minlength=n_cameras)
+
+    def result(self):
+        names = sorted(self.cameras, key=self.cameras.get)
+        bear_counts = self.hourly_bear.sum(axis=1)
+        total_counts = self.hourly_total.sum(axis=1)
+
+        cameras = []
+        for row in np.lexsort((total_counts, bear_counts))[::-1]:
+            bears = int(bear_counts[row])
+            cameras.append({
+                'camera_id': names[row],
+                'total_detections': int(total_counts[row]),
+                'bear_detections': bears,
+                'hourly_total': self.hourly_total[row].tolist(),
+                'hourly_bear': self.hourly_bear[row].tolist(),
+                'peak_hour': int(self.hourly_bear[row].argmax()) if bears else None,
+                'confidence_histogram': self.confidence[row].tolist(),
+                'mean_confidence': round(float(self.confidence_sum[row] / bears), 4) if bears else None
+            })
+
+        all_bears = int(bear_counts.sum())
+        return {
+            'total_detections': int(total_counts.sum()),
+            'bear_detections': all_bears,
+            'hourly_total': self.hourly_total.sum(axis=0).tolist(),
+            'hourly_bear': self.hourly_bear.sum(axis=0).tolist(),
+            'confidence_bins': np.linspace(0.0, 1.0, CONFIDENCE_BINS + 1).round(2).tolist(),
+            'confidence_histogram': self.confidence.sum(axis=0).tolist(),
+            'mean_confidence': round(float(self.confidence_sum.sum() / all_bears), 4) if all_bears else None,
+            'cameras': cameras
+        }
+
+
+def compute_activity(camera_id=None, location=None, start=None, end=None, tz_offset_hours=0, chunk_size=50000):
+    """
+    計算時間範圍內各相機的每小時活動量（依 tz_offset_hours 換算為當地時間）與信心度分布
+
+    以伺服器端游標分批讀取四個欄位，記憶體用量只與相機數有關。
+    """
+    statement = filter_detections(
+        db.select(
+            Detection.camera_id,
+            # 略過 SQLAlchemy 逐列的時間解析，直接取得資料庫的原始值
+            db.type_coerce(Detection.detected_at, db.String),
+            Detection.bear_detected,
+            Detection.confidence
+        ),
+        camera_id, location, False, start, end
+    )
+    accumulator = ActivityAccumulator(tz_offset_hours)
+    for rows in iter_row_chunks(statement, chunk_size):
+        accumulator.add(rows)
+    return accumulator.result()
@@ -0,0 +1,126 @@
+import asyncio
+
+import anyio
+import httpx
+import requests
+
+from src.services.http_client import (
+    RETRYABLE_STATUS_CODES, CircuitBreaker, CircuitOpenError, backoff_delay, parse_retry_after
+)
+from src.services.metrics import registry, time_stage
+from src.services.preprocess import Preprocessor
+
+
+class AsyncResilientClient:
+    """
+    ResilientClient 的 asyncio 版本
+
+    重試、退避與熔斷規則與同步版相同；例外轉換為 requests 的例外類型，
+    讓檢測服務的錯誤處理與回應格式維持一致。semaphore 限制同時送出的上游請求數。
+    """
+
+    def __init__(self, pool_size=100, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 max_in_flight=256, breaker=None):
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_in_flight = max_in_flight
+        # 與同步客戶端共用熔斷器時，/api/health 反映兩條路徑的上游狀態
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._semaphore = None
+        self.in_flight = registry.gauge('upstream_requests_in_flight', '進行中的非同步上游推論請求數')
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        )
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, url, breaker=None, **kwargs):
+        """breaker 指定時改用該熔斷器（例如各模型版本後端各自的熔斷器）"""
+        async with self._semaphore:
+            self.in_flight.inc()
+            try:
+                return await self._post(url, breaker or self.breaker, **kwargs)
+            finally:
+                self.in_flight.dec()
+
+    async def _post(self, url, breaker, **kwargs):
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                raise CircuitOpenError(
+                    f"上游服務暫停使用中，{breaker.retry_after():.0f} 秒後重試"
+                )
+
+            try:
+                response = await self._client.post(url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    if isinstance(e, httpx.TimeoutException):
+                        raise requests.exceptions.Timeout(str(e)) from e
+                    raise requests.exceptions.ConnectionError(str(e)) from e
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                attempt += 1
+                continue
+            except asyncio.CancelledError:
+                # 用戶端中斷連線不代表上游失敗，只釋放探測名額
+                breaker.release_probe()
+                raise
+            except BaseException:
+                # 其他 httpx 例外同樣計為失敗，half_open 的探測一定會有結果
+                breaker.record_failure()
+                raise
+
+            if response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500:
+                breaker.record_failure()
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    delay = parse_retry_after(response, self.backoff_max)
+                    if delay is None:
+                        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+            else:
+                # 4xx 代表上游仍可回應，不計入熔斷
+                breaker.record_success()
+
+            if response.is_error:
+                raise requests.exceptions.HTTPError(
+                    f"{response.status_code} Error for url: {url}"
+                )
+            return response
+
+
+class AsyncRemoteInference:
+    """以 AsyncResilientClient 呼叫 Hugging Face Inference API"""
+
+    def __init__(self, backend, client):
+        self.backend = backend
+        self.client = client
+
+    async def infer(self, image):
+        # 解碼與縮放佔用 CPU，在執行緒池中進行
+        payload, scale = await anyio.to_thread.run_sync(self.backend.prepare, image)
+        headers = {
+            "Authorization": f"Bearer {self.backend.api_token}",
+            "Content-Type": payload.content_type
+        }
+        # 與同步客戶端共用後端的熔斷器，/api/health 反映兩條路徑的上游狀態
+        response = await self.client.post(
+            self.backend.api_url, breaker=self.backend.http_client.breaker, headers=headers, content=payload.data
+        )
+        with time_stage('json_parse'):
+            results = response.json()
+        return Preprocessor.rescale(results, scale)
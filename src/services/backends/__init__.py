@@ -0,0 +1,85 @@
+# 推論後端：remote (Hugging Face API)、ultralytics (PyTorch)、onnx (ONNX Runtime CPU)
+
+import os
+
+from src.services.backends.base import InferenceBackend
+from src.services.backends.remote_hf import RemoteHFBackend
+from src.services.backends.ultralytics_backend import UltralyticsBackend
+from src.services.backends.onnx_backend import OnnxBackend
+from src.services.preprocess import Preprocessor
+
+# local 為 ultralytics 的舊名稱
+BACKEND_ALIASES = {'local': 'ultralytics'}
+
+
+def _split_env(name):
+    value = os.getenv(name, '')
+    return [item.strip() for item in value.split(',') if item.strip()] or None
+
+
+def create_preprocessor():
+    """遠端推論前的影像縮放與重新編碼，PREPROCESS_ENABLED=0 則送出原始上傳內容"""
+    if os.getenv('PREPROCESS_ENABLED', '1') != '1':
+        return None
+    return Preprocessor(
+        max_side=int(os.getenv('PREPROCESS_MAX_SIDE', 640)),
+        fmt=os.getenv('PREPROCESS_FORMAT', 'jpeg').lower(),
+        quality=int(os.getenv('PREPROCESS_QUALITY', 90))
+    )
+
+
+def create_backend(name=None, model_path=None, api_url=None):
+    """
+    依名稱（預設讀取 DETECTION_BACKEND 環境變數）建立推論後端
+
+    api_url 與 .onnx 的 model_path 用於 ModelRegistry 載入指定版本，優先於環境變數
+    """
+    name = (name or os.getenv('DETECTION_BACKEND', 'remote')).lower()
+    name = BACKEND_ALIASES.get(name, name)
+
+    if name == 'remote':
+        return RemoteHFBackend(
+            api_url=api_url or os.getenv('HF_API_URL', ''),
+            api_token=os.getenv('HF_API_TOKEN', ''),
+            pool_size=int(os.getenv('HF_POOL_SIZE', 10)),
+            connect_timeout=float(os.getenv('HF_CONNECT_TIMEOUT', 3.05)),
+            read_timeout=float(os.getenv('HF_READ_TIMEOUT', 30)),
+            max_retries=int(os.getenv('HF_MAX_RETRIES', 3)),
+            backoff_base=float(os.getenv('HF_BACKOFF_BASE', 0.5)),
+            backoff_max=float(os.getenv('HF_BACKOFF_MAX', 8)),
+            failure_threshold=int(os.getenv('HF_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('HF_BREAKER_RESET', 30)),
+            preprocessor=create_preprocessor()
+        )
+
+    if name == 'ultralytics':
+        threads_per_worker = os.getenv('TORCH_THREADS_PER_WORKER')
+        return UltralyticsBackend(
+            model_path or os.getenv('MODEL_PATH'),
+            threads_per_worker=int(threads_per_worker) if threads_per_worker else None
+        )
+
+    if name == 'onnx':
+        intra_op_threads = os.getenv('ONNX_INTRA_OP_THREADS')
+        return OnnxBackend(
+            model_path=(model_path if model_path and model_path.endswith('.onnx') else None)
+            or os.getenv('ONNX_MODEL_PATH') or model_path or os.getenv('MODEL_PATH'),
+            input_size=int(os.getenv('ONNX_INPUT_SIZE', 640)),
+            intra_op_threads=int(intra_op_threads) if intra_op_threads else None,
+            inter_op_threads=int(os.getenv('ONNX_INTER_OP_THREADS', 1)),
+            providers=_split_env('ONNX_PROVIDERS'),
+            class_names=_split_env('ONNX_CLASS_NAMES'),
+            score_threshold=float(os.getenv('ONNX_SCORE_THRESHOLD', 0.1)),
+            iou_threshold=float(os.getenv('ONNX_IOU_THRESHOLD', 0.45))
+        )
+
+    raise ValueError(f"不支援的推論後端: {name}")
+
+
+__all__ = [
+    'InferenceBackend',
+    'RemoteHFBackend',
+    'UltralyticsBackend',
+    'OnnxBackend',
+    'create_backend',
+]
@@ -0,0 +1,61 @@
+class InferenceBackend:
+    """
+    推論後端介面
+
+    所有後端的 infer_batch 都回傳 Hugging Face 物件檢測格式：
+    [{"box": {"xmin", "ymin", "xmax", "ymax"}, "score", "label"}, ...]
+    座標為原圖像素座標。
+    """
+
+    name = 'base'
+    model_type = ''
+
+    def infer_batch(self, images):
+        """
+        批次推論
+
+        Args:
+            images (list): [UploadedImage, ...]
+
+        Returns:
+            list: 每張圖片的預測列表，失敗的項目以例外物件表示
+        """
+        raise NotImplementedError
+
+    def identity(self):
+        """模型識別字串，用於區分不同模型的快取結果"""
+        raise NotImplementedError
+
+    def info(self):
+        return {
+            'backend': self.name,
+            'model_type': self.model_type
+        }
+
+    def health(self):
+        return {'status': 'healthy', 'backend': self.name}
+
+    def warmup(self):
+        """預先載入模型（遠端後端不需要）"""
+
+    def after_fork(self):
+        """pre-fork 模式下在 worker 子行程中呼叫，重建不能跨行程共用的資源"""
+
+    def close(self):
+        """模型版本被替換後釋放資源"""
+
+    @staticmethod
+    def _decode_all(images):
+        """解碼整批圖片，回傳 (結果列表, 成功解碼的索引, 像素陣列)"""
+        results = [None] * len(images)
+        indices = []
+        arrays = []
+        for i, image in enumerate(images):
+            try:
+                # 解碼後的陣列會保留在 UploadedImage 上，標註時直接沿用
+                arrays.append(image.array)
+            except ValueError as e:
+                results[i] = e
+                continue
+            indices.append(i)
+        return results, indices, arrays
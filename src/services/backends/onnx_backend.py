@@ -0,0 +1,133 @@
+import ast
+import os
+import threading
+
+from src.services.backends.base import InferenceBackend
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime CPU 本地後端
+
+    使用 Ultralytics 匯出的 YOLOv8 ONNX 模型（yolo export format=onnx）。
+    可透過 providers 指定 OpenVINOExecutionProvider 等執行提供者。
+    """
+
+    name = 'onnx'
+    model_type = 'ONNX Runtime'
+
+    def __init__(self, model_path, input_size=640, intra_op_threads=None, inter_op_threads=1,
+                 providers=None, class_names=None, score_threshold=0.1, iou_threshold=0.45):
+        self.model_path = model_path
+        self.input_size = int(input_size)
+        self.intra_op_threads = intra_op_threads or os.cpu_count() or 1
+        self.inter_op_threads = inter_op_threads
+        self.providers = providers or ['CPUExecutionProvider']
+        self.class_names = class_names
+        self.score_threshold = score_threshold
+        self.iou_threshold = iou_threshold
+        self._session = None
+        self._input_name = None
+        self._dynamic_batch = False
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._load_session()
+        return self._session
+
+    def _load_session(self):
+        if not self.model_path or not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"模型檔案不存在: {self.model_path}")
+
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(self.intra_op_threads)
+        options.inter_op_num_threads = int(self.inter_op_threads)
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        session = ort.InferenceSession(self.model_path, sess_options=options, providers=self.providers)
+        model_input = session.get_inputs()[0]
+        self._input_name = model_input.name
+        # 匯出時未使用 dynamic=True 的模型 batch 維度固定為 1
+        self._dynamic_batch = not isinstance(model_input.shape[0], int)
+
+        if self.class_names is None:
+            # Ultralytics 會把類別名稱以 dict 字串寫入模型 metadata
+            names = session.get_modelmeta().custom_metadata_map.get('names')
+            if names:
+                parsed = ast.literal_eval(names)
+                self.class_names = [parsed[k] for k in sorted(parsed)] if isinstance(parsed, dict) else list(parsed)
+
+        return session
+
+    def warmup(self):
+        import numpy as np
+
+        session = self._get_session()
+        dummy = np.zeros((1, 3, self.input_size, self.input_size), dtype=np.float32)
+        session.run(None, {self._input_name: dummy})
+
+    def after_fork(self):
+        # ONNX Runtime 的執行緒池無法跨 fork 使用，子行程重新建立 session。
+        # session 會把權重複製並最佳化到自己的記憶體，因此每個 worker 各有一份權重，
+        # 記憶體隨 worker 數線性增加（部署時的 worker 數建議見 DEPLOYMENT.md）
+        self._session = None
+
+    def _label(self, class_id):
+        if self.class_names and 0 <= class_id < len(self.class_names):
+            return self.class_names[class_id]
+        return str(class_id)
+
+    def infer_batch(self, images):
+        from src.services.backends.ops import decode_yolo_output, letterbox, to_tensor
+
+        session = self._get_session()
+        results, indices, arrays = self._decode_all(images)
+        if not arrays:
+            return results
+
+        canvases, metas = [], []
+        for array in arrays:
+            canvas, scale, pad = letterbox(array, self.input_size)
+            canvases.append(canvas)
+            metas.append((scale, pad, array.shape[:2]))
+
+        tensor = to_tensor(canvases)
+        if self._dynamic_batch:
+            outputs = session.run(None, {self._input_name: tensor})[0]
+        else:
+            outputs = [session.run(None, {self._input_name: tensor[j:j + 1]})[0][0] for j in range(len(tensor))]
+
+        for i, pred, (scale, pad, orig_shape) in zip(indices, outputs, metas):
+            boxes, scores, class_ids = decode_yolo_output(
+                pred, scale, pad, orig_shape, self.score_threshold, self.iou_threshold
+            )
+            results[i] = [
+                {
+                    "box": {"xmin": float(b[0]), "ymin": float(b[1]), "xmax": float(b[2]), "ymax": float(b[3])},
+                    "score": float(s),
+                    "label": self._label(int(c))
+                }
+                for b, s, c in zip(boxes, scores, class_ids)
+            ]
+        return results
+
+    def identity(self):
+        return f"onnx:{self.model_path}"
+
+    def info(self):
+        info = super().info()
+        info.update({
+            'model_path': self.model_path,
+            'input_size': self.input_size,
+            'intra_op_threads': self.intra_op_threads,
+            'inter_op_threads': self.inter_op_threads,
+            'providers': self.providers,
+            'loaded': self._session is not None
+        })
+        return info
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Ultralytics 預設的 letterbox 填充色
+LETTERBOX_FILL = 114
+
+
+def letterbox(img, size):
+    """
+    等比例縮放並置中填充為 size x size
+
+    Returns:
+        tuple: (填充後影像, 縮放比例, (左側填充, 上方填充))
+    """
+    import cv2
+
+    height, width = img.shape[:2]
+    scale = min(size / height, size / width)
+    new_h, new_w = int(round(height * scale)), int(round(width * scale))
+
+    if (new_h, new_w) != (height, width):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    top = (size - new_h) // 2
+    left = (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = img
+    return canvas, scale, (left, top)
+
+
+def to_tensor(canvases):
+    """將一批 BGR uint8 影像轉為 NCHW、RGB、0~1 的 float32 張量"""
+    batch = np.stack(canvases)[..., ::-1]
+    tensor = batch.transpose(0, 3, 1, 2).astype(np.float32)
+    tensor *= 1.0 / 255.0
+    return np.ascontiguousarray(tensor)
+
+
+def box_iou(box, boxes, metric='iou'):
+    """
+    單一框與多個框的重疊程度（xyxy 格式）
+
+    metric 為 ios 時以較小框的面積為分母（intersection over smaller），
+    切片邊界截斷的局部框與完整框的 IoU 偏低，但 IoS 接近 1。
+    """
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if metric == 'ios':
+        return inter / np.maximum(np.minimum(area, areas), 1e-9)
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def nms(boxes, scores, iou_threshold=0.45, max_det=300, metric='iou'):
+    """非極大值抑制，回傳保留框的索引（依分數由高到低）"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    order = np.argsort(-scores)
+    keep = []
+    while order.size and len(keep) < max_det:
+        best = order[0]
+        keep.append(best)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[best], boxes[order[1:]], metric)
+        order = order[1:][ious <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, class_ids, iou_threshold=0.45, max_det=300, metric='iou'):
+    """依類別分開的 NMS：將不同類別的框平移到互不重疊的座標區間後一次處理"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = class_ids.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+    return nms(boxes + offsets, scores, iou_threshold, max_det, metric)
+
+
+def merge_overlapping(boxes, scores, class_ids, iou_threshold=0.5, metric='ios'):
+    """
+    與 NMS 相同的貪婪順序，但被抑制的框併入保留的框（取聯集）而不是直接捨棄
+
+    切片邊界截斷的局部框與相鄰切片的完整框合併後，保留完整的範圍。
+
+    Returns:
+        tuple: (合併後的 xyxy 框, 保留框的索引)
+    """
+    if len(boxes) == 0:
+        return np.empty((0, 4), dtype=boxes.dtype), np.empty(0, dtype=np.int64)
+
+    order = np.argsort(-scores)
+    merged = []
+    keep = []
+    while order.size:
+        best = order[0]
+        rest = order[1:]
+        same_class = class_ids[rest] == class_ids[best]
+        overlaps = box_iou(boxes[best], boxes[rest], metric)
+        group = rest[same_class & (overlaps > iou_threshold)]
+
+        members = boxes[np.append(group, best)]
+        merged.append(np.concatenate([members[:, :2].min(axis=0), members[:, 2:].max(axis=0)]))
+        keep.append(best)
+        order = rest[~(same_class & (overlaps > iou_threshold))]
+    return np.asarray(merged, dtype=boxes.dtype), np.asarray(keep, dtype=np.int64)
+
+
+def decode_yolo_output(pred, scale, pad, orig_shape, score_threshold=0.1,
+                       iou_threshold=0.45, max_det=300):
+    """
+    解析 YOLOv8 匯出的 ONNX 輸出
+
+    Args:
+        pred (ndarray): 單張圖片的輸出，形狀為 (4 + 類別數, 候選數)
+        scale (float): letterbox 的縮放比例
+        pad (tuple): letterbox 的 (左側, 上方) 填充
+        orig_shape (tuple): 原圖 (高, 寬)
+
+    Returns:
+        tuple: (xyxy 框, 分數, 類別 id)，座標為原圖像素
+    """
+    pred = pred.T
+    class_scores = pred[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+    mask = scores >= score_threshold
+    if not mask.any():
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    cxcywh = pred[mask, :4]
+    scores = scores[mask]
+    class_ids = class_ids[mask]
+
+    boxes = np.empty_like(cxcywh)
+    boxes[:, 0] = cxcywh[:, 0] - cxcywh[:, 2] / 2
+    boxes[:, 1] = cxcywh[:, 1] - cxcywh[:, 3] / 2
+    boxes[:, 2] = cxcywh[:, 0] + cxcywh[:, 2] / 2
+    boxes[:, 3] = cxcywh[:, 1] + cxcywh[:, 3] / 2
+
+    # 還原 letterbox 到原圖座標
+    boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+    boxes /= scale
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, orig_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, orig_shape[0])
+
+    keep = batched_nms(boxes, scores, class_ids, iou_threshold, max_det)
+    return boxes[keep], scores[keep], class_ids[keep]
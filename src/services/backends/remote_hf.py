@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.backends.base import InferenceBackend
+from src.services.http_client import ResilientClient
+from src.services.metrics import time_stage
+from src.services.preprocess import Preprocessor
+
+
+class RemoteHFBackend(InferenceBackend):
+    """Hugging Face Inference API 後端"""
+
+    name = 'remote'
+    model_type = 'Hugging Face Inference API'
+
+    def __init__(self, api_url, api_token, pool_size=10, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 failure_threshold=5, reset_timeout=30.0, preprocessor=None):
+        self.api_url = api_url
+        self.api_token = api_token
+        # 送出前縮放並重新編碼影像（None 則送出原始上傳內容）
+        self.preprocessor = preprocessor
+        self._client_options = dict(
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_retries=max_retries,
+            backoff_base=backoff_base,
+            backoff_max=backoff_max,
+            failure_threshold=failure_threshold,
+            reset_timeout=reset_timeout
+        )
+        self._create_client()
+
+    def _create_client(self):
+        # 共用連線池的 HTTP 客戶端，避免每張圖片都重新建立 TCP/TLS 連線
+        self.http_client = ResilientClient(**self._client_options)
+
+        # 遠端 API 一次只收一張圖，批次內的請求透過共用連線池並行送出
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._client_options['pool_size'], thread_name_prefix='hf-inference'
+        )
+
+    def after_fork(self):
+        # 父行程的連線與執行緒不能在子行程沿用
+        self._create_client()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.http_client.close()
+
+    def prepare(self, image):
+        """回傳 (送出的影像, 縮放比例)"""
+        if self.preprocessor is None:
+            return image, 1.0
+        return self.preprocessor.prepare(image)
+
+    def _infer_one(self, image):
+        payload, scale = self.prepare(image)
+        headers = {
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": payload.content_type # 明確設定 Content-Type
+        }
+
+        # 發送請求到 Hugging Face Inference API（含逾時、重試與熔斷）
+        response = self.http_client.post(self.api_url, headers=headers, data=payload.data)
+        with time_stage('json_parse'):
+            results = response.json()
+        return Preprocessor.rescale(results, scale)
+
+    def infer_batch(self, images):
+        futures = [self._executor.submit(self._infer_one, image) for image in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def identity(self):
+        if self.preprocessor is not None:
+            return f"remote:{self.api_url}@{self.preprocessor.max_side}"
+        return f"remote:{self.api_url}"
+
+    def info(self):
+        info = super().info()
+        info['model_path'] = self.api_url
+        if self.preprocessor is not None:
+            info['preprocess'] = {
+                'max_side': self.preprocessor.max_side,
+                'format': self.preprocessor.fmt,
+                'quality': self.preprocessor.quality
+            }
+        return info
+
+    def health(self):
+        health = self.http_client.health()
+        health['backend'] = self.name
+        return health
@@ -0,0 +1,67 @@
+import os
+import threading
+
+from src.services.backends.base import InferenceBackend
+
+
+class UltralyticsBackend(InferenceBackend):
+    """Ultralytics YOLO (PyTorch) 本地後端"""
+
+    name = 'ultralytics'
+    model_type = 'Ultralytics YOLO'
+
+    def __init__(self, model_path, threads_per_worker=None):
+        self.model_path = model_path
+        self.threads_per_worker = threads_per_worker
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    if not self.model_path or not os.path.exists(self.model_path):
+                        raise FileNotFoundError(f"模型檔案不存在: {self.model_path}")
+                    from ultralytics import YOLO
+                    self._model = YOLO(self.model_path)
+        return self._model
+
+    def warmup(self):
+        self._get_model()
+
+    def after_fork(self):
+        # 權重張量由父行程載入，子行程以 copy-on-write 共用；
+        # 多個 worker 同時推論時限制每個 worker 的執行緒數，避免 CPU 過度分配
+        if self.threads_per_worker:
+            import torch
+            torch.set_num_threads(int(self.threads_per_worker))
+
+    def infer_batch(self, images):
+        model = self._get_model()
+        results, indices, arrays = self._decode_all(images)
+
+        if arrays:
+            # Ultralytics 接受圖片列表時會以單一批次推論
+            outputs = model(arrays, verbose=False)
+            for i, output in zip(indices, outputs):
+                predictions = []
+                for xyxy, score, cls_id in zip(output.boxes.xyxy.tolist(),
+                                               output.boxes.conf.tolist(),
+                                               output.boxes.cls.tolist()):
+                    predictions.append({
+                        "box": {"xmin": xyxy[0], "ymin": xyxy[1], "xmax": xyxy[2], "ymax": xyxy[3]},
+                        "score": score,
+                        "label": output.names[int(cls_id)]
+                    })
+                results[i] = predictions
+
+        return results
+
+    def identity(self):
+        return f"ultralytics:{self.model_path}"
+
+    def info(self):
+        info = super().info()
+        info['model_path'] = self.model_path
+        info['loaded'] = self._model is not None
+        return info
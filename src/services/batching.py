@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.services.metrics import registry
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class _PendingItem:
+    __slots__ = ('payload', 'future', 'enqueued_at')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+# 通知分派執行緒結束的佇列標記
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    推論請求的微批次佇列
+
+    呼叫端透過 submit() 放入請求並取得 Future，背景的分派執行緒
+    會在湊滿 max_batch_size 筆或等待超過 max_wait_ms 後，以一次
+    batch_fn(payloads) 呼叫處理整批請求。
+
+    batch_fn 必須回傳與輸入等長的結果列表；若某個元素是例外物件，
+    對應的 Future 會以該例外結束。
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=20, name='inference'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.batch_size_histogram = registry.histogram(
+            f'{name}_batch_size', BATCH_SIZE_BUCKETS, '每次分派的批次大小'
+        )
+        self.wait_time_histogram = registry.histogram(
+            f'{name}_batch_wait_seconds', description='請求在佇列中等待分派的時間'
+        )
+
+    def submit(self, payload):
+        item = _PendingItem(payload)
+        # 與分派執行緒結束時的清空在同一個鎖內，排入的請求不是被分派就是以例外結束
+        with self._lock:
+            self._ensure_started()
+            self._queue.put(item)
+        return item.future
+
+    def _ensure_started(self):
+        """需持有 self._lock"""
+        # 以 pid 判斷，fork 後的子行程需要重新啟動自己的分派執行緒
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        # 換掉佇列前先讓舊佇列中的請求結束，否則呼叫端會一直等待
+        self._fail_pending(self._queue)
+        self._queue = queue.Queue()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _fail_pending(pending):
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and not item.future.done():
+                item.future.set_exception(RuntimeError('批次分派已關閉，請求未被處理'))
+
+    def close(self):
+        """處理完已排入的請求後結束分派執行緒；之後再 submit 會重新啟動"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # 先分派手上的批次，下一輪再結束
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                with self._lock:
+                    # 結束前才排入的請求不會再被分派
+                    self._fail_pending(self._queue)
+                    self._thread = None
+                return
+            dispatched_at = time.monotonic()
+            self.batch_size_histogram.observe(len(batch))
+            for item in batch:
+                self.wait_time_histogram.observe(dispatched_at - item.enqueued_at)
+
+            try:
+                results = self.batch_fn([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"批次推論回傳 {len(results)} 筆結果，預期 {len(batch)} 筆")
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            for item, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    item.future.set_exception(result)
+                else:
+                    item.future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'wait_time_seconds': self.wait_time_histogram.snapshot()
+        }
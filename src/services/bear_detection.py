@@ -1,107 +1,219 @@
 import os
-import cv2
-import numpy as np
-from PIL import Image
+import time
 import requests
-import base64
 import json
-import mimetypes # 新增這一行
+from src.services.backends import RemoteHFBackend, create_backend
+from src.services.batching import MicroBatcher
+from src.services.image_pipeline import UploadedImage, artifact_writer
+from src.services.storage import sharded_path, upload_storage
+from src.services.tiling import SlicedInference
+from src.services.metrics import registry, time_stage
 
 class BearDetectionService:
-    def __init__(self):
-        # 從環境變數中獲取 Hugging Face API 資訊
-        self.hf_api_url = os.getenv("HF_API_URL", "")
-        self.hf_api_token = os.getenv("HF_API_TOKEN", "")
+    def __init__(self, model_path=None, backend=None, version=None):
+        # 模型版本名稱，用於 ModelRegistry 切換與各版本的指標
+        self.version = version or os.getenv("MODEL_VERSION", "default")
         self.confidence_threshold = float(os.getenv("CONFIDENCE_THRESHOLD", 0.5))
+        self.model_path = model_path or os.getenv("MODEL_PATH")
 
-        if not self.hf_api_url or not self.hf_api_token:
+        # 推論後端由 DETECTION_BACKEND 選擇：remote / ultralytics / onnx
+        self.backend = backend or create_backend(model_path=self.model_path)
+
+        # 微批次佇列：湊滿 BATCH_MAX_SIZE 張或等待 BATCH_MAX_WAIT_MS 後一次推論
+        self.batcher = None
+        if os.getenv("BATCHING_ENABLED", "1") == "1":
+            self.batcher = MicroBatcher(
+                self.infer_batch,
+                max_batch_size=int(os.getenv("BATCH_MAX_SIZE", 8)),
+                max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", 20))
+            )
+        # 等待批次結果的上限秒數，分派執行緒異常時請求不會永遠等待
+        self.batch_result_timeout = float(os.getenv("BATCH_RESULT_TIMEOUT", 120))
+
+        # 切片推論：高解析度影像切成重疊的切片整批推論，偵測畫面邊緣的小目標
+        self.slicer = None
+        if os.getenv("SLICED_INFERENCE", "0") == "1":
+            self.slicer = SlicedInference(
+                tile_size=int(os.getenv("TILE_SIZE", 640)),
+                overlap=float(os.getenv("TILE_OVERLAP", 0.2)),
+                hybrid=os.getenv("TILE_HYBRID", "1") == "1",
+                iou_threshold=float(os.getenv("TILE_IOU_THRESHOLD", 0.5)),
+                encode_tiles=isinstance(self.backend, RemoteHFBackend)
+            )
+
+        if isinstance(self.backend, RemoteHFBackend) and (not self.backend.api_url or not self.backend.api_token):
             print("警告：Hugging Face API URL 或 Token 未設定。請設定 HF_API_URL 和 HF_API_TOKEN 環境變數。")
             # 如果沒有設定，可以提供一個預設的錯誤訊息或行為
             # 或者在 detect_bear 方法中處理錯誤
 
         # 確保上傳目錄存在
-        self.upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "uploads")
+        self.upload_folder = upload_storage.root
         os.makedirs(self.upload_folder, exist_ok=True)
 
     def set_confidence_threshold(self, threshold):
+        """設定預設閾值；單一請求改用其他閾值時以 threshold 參數傳入，不修改共用狀態"""
         self.confidence_threshold = threshold
 
     def get_model_info(self):
-        # 由於模型在 Hugging Face 上，這裡返回模擬的模型資訊
-        # 實際的類別名稱應根據您的 Hugging Face 模型返回的結果來調整
-        return {
-            "model_type": "Hugging Face Inference API",
-            "model_path": self.hf_api_url,
+        # 實際的類別名稱應根據您的模型返回的結果來調整
+        info = self.backend.info()
+        info.update({
+            "version": self.version,
             "confidence_threshold": self.confidence_threshold,
             "class_names": ["kumay", "bear", "black bear", "taiwan black bear"] # 這裡列出您的模型可能檢測到的類別
-        }
+        })
+        if self.batcher is not None:
+            info["batching"] = self.batcher.stats()
+        if self.slicer is not None:
+            info["tiling"] = {
+                "tile_size": self.slicer.tile_size,
+                "overlap": self.slicer.overlap,
+                "hybrid": self.slicer.hybrid
+            }
+        return info
+
+    def get_model_identity(self):
+        """模型識別字串，用於區分不同模型的快取結果"""
+        if self.slicer is not None:
+            # 切片推論的結果與整張推論不同，快取需分開
+            return f"{self.backend.identity()}|{self.slicer.identity()}"
+        return self.backend.identity()
+
+    def after_fork(self):
+        """pre-fork worker 啟動時呼叫，讓後端重建行程專屬的資源"""
+        self.backend.after_fork()
 
-    def detect_bear(self, image_path):
+    def get_health(self):
+        """回報推論後端的狀態（遠端熔斷器開啟時為 degraded）"""
+        return self.backend.health()
+
+    def close(self):
+        """版本被替換且進行中的請求完成後呼叫，結束批次執行緒並釋放後端資源"""
+        if self.batcher is not None:
+            self.batcher.close()
+        self.backend.close()
+
+    def detect_bear(self, image, output_dir=None, annotate=True, threshold=None):
+        """
+        檢測圖片中的熊
+
+        Args:
+            image (UploadedImage | str): 記憶體中的上傳圖片，或圖片檔案路徑
+            output_dir (str): 標註圖片的輸出目錄
+            annotate (bool): 是否繪製並保存標註圖片（影片逐幀檢測時由呼叫端決定）
+            threshold (float): 本次請求的信心度閾值，預設使用 confidence_threshold
+        """
         try:
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"圖片檔案不存在: {image_path}")
-
-            # 讀取圖片的原始位元組數據
-            with open(image_path, "rb") as f:
-                image_bytes = f.read()
-
-            # 根據檔案擴展名猜測 Content-Type
-            content_type, _ = mimetypes.guess_type(image_path)
-            if content_type is None:
-                # 如果無法猜測，預設為通用的二進位流
-                content_type = "application/octet-stream"
-
-            headers = {
-                "Authorization": f"Bearer {self.hf_api_token}",
-                "Content-Type": content_type # 明確設定 Content-Type
-            }
+            # 相容舊的檔案路徑呼叫方式；記憶體圖片則完全不經過磁碟
+            if not isinstance(image, UploadedImage):
+                image = UploadedImage.from_path(image)
 
-            # 發送請求到 Hugging Face Inference API
-            response = requests.post(self.hf_api_url, headers=headers, data=image_bytes)
-            response.raise_for_status() # 如果請求失敗，會拋出異常
+            # 經由微批次佇列推論，結果格式統一為 Hugging Face 物件檢測格式
+            started = time.perf_counter()
+            with time_stage("inference"):
+                hf_results = self._predict(image)
+            self.observe_inference(time.perf_counter() - started)
 
-            hf_results = response.json()
-            
-            # ... (以下程式碼保持不變)
-    
-            
-            # 解析 Hugging Face 返回的結果
-            # Hugging Face 的物件檢測 API 返回格式通常是 [{box: {xmin, ymin, xmax, ymax}, score, label}, ...]
-            detections = []
-            bear_detected = False
-            for res in hf_results:
-                score = res.get("score", 0.0)
-                label = res.get("label", "unknown")
-                box = res.get("box", {})
-
-                if score >= self.confidence_threshold and self._is_bear_class(label):
-                    detections.append({
-                        "box": [box.get("xmin"), box.get("ymin"), box.get("xmax"), box.get("ymax")],
-                        "score": score,
-                        "label": label
-                    })
-                    bear_detected = True
-
-            # 繪製檢測結果並保存圖片
-            result_image_path = None
-            if detections:
-                result_image_path = self._draw_detections(image_path, detections, self.upload_folder)
-
-            return {
-                "success": True,
-                "bear_detected": bear_detected,
-                "detections": detections,
-                "result_image_path": os.path.basename(result_image_path) if result_image_path else None
-            }
+            return self.build_result(image, hf_results, output_dir, annotate, threshold)
 
-        except FileNotFoundError as e:
-            return {"success": False, "error": str(e)}
-        except requests.exceptions.RequestException as e:
-            return {"success": False, "error": f"Hugging Face API 請求失敗: {e}"}
-        except json.JSONDecodeError:
-            return {"success": False, "error": "Hugging Face API 返回無效的 JSON"}
         except Exception as e:
-            return {"success": False, "error": f"檢測過程中發生錯誤: {e}"}
+            return self.error_result(e)
+
+    def observe_inference(self, seconds):
+        registry.histogram(
+            "model_inference_seconds", description="各模型版本的推論耗時", labels={"version": self.version}
+        ).observe(seconds)
+
+    def build_result(self, image, hf_results, output_dir=None, annotate=True, threshold=None):
+        """
+        依信心度閾值篩選推論結果，繪製標註圖片並組成檢測結果
+
+        Args:
+            hf_results (list): Hugging Face 物件檢測格式的預測列表
+            threshold (float): 本次請求的信心度閾值，預設使用 confidence_threshold
+        """
+        if threshold is None:
+            threshold = self.confidence_threshold
+        # 解析 Hugging Face 返回的結果
+        # Hugging Face 的物件檢測 API 返回格式通常是 [{box: {xmin, ymin, xmax, ymax}, score, label}, ...]
+        detections = []
+        bear_detected = False
+        for res in hf_results:
+            score = res.get("score", 0.0)
+            label = res.get("label", "unknown")
+            box = res.get("box", {})
+
+            if score >= threshold and self._is_bear_class(label):
+                detections.append({
+                    "box": [box.get("xmin"), box.get("ymin"), box.get("xmax"), box.get("ymax")],
+                    "score": score,
+                    "label": label
+                })
+                bear_detected = True
+
+        # 繪製檢測結果並保存圖片
+        result_image_path = None
+        if detections and annotate:
+            result_image_path = self._draw_detections(image, detections, output_dir or self.upload_folder)
+
+        registry.counter(
+            "detection_verdicts_total", "檢測結果次數", {"verdict": "bear" if bear_detected else "no_bear"}
+        ).inc()
+        return {
+            "success": True,
+            "bear_detected": bear_detected,
+            "confidence": max((d["score"] for d in detections), default=0.0),
+            "detections": detections,
+            "result_image_path": os.path.basename(result_image_path) if result_image_path else None
+        }
+
+    def error_result(self, error):
+        """將檢測過程的例外轉為失敗的檢測結果"""
+        if isinstance(error, FileNotFoundError):
+            self._count_error("FileNotFoundError")
+            return {"success": False, "error": str(error)}
+        # requests 的 JSONDecodeError 同時也是 RequestException，需先判斷
+        if isinstance(error, json.JSONDecodeError):
+            self._count_error("JSONDecodeError")
+            return {"success": False, "error": "Hugging Face API 返回無效的 JSON"}
+        self._count_error(type(error).__name__)
+        if isinstance(error, requests.exceptions.RequestException):
+            return {"success": False, "error": f"Hugging Face API 請求失敗: {error}"}
+        return {"success": False, "error": f"檢測過程中發生錯誤: {error}"}
+
+    def _count_error(self, error_type):
+        registry.counter("detection_errors_total", "檢測失敗次數（依例外類型）", {"type": error_type}).inc()
+
+    def annotate(self, image, detections, output_dir=None):
+        """繪製並保存標註圖片，回傳檔名"""
+        return os.path.basename(self._draw_detections(image, detections, output_dir or self.upload_folder))
+
+    def _predict(self, image):
+        """推論單張圖片；啟用批次時交給 MicroBatcher 與其他請求合併"""
+        if self.slicer is not None and self.slicer.applies_to(image):
+            # 同一張影像的切片本身就是一批，直接推論不經過微批次佇列
+            tiles, offsets = self.slicer.split(image)
+            return self.slicer.merge(self.infer_batch(tiles), offsets)
+
+        if self.batcher is not None:
+            return self.batcher.submit(image).result(timeout=self.batch_result_timeout)
+
+        result = self.infer_batch([image])[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def infer_batch(self, payloads):
+        """
+        批次推論
+
+        Args:
+            payloads (list): [UploadedImage, ...]
+
+        Returns:
+            list: 每張圖片的預測列表，失敗的項目以例外物件表示
+        """
+        return self.backend.infer_batch(payloads)
 
     def _is_bear_class(self, class_name):
         """
@@ -119,17 +231,39 @@ class BearDetectionService:
         class_name_lower = class_name.lower()
         return any(keyword in class_name_lower for keyword in bear_keywords)
 
-    def _draw_detections(self, image_path, detections, output_dir):
-        # 確保輸出目錄存在
-        os.makedirs(output_dir, exist_ok=True)
+    def _draw_detections(self, image, detections, output_dir):
+        # OpenCV 匯入較慢，只在需要標註時才載入
+        import cv2
 
-        # 讀取圖片
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"無法讀取圖片: {image_path}")
+        # 直接在解碼後的陣列上繪製（原始位元組仍保留在 image.data），不另外複製；
+        # 影子版本推論時由 image.data 重新解碼，不會看到標註框
+        with time_stage("annotation"):
+            img_display = image.array
+            self._draw_boxes(img_display, detections)
 
-        # 複製圖片以繪製
-        img_display = img.copy()
+        # 生成新的檔案名
+        base_name = os.path.basename(image.filename)
+        name, ext = os.path.splitext(base_name)
+
+        # 在記憶體中編碼，OpenCV 不支援的格式 (如 gif) 改存為 jpg
+        with time_stage("image_encode"):
+            ok, encoded = cv2.imencode(ext, img_display) if ext else (False, None)
+            if not ok:
+                ext = ".jpg"
+                ok, encoded = cv2.imencode(ext, img_display)
+                if not ok:
+                    raise ValueError(f"無法編碼結果圖片: {base_name}")
+
+        output_filename = f"{name}_detected{ext}"
+        output_path = sharded_path(output_dir, output_filename)
+
+        # 保存結果圖片（背景寫入，只寫一次）
+        artifact_writer.write(output_path, encoded)
+        return output_path
+
+    def _draw_boxes(self, img_display, detections):
+        """在影像陣列上就地繪製檢測框和標籤"""
+        import cv2
 
         # 繪製檢測框和標籤
         for det in detections:
@@ -165,14 +299,3 @@ class BearDetectionService:
 
             cv2.rectangle(img_display, (text_bg_xmin, text_bg_ymin), (text_bg_xmax, text_bg_ymax), color, -1) # -1 表示填充
             cv2.putText(img_display, text, (text_bg_xmin, text_bg_ymax - 2), font, font_scale, (0, 0, 0), font_thickness, cv2.LINE_AA)
-
-        # 生成新的檔案名
-        base_name = os.path.basename(image_path)
-        name, ext = os.path.splitext(base_name)
-        output_filename = f"{name}_detected{ext}"
-        output_path = os.path.join(output_dir, output_filename)
-
-        # 保存結果圖片
-        cv2.imwrite(output_path, img_display)
-        return output_path
-
@@ -0,0 +1,186 @@
+import os
+import tarfile
+import uuid
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from src.services.detection_pipeline import save_detections
+from src.services.image_pipeline import UploadedImage, artifact_writer
+from src.services.storage import sharded_path
+
+# name: 原始檔名；filename: 上傳資料夾中的檔名；stored: 原始圖片是否已寫入上傳資料夾
+BulkEntry = namedtuple('BulkEntry', ['name', 'filename', 'data', 'stored'])
+
+
+def unique_upload_name(name):
+    return f"{uuid.uuid4()}_{secure_filename(os.path.basename(name)) or 'image'}"
+
+
+def _is_image_entry(name, allowed_extensions):
+    basename = os.path.basename(name)
+    # 略過 macOS 壓縮時產生的 __MACOSX、._ 等隱藏檔
+    if not basename or basename.startswith('.') or '__MACOSX' in name:
+        return False
+    return '.' in basename and basename.rsplit('.', 1)[1].lower() in allowed_extensions
+
+
+def count_archive_images(path, allowed_extensions):
+    """
+    zip 可從目錄預先得知圖片數量；tar 需要完整讀取才知道，回傳 None
+
+    Raises:
+        ValueError: 不是 zip 或 tar 檔
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist()
+                       if not info.is_dir() and _is_image_entry(info.filename, allowed_extensions))
+    if tarfile.is_tarfile(path):
+        return None
+    raise ValueError('不支援的壓縮檔格式')
+
+
+def iter_archive_entries(path, allowed_extensions, max_entry_bytes):
+    """
+    逐一讀取壓縮檔中的圖片，不解壓縮到磁碟
+
+    zip 依目錄隨機讀取；tar（含 gz/bz2/xz）以串流模式循序讀取。
+    同一時間只有一個項目的內容在記憶體中。
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_image_entry(info.filename, allowed_extensions):
+                    continue
+                if info.file_size > max_entry_bytes:
+                    yield BulkEntry(info.filename, None, None, False)
+                    continue
+                yield BulkEntry(info.filename, unique_upload_name(info.filename), archive.read(info), False)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if not member.isfile() or not _is_image_entry(member.name, allowed_extensions):
+                    continue
+                if member.size > max_entry_bytes:
+                    yield BulkEntry(member.name, None, None, False)
+                    continue
+                data = archive.extractfile(member).read()
+                yield BulkEntry(member.name, unique_upload_name(member.name), data, False)
+    else:
+        raise ValueError('不支援的壓縮檔格式')
+
+
+def iter_stored_entries(stored_files, upload_folder):
+    """讀取 multipart 上傳時已保存到上傳資料夾的圖片"""
+    for name, filename in stored_files:
+        with open(sharded_path(upload_folder, filename), 'rb') as f:
+            yield BulkEntry(name, filename, f.read(), True)
+
+
+def _detect_entry(detector, entry, upload_folder, admission=None):
+    if not entry.stored:
+        artifact_writer.write(sharded_path(upload_folder, entry.filename), entry.data)
+    image = UploadedImage(entry.data, entry.filename)
+    if admission is None:
+        return detector.detect_bear(image, upload_folder)
+    # 排在 bulk 車道，即時的相機請求優先取得推論名額
+    with admission.slot('bulk', bounded=False):
+        return detector.detect_bear(image, upload_folder)
+
+
+def process_bulk(task, detector, entries, camera_id, location, upload_folder,
+                 concurrency=8, insert_batch_size=100, admission=None, max_files=100, max_errors=100):
+    """
+    批次檢測大量圖片
+
+    檢測分散到 concurrency 個執行緒（搭配微批次時會合併為批次推論），
+    檢測記錄每 insert_batch_size 筆寫入一次。同時在處理中的圖片最多 2 * concurrency 張。
+    任務結果只保留計數、前 max_files 個檔案的結果與前 max_errors 個錯誤，
+    記憶體用量與寫入 background_tasks 的結果大小都與檔案總數無關；
+    完整的檢測記錄以 /api/recent-detections 依 camera_id 查詢。
+    指定 admission 時每張圖片的推論都經過准入控制。
+
+    Returns:
+        dict: 統計、前 max_files 個檔案的結果與前 max_errors 個錯誤
+    """
+    files = []
+    errors = []
+    pending = []
+
+    def record_error(name, message):
+        task.increment('errors')
+        if len(errors) < max_errors:
+            errors.append({'filename': name, 'error': message})
+
+    def flush():
+        if not pending:
+            return
+        detections = save_detections([fields for _, fields in pending])
+        for (file_result, _), detection in zip(pending, detections):
+            if file_result is not None:
+                file_result['detection_id'] = detection.id
+        pending.clear()
+
+    def collect(name, filename, future):
+        task.increment('processed')
+        try:
+            detection_result = future.result()
+        except Exception as e:
+            record_error(name, str(e))
+            return
+
+        file_result = {
+            'filename': name,
+            'bear_detected': detection_result.get('bear_detected', False),
+            'confidence': detection_result.get('confidence', 0.0),
+            'image_url': f'/api/uploads/{filename}'
+        }
+        if 'error' in detection_result:
+            file_result['warning'] = detection_result['error']
+            record_error(name, detection_result['error'])
+        if file_result['bear_detected']:
+            task.increment('bears')
+        # 超過上限的檔案只計數，不保留個別結果
+        kept = file_result if len(files) < max_files else None
+        if kept is not None:
+            files.append(kept)
+
+        pending.append((kept, dict(
+            camera_id=camera_id,
+            location=location,
+            bear_detected=file_result['bear_detected'],
+            confidence=file_result['confidence'],
+            detected_at=datetime.utcnow(),
+            image_filename=filename,
+            result_image_filename=detection_result.get('result_image_path')
+        )))
+        if len(pending) >= insert_batch_size:
+            flush()
+
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-detect') as pool:
+        for entry in entries:
+            if entry.data is None:
+                task.increment('processed')
+                record_error(entry.name, '檔案過大')
+                continue
+            while len(in_flight) >= 2 * concurrency:
+                collect(*in_flight.popleft())
+            in_flight.append((entry.name, entry.filename, pool.submit(_detect_entry, detector, entry, upload_folder, admission)))
+        while in_flight:
+            collect(*in_flight.popleft())
+    flush()
+
+    progress = task.to_dict()['progress']
+    return {
+        'processed': progress.get('processed', 0),
+        'bears': progress.get('bears', 0),
+        'errors': progress.get('errors', 0),
+        'files': files,
+        'files_truncated': progress.get('processed', 0) > len(files),
+        'error_details': errors
+    }
@@ -0,0 +1,62 @@
+import os
+
+from sqlalchemy import event, inspect, text
+
+
+def database_uri(default_sqlite_path):
+    """DATABASE_URL 未設定時使用本地 SQLite 檔案"""
+    uri = os.getenv('DATABASE_URL')
+    if not uri:
+        return f"sqlite:///{default_sqlite_path}"
+    # Heroku 等平台提供的 postgres:// 前綴 SQLAlchemy 不接受
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """依資料庫類型設定連線池"""
+    pool_size = int(os.getenv('DB_POOL_SIZE', 10))
+    if uri.startswith('sqlite'):
+        return {
+            'pool_size': pool_size,
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            # 寫入鎖競爭時最多等待的秒數，避免立即出現 database is locked
+            'connect_args': {'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 15)), 'check_same_thread': False}
+        }
+    return {
+        'pool_size': pool_size,
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800))
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL 讓讀取不會被寫入阻擋；synchronous=NORMAL 在 WAL 下只在 checkpoint 時 fsync
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', 65536))}")
+    cursor.execute(f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', 268435456))}")
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute(f"PRAGMA busy_timeout={int(float(os.getenv('SQLITE_BUSY_TIMEOUT', 15)) * 1000)}")
+    cursor.close()
+
+
+def configure_engine(engine):
+    """為 SQLite 連線套用 WAL 與效能相關的 PRAGMA"""
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+
+
+def ensure_columns(engine, table):
+    """為既有資料表補上新增的欄位（create_all 不會修改已存在的資料表，新欄位須可為 NULL）"""
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return
+    with engine.begin() as connection:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
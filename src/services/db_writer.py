@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.models.detection import Detection, db
+from src.services.metrics import registry
+from src.services.rollups import record_detections
+from src.services.live_events import event_hub
+
+DETACHED_FIELDS = (
+    'id', 'camera_id', 'location', 'bear_detected', 'confidence',
+    'detected_at', 'image_filename', 'result_image_filename'
+)
+
+
+def _detached_copy(detection):
+    """建立不屬於任何 session 的副本，讓其他執行緒可以安全讀取欄位"""
+    return Detection(**{field: getattr(detection, field) for field in DETACHED_FIELDS})
+
+
+class DetectionWriter:
+    """
+    檢測記錄的單一寫入執行緒
+
+    所有請求的檢測記錄都交給同一個執行緒，每 batch_size 筆或每 flush_ms 毫秒
+    合併成一個交易 commit（group commit），避免多個寫入者爭搶 SQLite 寫入鎖，
+    也讓多筆記錄共用一次 fsync。
+    """
+
+    def __init__(self, app, batch_size=64, flush_ms=10):
+        self.app = app
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_ms) / 1000.0)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batch_size_histogram = registry.histogram(
+            'db_writer_batch_size', (1, 2, 4, 8, 16, 32, 64, 128, 256), '每次 group commit 的記錄數'
+        )
+
+    def _ensure_started(self):
+        # fork 後的子行程需要自己的寫入執行緒
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='detection-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, fields):
+        """
+        排入一筆檢測記錄
+
+        Args:
+            fields (dict): Detection 欄位
+
+        Returns:
+            Future: 完成後為已寫入的 Detection 副本（含 id）
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fields, future))
+        return future
+
+    def write(self, fields, timeout=30.0):
+        return self.submit(fields).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._collect()
+                self.batch_size_histogram.observe(len(batch))
+                try:
+                    self._commit(batch)
+                except Exception:
+                    db.session.rollback()
+                    # 整批失敗時逐筆重試，只讓有問題的記錄失敗
+                    for item in batch:
+                        try:
+                            self._commit([item])
+                        except Exception as e:
+                            db.session.rollback()
+                            item[1].set_exception(e)
+                finally:
+                    db.session.remove()
+
+    def _commit(self, batch):
+        detections = [Detection(**fields) for fields, _ in batch]
+        db.session.add_all(detections)
+        db.session.flush()
+        # 統計彙總與檢測記錄在同一個交易中寫入
+        record_detections(detections)
+        copies = [_detached_copy(d) for d in detections]
+        db.session.commit()
+
+        for (_, future), copy in zip(batch, copies):
+            future.set_result(copy)
+        # commit 之後才推送即時事件，訂閱者不會看到尚未寫入的記錄
+        event_hub.publish_detections(copies)
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+
+from src.models.detection import Detection, db
+from src.services.detection_queries import filter_detections
+
+EXPORT_COLUMNS = (
+    Detection.id,
+    Detection.camera_id,
+    Detection.location,
+    Detection.bear_detected,
+    Detection.confidence,
+    Detection.detected_at,
+    Detection.image_filename,
+    Detection.result_image_filename,
+)
+COLUMN_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+# 格式 -> (副檔名, Content-Type)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv; charset=utf-8'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def iter_row_chunks(statement, chunk_size):
+    """
+    以伺服器端游標分批讀取查詢結果，每批最多 chunk_size 列
+
+    PostgreSQL 使用具名游標串流；SQLite 以 fetchmany 逐批取得，都不會一次載入整個結果集。
+    只選取欄位，以 Core 連線執行，略過 ORM 的結果處理。
+    """
+    connection = db.session.connection()
+    result = connection.execution_options(yield_per=chunk_size).execute(statement)
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def export_statement(camera_id=None, location=None, bear_only=False, start=None, end=None):
+    """依 id 由舊到新匯出的查詢，只選取匯出欄位，不建立 ORM 物件"""
+    statement = db.select(*EXPORT_COLUMNS)
+    statement = filter_detections(statement, camera_id, location, bear_only, start, end)
+    return statement.order_by(Detection.id)
+
+
+def _format_row(row):
+    values = list(row)
+    detected_at = values[5]
+    values[5] = detected_at.isoformat() if detected_at else None
+    return values
+
+
+def _csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in chunks:
+        writer.writerows(_format_row(row) for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # 沒有任何資料時仍輸出標題列
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(COLUMN_NAMES, _format_row(row))), ensure_ascii=False) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 ParquetWriter 寫出的位元組，每寫完一個 row group 取出送出"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _parquet_chunks(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('camera_id', pa.string()),
+        ('location', pa.string()),
+        ('bear_detected', pa.bool_()),
+        ('confidence', pa.float64()),
+        ('detected_at', pa.timestamp('us')),
+        ('image_filename', pa.string()),
+        ('result_image_filename', pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        # 每批查詢結果寫成一個 row group
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(fmt, statement, chunk_size=10000):
+    """
+    以固定大小的批次產生匯出內容，記憶體用量與資料表大小無關
+
+    Args:
+        fmt (str): csv / ndjson / parquet
+        statement: export_statement 建立的查詢
+    """
+    chunks = iter_row_chunks(statement, chunk_size)
+    if fmt == 'parquet':
+        return _parquet_chunks(chunks)
+    if fmt == 'ndjson':
+        return _ndjson_chunks(chunks)
+    return _csv_chunks(chunks)
@@ -0,0 +1,108 @@
+from datetime import datetime
+from flask import current_app
+from src.models.detection import Detection, db
+from src.services.rollups import record_detection, record_detections
+from src.services.metrics import time_stage
+from src.services.live_events import event_hub
+
+
+def build_detection_response(detection):
+    """將檢測記錄轉換為 /api/detect 的回應格式"""
+    response_data = {
+        'bear_detected': detection.bear_detected,
+        'confidence': detection.confidence,
+        'detected_at': detection.detected_at.isoformat(),
+        'location': detection.location,
+        'image_url': f'/api/uploads/{detection.image_filename}',
+        'detection_id': detection.id
+    }
+
+    # 如果有檢測結果圖片，添加到回應中
+    if detection.result_image_filename:
+        response_data['result_image_url'] = f'/api/uploads/{detection.result_image_filename}'
+        response_data['result_thumbnail_url'] = f'/api/uploads/{detection.result_image_filename}?size=thumb'
+
+    return response_data
+
+
+def save_detection(fields):
+    """
+    寫入一筆檢測記錄與統計彙總
+
+    啟用 DetectionWriter 時交給單一寫入執行緒 group commit，否則直接 commit。
+    """
+    writer = current_app.extensions.get('detection_writer')
+    with time_stage('db_commit'):
+        if writer is not None:
+            return writer.write(fields)
+
+        detection = Detection(**fields)
+        db.session.add(detection)
+        # 統計彙總與檢測記錄在同一個交易中寫入
+        record_detection(detection)
+        db.session.commit()
+        event_hub.publish_detections([detection])
+        return detection
+
+
+def save_detections(fields_list, timeout=60.0):
+    """
+    批次寫入多筆檢測記錄
+
+    啟用 DetectionWriter 時一次排入所有記錄由寫入執行緒合併 commit，否則在同一個交易中寫入。
+    """
+    writer = current_app.extensions.get('detection_writer')
+    with time_stage('db_commit'):
+        if writer is not None:
+            futures = [writer.submit(fields) for fields in fields_list]
+            return [future.result(timeout=timeout) for future in futures]
+
+        detections = [Detection(**fields) for fields in fields_list]
+        db.session.add_all(detections)
+        db.session.flush()
+        record_detections(detections)
+        db.session.commit()
+        event_hub.publish_detections(detections)
+        return detections
+
+
+def run_detection(detector, image, unique_filename, upload_folder, camera_id, location, threshold=None):
+    """
+    對圖片執行檢測並寫入檢測記錄
+
+    Args:
+        image (UploadedImage | str): 記憶體中的上傳圖片，或已保存的圖片路徑
+        threshold (float): 本次請求的信心度閾值，預設使用檢測服務的設定
+
+    Returns:
+        tuple: (Detection, detection_result, response_data)
+    """
+    detection_result = detector.detect_bear(image, upload_folder, threshold=threshold)
+    detection, response_data = record_detection_result(detection_result, unique_filename, camera_id, location)
+    return detection, detection_result, response_data
+
+
+def record_detection_result(detection_result, unique_filename, camera_id, location):
+    """
+    將檢測結果寫入檢測記錄並組成 /api/detect 的回應
+
+    Returns:
+        tuple: (Detection, response_data)
+    """
+    detection = save_detection(dict(
+        camera_id=camera_id,
+        location=location,
+        bear_detected=detection_result.get('bear_detected', False),
+        confidence=detection_result.get('confidence', 0.0),
+        detected_at=datetime.utcnow(),
+        image_filename=unique_filename,
+        result_image_filename=detection_result.get('result_image_path')
+    ))
+
+    response_data = build_detection_response(detection)
+
+    # 如果檢測過程有錯誤，添加錯誤信息
+    if 'error' in detection_result:
+        response_data['warning'] = detection_result['error']
+
+    return detection, response_data
@@ -0,0 +1,125 @@
+import base64
+from datetime import datetime
+
+from src.models.detection import Detection, db
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# 列表只選取需要的欄位，不建立完整的 ORM 物件
+LIST_COLUMNS = (
+    Detection.id,
+    Detection.camera_id,
+    Detection.location,
+    Detection.bear_detected,
+    Detection.confidence,
+    Detection.detected_at,
+    Detection.image_filename,
+    Detection.result_image_filename,
+)
+
+
+def encode_cursor(detected_at, detection_id):
+    raw = f"{detected_at.isoformat()}|{detection_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析分頁游標，格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        detected_at, detection_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(detected_at), int(detection_id)
+    except Exception:
+        raise ValueError('無效的分頁游標')
+
+
+def clamp_page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def serialize_row(row):
+    """將選取的欄位轉為與 Detection.to_dict() 相同的格式，並附上圖片 URL"""
+    data = {
+        'id': row.id,
+        'camera_id': row.camera_id,
+        'location': row.location,
+        'bear_detected': row.bear_detected,
+        'confidence': row.confidence,
+        'detected_at': row.detected_at.isoformat() if row.detected_at else None,
+        'image_filename': row.image_filename,
+        'result_image_filename': row.result_image_filename
+    }
+    # 添加圖片URL
+    # 列表頁面使用縮圖，只在檢視單筆記錄時載入原圖
+    if row.image_filename:
+        data['image_url'] = f'/api/uploads/{row.image_filename}'
+        data['thumbnail_url'] = f'/api/uploads/{row.image_filename}?size=thumb'
+    if row.result_image_filename:
+        data['result_image_url'] = f'/api/uploads/{row.result_image_filename}'
+        data['result_thumbnail_url'] = f'/api/uploads/{row.result_image_filename}?size=thumb'
+    return data
+
+
+def filter_detections(query, camera_id=None, location=None, bear_only=False, start=None, end=None):
+    """套用共用的篩選條件（Query 或 select 皆可）"""
+    if camera_id:
+        query = query.filter(Detection.camera_id == camera_id)
+    if location:
+        query = query.filter(Detection.location == location)
+    if bear_only:
+        query = query.filter(Detection.bear_detected.is_(True))
+    if start is not None:
+        query = query.filter(Detection.detected_at >= start)
+    if end is not None:
+        query = query.filter(Detection.detected_at < end)
+    return query
+
+
+def query_detections(camera_id=None, location=None, bear_only=False, start=None, end=None,
+                     cursor=None, limit=None):
+    """
+    依 detected_at、id 由新到舊分頁查詢檢測記錄
+
+    Returns:
+        tuple: (記錄字典列表, 下一頁游標或 None)
+    """
+    page_size = clamp_page_size(limit)
+    query = filter_detections(db.session.query(*LIST_COLUMNS), camera_id, location, bear_only, start, end)
+
+    if cursor:
+        cursor_at, cursor_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Detection.detected_at < cursor_at,
+            db.and_(Detection.detected_at == cursor_at, Detection.id < cursor_id)
+        ))
+
+    # 多取一筆用來判斷是否還有下一頁
+    rows = query.order_by(Detection.detected_at.desc(), Detection.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].detected_at, rows[-1].id)
+
+    return [serialize_row(row) for row in rows], next_cursor
+
+
+def query_detections_after(after_id, camera_id=None, location=None, bear_only=False, limit=MAX_PAGE_SIZE):
+    """依 id 由舊到新取得 after_id 之後的記錄（即時事件重新連線時補齊遺漏的事件）"""
+    query = db.session.query(*LIST_COLUMNS).filter(Detection.id > after_id)
+    if camera_id:
+        query = query.filter(Detection.camera_id == camera_id)
+    if location:
+        query = query.filter(Detection.location == location)
+    if bear_only:
+        query = query.filter(Detection.bear_detected.is_(True))
+    return [serialize_row(row) for row in query.order_by(Detection.id).limit(limit).all()]
+
+
+def ensure_indexes():
+    """為既有資料庫補建索引（create_all 不會替已存在的資料表新增索引）"""
+    for index in Detection.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
@@ -0,0 +1,276 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.models.detection import Detection, DetectionEvent, db
+from src.services.detection_pipeline import build_detection_response
+from src.services.metrics import registry
+
+
+def dhash(gray, size=8):
+    """差異雜湊：縮成 (size+1) x size 後比較相鄰像素，回傳 size*size 位元的整數"""
+    import cv2
+
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def frame_hash(data):
+    """
+    計算圖片的感知雜湊
+
+    JPEG 以 1/8 縮小解碼灰階，比完整解碼快得多；無法解碼時回傳 None
+    """
+    import cv2
+
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    return dhash(gray)
+
+
+def hamming_distances(target, hashes):
+    """一個雜湊與多個 64 位元雜湊的漢明距離"""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(target))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class FrameRecord:
+    """已推論影格的雜湊與結果"""
+
+    __slots__ = ('seen_at', 'hash', 'identity', 'detection_id', 'bear_detected', 'detections')
+
+    def __init__(self, seen_at, hash_value, identity, detection_id, bear_detected, detections):
+        self.seen_at = seen_at
+        self.hash = hash_value
+        self.identity = identity
+        self.detection_id = detection_id
+        self.bear_detected = bear_detected
+        self.detections = detections
+
+
+class CameraState:
+    def __init__(self, history):
+        self.lock = threading.Lock()
+        self.frames = deque(maxlen=history)
+        self.event_id = None
+        self.event_seen_at = None
+
+
+class EventTracker:
+    """
+    各相機的近似重複影格索引與事件合併
+
+    每台相機保留最近 history 張已推論影格的感知雜湊；時間窗內漢明距離不超過
+    max_distance 的影格視為重複，直接沿用先前的檢測記錄，不推論也不寫入新記錄。
+    畫面中很小的熊幾乎不改變雜湊，因此「沒有熊」的結果只在較短的 negative_window_seconds
+    內沿用，之後的影格一定重新推論；設為 0 則只沿用有熊的結果。
+    連續出現熊的檢測合併為一筆 DetectionEvent，間隔超過 gap_seconds 則開始新事件。
+
+    索引在行程記憶體中；pre-fork 多 worker 時，沒有進行中事件的 worker 會先從資料庫
+    找同一台相機仍在間隔內的事件接續，避免同一隻熊分裂成多個事件。
+    """
+
+    def __init__(self, window_seconds=60.0, max_distance=6, gap_seconds=120.0, history=32, max_cameras=1024,
+                 negative_window_seconds=5.0):
+        self.window_seconds = window_seconds
+        self.negative_window_seconds = min(negative_window_seconds, window_seconds)
+        self.max_distance = max_distance
+        self.gap_seconds = gap_seconds
+        self.history = history
+        self.max_cameras = max_cameras
+        self._lock = threading.Lock()
+        self._cameras = OrderedDict()
+        self.skipped = registry.counter('dedup_frames_skipped_total', '近似重複而略過推論的影格數')
+        self.opened = registry.counter('detection_events_opened_total', '新開始的熊出沒事件數')
+
+    @staticmethod
+    def tracks(camera_id):
+        # 未指定相機的上傳來源不同，不能互相比對
+        return bool(camera_id) and camera_id != 'unknown'
+
+    def _camera(self, camera_id):
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is None:
+                state = self._cameras[camera_id] = CameraState(self.history)
+                # 超過相機數上限時移除最久未使用的相機
+                while len(self._cameras) > self.max_cameras:
+                    self._cameras.popitem(last=False)
+            else:
+                self._cameras.move_to_end(camera_id)
+            return state
+
+    def find_duplicate(self, camera_id, hash_value, identity, now=None):
+        """回傳時間窗內最相近的重複影格，沒有則回傳 None"""
+        now = time.monotonic() if now is None else now
+        state = self._camera(camera_id)
+        with state.lock:
+            candidates = [
+                record for record in state.frames
+                if record.identity == identity and now - record.seen_at <= self._window(record)
+            ]
+        if not candidates:
+            return None
+        distances = hamming_distances(hash_value, [record.hash for record in candidates])
+        best = int(distances.argmin())
+        return candidates[best] if distances[best] <= self.max_distance else None
+
+    def _window(self, record):
+        return self.window_seconds if record.bear_detected else self.negative_window_seconds
+
+    def check(self, camera_id, data, identity):
+        """
+        /api/detect 推論前呼叫（需在 app context 中）
+
+        Returns:
+            tuple: (影格雜湊, 重複影格的回應或 None)；不追蹤或無法解碼時雜湊為 None
+        """
+        if not self.tracks(camera_id):
+            return None, None
+        hash_value = frame_hash(data)
+        if hash_value is None:
+            return None, None
+
+        duplicate = self.find_duplicate(camera_id, hash_value, identity)
+        if duplicate is None:
+            return hash_value, None
+        detection = db.session.get(Detection, duplicate.detection_id)
+        if detection is None:
+            return hash_value, None
+
+        self.skipped.inc()
+        response_data = build_detection_response(detection)
+        response_data['duplicate'] = True
+        event_id = self._extend_event(camera_id)
+        if event_id is not None:
+            response_data['event_id'] = event_id
+        return hash_value, response_data
+
+    def observe(self, camera_id, location, hash_value, identity, detection, detection_result):
+        """
+        檢測記錄寫入後呼叫（需在 app context 中），回傳所屬事件 id
+
+        失敗的結果不加入索引，也不影響事件；hash_value 為 None（無法解碼、影片事件）時只合併事件，
+        並以檢測記錄的 detected_at 判斷間隔：影片在幾秒內處理完，影片中相隔很久的熊不能以處理時間合併。
+        """
+        if not self.tracks(camera_id) or 'error' in detection_result:
+            return None
+
+        now = time.monotonic()
+        state = self._camera(camera_id)
+        with state.lock:
+            if hash_value is not None:
+                state.frames.append(FrameRecord(
+                    now, hash_value, identity, detection.id,
+                    detection.bear_detected, detection_result.get('detections', [])
+                ))
+            if not detection.bear_detected:
+                return None
+            if hash_value is None:
+                return self._record_bear(state, camera_id, location, detection, None)
+            return self._record_bear(state, camera_id, location, detection, now)
+
+    def _event_near(self, camera_id, detected_at):
+        """detected_at 前後 gap_seconds 內同一台相機的事件"""
+        gap = timedelta(seconds=self.gap_seconds)
+        return (DetectionEvent.query
+                .filter(DetectionEvent.camera_id == camera_id,
+                        DetectionEvent.ended_at >= detected_at - gap,
+                        DetectionEvent.started_at <= detected_at + gap)
+                .order_by(DetectionEvent.ended_at.desc())
+                .first())
+
+    def _current_event(self, state, camera_id, now):
+        if state.event_id is not None and now - state.event_seen_at <= self.gap_seconds:
+            event = db.session.get(DetectionEvent, state.event_id)
+            if event is not None:
+                return event
+        # 其他 worker 開始的事件
+        cutoff = datetime.utcnow() - timedelta(seconds=self.gap_seconds)
+        return (DetectionEvent.query
+                .filter(DetectionEvent.camera_id == camera_id, DetectionEvent.ended_at >= cutoff)
+                .order_by(DetectionEvent.ended_at.desc())
+                .first())
+
+    def _record_bear(self, state, camera_id, location, detection, now):
+        """now 為 None 時依 detection.detected_at 尋找事件，也不更新行程內的進行中事件"""
+        if now is None:
+            event = self._event_near(camera_id, detection.detected_at)
+        else:
+            event = self._current_event(state, camera_id, now)
+        if event is None:
+            event = DetectionEvent(
+                camera_id=camera_id,
+                location=location,
+                started_at=detection.detected_at,
+                ended_at=detection.detected_at,
+                detection_count=0,
+                duplicate_count=0,
+                peak_confidence=0.0
+            )
+            db.session.add(event)
+            self.opened.inc()
+
+        event.started_at = min(event.started_at, detection.detected_at)
+        event.ended_at = max(event.ended_at, detection.detected_at)
+        event.detection_count += 1
+        confidence = detection.confidence or 0.0
+        if event.peak_detection_id is None or confidence > event.peak_confidence:
+            event.peak_confidence = confidence
+            event.peak_detection_id = detection.id
+            event.peak_image_filename = detection.image_filename
+            event.peak_result_image_filename = detection.result_image_filename
+        db.session.commit()
+
+        if now is not None:
+            state.event_id = event.id
+            state.event_seen_at = now
+        return event.id
+
+    def _extend_event(self, camera_id):
+        """重複影格延長進行中的事件，回傳事件 id"""
+        now = time.monotonic()
+        state = self._camera(camera_id)
+        with state.lock:
+            if state.event_id is None or now - state.event_seen_at > self.gap_seconds:
+                return None
+            DetectionEvent.query.filter_by(id=state.event_id).update({
+                DetectionEvent.duplicate_count: DetectionEvent.duplicate_count + 1,
+                DetectionEvent.ended_at: datetime.utcnow()
+            })
+            db.session.commit()
+            state.event_seen_at = now
+            return state.event_id
+
+    def is_active(self, event):
+        return datetime.utcnow() - event.ended_at <= timedelta(seconds=self.gap_seconds)
+
+    def stats(self):
+        with self._lock:
+            cameras = len(self._cameras)
+        return {
+            'cameras': cameras,
+            'frames_skipped': self.skipped.value,
+            'events_opened': self.opened.value
+        }
+
+
+def query_events(camera_id=None, location=None, start=None, end=None, limit=20, before_id=None):
+    """依開始時間由新到舊列出事件，before_id 為上一頁最後一筆的 id"""
+    query = DetectionEvent.query
+    if camera_id:
+        query = query.filter(DetectionEvent.camera_id == camera_id)
+    if location:
+        query = query.filter(DetectionEvent.location == location)
+    if start:
+        query = query.filter(DetectionEvent.ended_at >= start)
+    if end:
+        query = query.filter(DetectionEvent.started_at < end)
+    if before_id:
+        query = query.filter(DetectionEvent.id < before_id)
+    return query.order_by(DetectionEvent.id.desc()).limit(limit).all()
@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 上游過載時應重試的 HTTP 狀態碼
+RETRYABLE_STATUS_CODES = {429, 503}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """熔斷器開啟時直接拒絕請求"""
+
+
+class CircuitBreaker:
+    """
+    簡單的熔斷器
+
+    連續失敗達到門檻後進入 open 狀態並快速失敗，
+    經過 reset_timeout 秒後進入 half_open，只放行一個探測請求。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """探測請求未取得結果就中止（例如用戶端中斷連線）時釋放探測名額，讓下一個請求重新探測"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def retry_after(self):
+        """距離下一次探測還需等待的秒數"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout
+            }
+
+
+def create_session(pool_size=10):
+    """建立共用連線池的 requests.Session（重試由呼叫端自行控制）"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """指數退避加上 full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(response, cap=8.0):
+    """解析 Retry-After 標頭（僅支援秒數格式）"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return min(cap, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+
+class ResilientClient:
+    """帶有連線池、逾時、有限重試與熔斷器的 HTTP 客戶端"""
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.session = create_session(pool_size)
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(
+                    f"上游服務暫停使用中，{self.breaker.retry_after():.0f} 秒後重試"
+                )
+
+            try:
+                response = self.session.post(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                attempt += 1
+                continue
+            except BaseException:
+                # 其他例外（無效的網址、回應解碼失敗等）同樣計為失敗；
+                # 否則 half_open 的探測請求沒有結果，熔斷器會一直停在等待探測的狀態
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500:
+                self.breaker.record_failure()
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    delay = parse_retry_after(response, self.backoff_max)
+                    if delay is None:
+                        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                    response.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+            else:
+                # 4xx 代表上游仍可回應，不計入熔斷
+                self.breaker.record_success()
+
+            response.raise_for_status()
+            return response
+
+    def health(self):
+        breaker = self.breaker.snapshot()
+        return {
+            'status': 'degraded' if breaker['state'] == CircuitBreaker.OPEN else 'healthy',
+            'circuit_breaker': breaker,
+            'pool_size': self.pool_size,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'max_retries': self.max_retries
+        }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,166 @@
+import mimetypes
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.services.metrics import time_stage
+
+
+class UploadedImage:
+    """
+    上傳圖片的記憶體表示
+
+    原始位元組只保存一份，解碼後的像素陣列在第一次存取時才建立並快取，
+    推論與標註共用同一個陣列，避免重複讀檔與解碼。
+    """
+
+    def __init__(self, data, filename):
+        self.data = data
+        self.filename = filename
+        self._array = None
+        self._lock = threading.Lock()
+
+        # 根據檔案擴展名猜測 Content-Type
+        content_type, _ = mimetypes.guess_type(filename)
+        # 如果無法猜測，預設為通用的二進位流
+        self.content_type = content_type or "application/octet-stream"
+
+    @classmethod
+    def from_array(cls, array, filename, quality=90, encode=True):
+        """
+        由已解碼的影格建立（例如影片影格），編碼結果與原陣列共用
+
+        本地後端直接使用陣列推論，encode=False 時略過 JPEG 編碼（data 為 None）
+        """
+        if not encode:
+            image = cls(None, filename)
+            image._array = array
+            return image
+
+        import cv2
+        ok, encoded = cv2.imencode(".jpg", array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError(f"無法編碼影格: {filename}")
+        image = cls(encoded.tobytes(), filename)
+        image._array = array
+        return image
+
+    @classmethod
+    def from_path(cls, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"圖片檔案不存在: {path}")
+        with open(path, "rb") as f:
+            return cls(f.read(), os.path.basename(path))
+
+    @property
+    def is_decoded(self):
+        return self._array is not None
+
+    @property
+    def array(self):
+        """BGR 像素陣列（延遲解碼，只解碼一次）"""
+        if self._array is None:
+            with self._lock:
+                if self._array is None:
+                    import cv2
+                    import numpy as np
+                    array = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    if array is None:
+                        raise ValueError(f"無法解碼圖片: {self.filename}")
+                    self._array = array
+        return self._array
+
+
+class ArtifactWriter:
+    """
+    非同步寫檔器
+
+    上傳原圖與標註圖在背景執行緒寫入磁碟，每個檔案只寫一次。
+    讀取端可用 wait() 等待尚未完成的寫入。
+
+    尚未寫入的資料都保存在記憶體中，因此最多積壓 max_pending 個檔案（含寫入後的 listener）；
+    超過時 write() 會等待，批次匯入等大量寫入的速度受限於磁碟，不會無限制佔用記憶體。
+    """
+
+    def __init__(self, workers=2, max_pending=256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """註冊寫入完成後在背景執行的 listener(path)，例如產生縮圖"""
+        self._listeners.append(listener)
+
+    def _get_executor(self):
+        # fork 後父行程的執行緒不存在，子行程需要自己的執行緒池
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="artifact-writer")
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+            self._pending = {}
+            self._pid = os.getpid()
+        return self._executor
+
+    def write(self, path, data):
+        """排程寫入位元組資料，回傳檔案寫入完成時完成的 Future；積壓已滿時等待"""
+        name = os.path.basename(path)
+        with self._lock:
+            executor = self._get_executor()
+            slots = self._slots
+        slots.acquire()
+        written = Future()
+        with self._lock:
+            self._pending[name] = written
+        written.add_done_callback(lambda f: self._done(name, f))
+        try:
+            executor.submit(self._write, path, data, written, slots)
+        except BaseException as e:
+            slots.release()
+            written.set_exception(e)
+            raise
+        return written
+
+    def _write(self, path, data, written, slots):
+        try:
+            try:
+                with time_stage("file_save"):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+            except BaseException as e:
+                written.set_exception(e)
+                return
+            written.set_result(path)
+            # listener 在同一個執行緒接著執行並佔用同一個名額，不另外排入執行緒池
+            for listener in self._listeners:
+                try:
+                    listener(path)
+                except Exception as e:
+                    print(f"寫檔後處理失敗 {os.path.basename(path)}: {e}")
+        finally:
+            slots.release()
+
+    def _done(self, name, future):
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
+
+    def wait(self, filename, timeout=10.0):
+        """等待指定檔名的寫入完成（沒有待寫入時立即返回）"""
+        with self._lock:
+            future = self._pending.get(filename)
+        if future is not None:
+            future.result(timeout=timeout)
+
+
+# 全域寫檔器
+artifact_writer = ArtifactWriter(
+    workers=int(os.getenv("ARTIFACT_WRITER_THREADS", 2)),
+    max_pending=int(os.getenv("ARTIFACT_WRITER_MAX_PENDING", 256))
+)
@@ -0,0 +1,212 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from src.models.job import DetectionJob, db
+from src.services.detection_pipeline import run_detection
+from src.services.storage import sharded_path, upload_storage
+
+
+class JobWorkerPool:
+    """
+    以 SQLite 為持久化佇列的背景檢測工作池
+
+    工作記錄存放在 detection_jobs 資料表。處理中的工作每 heartbeat_interval 秒更新
+    heartbeat_at；每個輪詢週期檢查一次，心跳超過 stale_after 秒未更新的工作
+    （處理中的 worker 已停止）會被重新排入佇列，執行中但較慢的工作不受影響。
+    已嘗試 max_attempts 次的工作不再重試而標記為失敗，避免讓 worker 中斷的工作無限循環。
+    worker 可以是執行緒（預設）或獨立行程；行程模式依賴 fork 啟動方式，
+    子行程只能靠輪詢發現新工作。
+    """
+
+    def __init__(self, app, detector_lease, workers=2, mode='thread',
+                 poll_interval=1.0, stale_after=300, heartbeat_interval=30, max_attempts=3):
+        self.app = app
+        # detector_lease() 回傳 context manager，處理工作期間持有目前版本的租約
+        self.detector_lease = detector_lease
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        self.poll_interval = float(poll_interval)
+        self.stale_after = float(stale_after)
+        # 心跳間隔需明顯短於 stale_after，否則執行中的工作也會被視為中斷
+        self.heartbeat_interval = min(float(heartbeat_interval), self.stale_after / 3)
+        self.max_attempts = max(1, int(max_attempts))
+        self._wakeup = threading.Condition()
+        self._changed = threading.Condition()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._pid = None
+        self._swept_at = 0.0
+
+    def ensure_started(self):
+        """啟動 worker（每個行程只啟動一次，fork 後會在子行程重新啟動）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            with self.app.app_context():
+                self._requeue_stale_jobs()
+
+            self._workers = []
+            for i in range(self.workers):
+                if self.mode == 'process':
+                    worker = multiprocessing.Process(
+                        target=_process_worker_main, args=(self,), name=f'detection-job-{i}', daemon=True
+                    )
+                else:
+                    worker = threading.Thread(
+                        target=self._worker_loop, name=f'detection-job-{i}', daemon=True
+                    )
+                worker.start()
+                self._workers.append(worker)
+
+    def _requeue_stale_jobs(self):
+        # worker 中斷時停留在 running 的工作重新排入佇列，已達嘗試次數上限的工作標記為失敗
+        now = datetime.utcnow()
+        stale = db.and_(
+            DetectionJob.status == DetectionJob.RUNNING,
+            db.func.coalesce(DetectionJob.heartbeat_at, DetectionJob.started_at) < now - timedelta(seconds=self.stale_after)
+        )
+        DetectionJob.query.filter(stale, DetectionJob.attempts >= self.max_attempts).update({
+            'status': DetectionJob.FAILED,
+            'error': f'處理工作的 worker 已中斷 {self.max_attempts} 次，不再重試',
+            'finished_at': now
+        }, synchronize_session=False)
+        DetectionJob.query.filter(stale).update({'status': DetectionJob.PENDING}, synchronize_session=False)
+        db.session.commit()
+
+    def enqueue(self, image_filename, camera_id, location):
+        """建立工作記錄並喚醒 worker"""
+        self.ensure_started()
+        job = DetectionJob(
+            id=str(uuid.uuid4()),
+            status=DetectionJob.PENDING,
+            camera_id=camera_id,
+            location=location,
+            image_filename=image_filename
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def wait_for(self, job_id, timeout):
+        """長輪詢：等待工作完成或逾時，回傳最新的工作記錄"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            db.session.expire_all()
+            job = db.session.get(DetectionJob, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.is_finished or remaining <= 0:
+                return job
+            # 跨行程的完成通知收不到，因此最多等待 poll_interval 後重新查詢
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _claim_next_job(self):
+        job = DetectionJob.query.filter_by(status=DetectionJob.PENDING) \
+            .order_by(DetectionJob.created_at).first()
+        if job is None:
+            return None
+
+        # 以條件式更新取得工作，避免多個 worker 重複處理
+        claimed = DetectionJob.query.filter_by(id=job.id, status=DetectionJob.PENDING).update({
+            'status': DetectionJob.RUNNING,
+            'started_at': datetime.utcnow(),
+            'heartbeat_at': datetime.utcnow(),
+            'attempts': DetectionJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return None
+        db.session.refresh(job)
+        return job
+
+    def _worker_loop(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    # 每個輪詢週期檢查一次中斷的 worker 遺留的工作，忙碌時也不會延誤
+                    if time.monotonic() - self._swept_at >= self.poll_interval:
+                        self._swept_at = time.monotonic()
+                        self._requeue_stale_jobs()
+                    job = self._claim_next_job()
+                except Exception:
+                    db.session.rollback()
+                    job = None
+
+                if job is None:
+                    with self._wakeup:
+                        self._wakeup.wait(self.poll_interval)
+                    continue
+
+                self._process(job)
+                db.session.remove()
+
+                with self._changed:
+                    self._changed.notify_all()
+
+    def _heartbeat(self, job_id, stop):
+        table = DetectionJob.__table__
+        with self.app.app_context():
+            while not stop.wait(self.heartbeat_interval):
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(
+                            table.update()
+                            .where(table.c.id == job_id, table.c.status == DetectionJob.RUNNING)
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+                except Exception as e:
+                    print(f"工作心跳寫入失敗: {e}")
+
+    def _process(self, job):
+        upload_folder = upload_storage.root
+        filepath = sharded_path(upload_folder, job.image_filename)
+        stop_heartbeat = threading.Event()
+        threading.Thread(
+            target=self._heartbeat, args=(job.id, stop_heartbeat), name='detection-job-heartbeat', daemon=True
+        ).start()
+        try:
+            with self.detector_lease() as detector:
+                _, _, response_data = run_detection(
+                    detector, filepath, job.image_filename,
+                    upload_folder, job.camera_id, job.location
+                )
+            job.status = DetectionJob.DONE
+            job.result = json.dumps(response_data, ensure_ascii=False)
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(DetectionJob, job.id)
+            job.status = DetectionJob.FAILED
+            job.error = f'檢測過程發生錯誤: {str(e)}'
+        finally:
+            stop_heartbeat.set()
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def stats(self):
+        counts = dict(
+            db.session.query(DetectionJob.status, db.func.count(DetectionJob.id))
+            .group_by(DetectionJob.status).all()
+        )
+        return {
+            'workers': self.workers,
+            'mode': self.mode,
+            'counts': counts
+        }
+
+
+def _process_worker_main(pool):
+    # 子行程不可沿用父行程的資料庫連線
+    with pool.app.app_context():
+        db.engine.dispose()
+    pool._worker_loop()
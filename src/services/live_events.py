@@ -0,0 +1,174 @@
+import os
+import queue
+import threading
+import time
+
+from src.models.detection import Detection, db
+from src.services.detection_queries import LIST_COLUMNS, serialize_row
+from src.services.metrics import registry
+
+
+class Subscription:
+    """單一訂閱者的事件佇列與篩選條件"""
+
+    def __init__(self, camera_id=None, location=None, bear_only=False, max_queue=100):
+        self.camera_id = camera_id
+        self.location = location
+        self.bear_only = bear_only
+        self.evicted = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+    def matches(self, event):
+        if self.camera_id and event.get('camera_id') != self.camera_id:
+            return False
+        if self.location and event.get('location') != self.location:
+            return False
+        if self.bear_only and not event.get('bear_detected'):
+            return False
+        return True
+
+    def offer(self, event):
+        """不阻塞地放入事件，佇列已滿時回傳 False"""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout):
+        """取出下一個事件，逾時回傳 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """
+    行程內的檢測事件廣播
+
+    每個訂閱者有固定長度的佇列，發布端從不阻塞；佇列滿了的慢速客戶端會被移除，
+    由客戶端帶 Last-Event-ID 重新連線補齊。
+
+    source 為 local 時由寫入端在 commit 後直接發布；pre-fork 多 worker 時改為 poll，
+    每個行程只有一個執行緒讀取新的檢測記錄，才能收到其他 worker 寫入的記錄。
+    """
+
+    LOCAL = 'local'
+    POLL = 'poll'
+
+    def __init__(self, max_queue=100, max_subscribers=200):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.source = self.LOCAL
+        self.poll_interval = 1.0
+        self.app = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._poller = None
+        self._poller_pid = None
+        self.published = registry.counter('live_events_published_total', '已發布的即時檢測事件數')
+        self.evictions = registry.counter('live_events_evicted_total', '因佇列已滿而移除的訂閱者數')
+        self.subscriber_gauge = registry.gauge('live_events_subscribers', '目前的即時事件訂閱者數')
+
+    def init_app(self, app, source=LOCAL, poll_interval=1.0, max_subscribers=None):
+        self.app = app
+        self.source = source
+        self.poll_interval = poll_interval
+        if max_subscribers is not None:
+            self.max_subscribers = max_subscribers
+        app.extensions['live_events'] = self
+
+    def subscribe(self, **filters):
+        """
+        新增訂閱者
+
+        Raises:
+            RuntimeError: 訂閱者數量已達上限
+        """
+        subscription = Subscription(max_queue=self.max_queue, **filters)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise RuntimeError('即時事件訂閱者已達上限')
+            self._subscribers.add(subscription)
+            self.subscriber_gauge.set(len(self._subscribers))
+        if self.source == self.POLL:
+            self._ensure_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            self.subscriber_gauge.set(len(self._subscribers))
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        self.published.inc()
+
+        for subscription in subscribers:
+            if not subscription.matches(event):
+                continue
+            if not subscription.offer(event):
+                subscription.evicted = True
+                self.unsubscribe(subscription)
+                self.evictions.inc()
+
+    def publish_detections(self, detections):
+        """寫入端 commit 後呼叫；poll 模式由輪詢執行緒發布，這裡不重複發布"""
+        if self.source != self.LOCAL or not self._subscribers:
+            return
+        for detection in detections:
+            self.publish(serialize_row(detection))
+
+    def _ensure_poller(self):
+        with self._lock:
+            # fork 後父行程的輪詢執行緒不存在
+            if self._poller is not None and self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            self._poller = threading.Thread(target=self._poll, name='live-events-poller', daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        with self.app.app_context():
+            last_id = db.session.query(db.func.max(Detection.id)).scalar() or 0
+            db.session.remove()
+            while True:
+                # 沒有訂閱者時停止輪詢，下次訂閱時重新啟動
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                try:
+                    rows = (db.session.query(*LIST_COLUMNS)
+                            .filter(Detection.id > last_id)
+                            .order_by(Detection.id)
+                            .limit(500).all())
+                    for row in rows:
+                        self.publish(serialize_row(row))
+                        last_id = row.id
+                except Exception:
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                time.sleep(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            'source': self.source,
+            'subscribers': subscribers,
+            'published': self.published.value,
+            'evicted': self.evictions.value
+        }
+
+
+# 全域事件廣播
+event_hub = EventHub(
+    max_queue=int(os.getenv('LIVE_EVENTS_QUEUE_SIZE', 100)),
+    max_subscribers=int(os.getenv('LIVE_EVENTS_MAX_SUBSCRIBERS', 200))
+)
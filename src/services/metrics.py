@@ -0,0 +1,338 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 預設的延遲分桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value in ('+Inf', float('inf')):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """執行緒安全的累加計數器"""
+
+    type = 'counter'
+
+    def __init__(self, name, description='', labels=None):
+        self.name = name
+        self.description = description
+        self.labels = _label_key(labels)
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return {'name': self.name, 'labels': dict(self.labels), 'value': self._value}
+
+    def render(self):
+        return [f'{self.name}{_format_labels(self.labels)} {_format_value(self._value)}']
+
+    def reset(self):
+        with self._lock:
+            self._value = 0
+
+    def dump(self):
+        return {'value': self._value}
+
+    def merge(self, data):
+        self._value += data['value']
+
+
+class Gauge(Counter):
+    """可增減的數值，例如進行中的請求數"""
+
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+
+class Histogram:
+    """固定分桶的直方圖"""
+
+    type = 'histogram'
+
+    def __init__(self, name, buckets=DEFAULT_LATENCY_BUCKETS, description='', labels=None):
+        self.name = name
+        self.description = description
+        self.labels = _label_key(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append({'le': bound if bound != float('inf') else '+Inf', 'count': running})
+
+        return {
+            'name': self.name,
+            'labels': dict(self.labels),
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+            'buckets': cumulative
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+            self._count = 0
+
+    def dump(self):
+        with self._lock:
+            return {'buckets': list(self.buckets), 'counts': list(self._counts), 'sum': self._sum, 'count': self._count}
+
+    def merge(self, data):
+        # 各 worker 的分桶設定相同（同一份程式碼建立）
+        self._counts = [a + b for a, b in zip(self._counts, data['counts'])]
+        self._sum += data['sum']
+        self._count += data['count']
+
+    def render(self):
+        snapshot = self.snapshot()
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labels, [('le', _format_value(bucket['le']))])} {bucket['count']}"
+            for bucket in snapshot['buckets']
+        ]
+        lines.append(f'{self.name}_sum{_format_labels(self.labels)} {_format_value(snapshot["sum"])}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels)} {snapshot["count"]}')
+        return lines
+
+
+_METRIC_TYPES = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    以名稱與標籤索引的指標集合，同名同標籤的指標只會建立一次
+
+    pre-fork 多 worker 時以 enable_multiprocess() 指定共用目錄：每個 worker 定期把自己的指標寫成
+    <pid>.json，抓取時合併所有 worker 的檔案（counter 與 histogram 相加，gauge 只加總仍存活的 worker），
+    不論請求落在哪個 worker 都回傳整體的數值。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.multiprocess_dir = None
+        self.flush_interval = 5.0
+        self._flusher_pid = None
+
+    def counter(self, name, description='', labels=None):
+        return self._get_or_create(name, labels, lambda: Counter(name, description, labels))
+
+    def gauge(self, name, description='', labels=None):
+        return self._get_or_create(name, labels, lambda: Gauge(name, description, labels))
+
+    def histogram(self, name, buckets=DEFAULT_LATENCY_BUCKETS, description='', labels=None):
+        return self._get_or_create(name, labels, lambda: Histogram(name, buckets, description, labels))
+
+    def _get_or_create(self, name, labels, factory):
+        key = (name, _label_key(labels))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = factory()
+                self._metrics[key] = metric
+            return metric
+
+    # ---- pre-fork 多 worker 彙總 ----
+
+    def enable_multiprocess(self, directory, flush_interval=5.0, clear=False):
+        """
+        啟用跨 worker 彙總；master 在 fork 前以 clear=True 呼叫，清除上次部署留下的檔案
+        """
+        os.makedirs(directory, exist_ok=True)
+        if clear:
+            for name in os.listdir(directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(directory, name))
+        self.multiprocess_dir = directory
+        self.flush_interval = flush_interval
+
+    def after_fork(self):
+        """worker fork 後呼叫：歸零從 master 繼承的數值並開始定期寫出，避免 master 的數值被每個 worker 重複計入"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+        if self.multiprocess_dir is None or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_process_file()
+            except OSError as e:
+                print(f"指標寫出失敗: {e}")
+
+    def write_process_file(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = [
+            dict(metric.dump(), name=metric.name, type=metric.type, description=metric.description,
+                 labels=[list(pair) for pair in metric.labels])
+            for metric in metrics
+        ]
+        path = os.path.join(self.multiprocess_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _collect(self):
+        """本行程的指標；啟用彙總時為所有 worker 合併後的指標"""
+        if self.multiprocess_dir is None:
+            with self._lock:
+                return list(self._metrics.values())
+
+        # 先寫出本行程的最新數值，其他 worker 的數值最多延遲 flush_interval 秒
+        self.write_process_file()
+        merged = {}
+        for name in os.listdir(self.multiprocess_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, name)) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(int(name[:-len('.json')]))
+            for entry in entries:
+                if entry['type'] == 'gauge' and not alive:
+                    # 已結束的 worker 的進行中數量不再有意義
+                    continue
+                labels = dict(tuple(pair) for pair in entry['labels'])
+                key = (entry['name'], _label_key(labels))
+                metric = merged.get(key)
+                if metric is None:
+                    cls = _METRIC_TYPES[entry['type']]
+                    if cls is Histogram:
+                        metric = Histogram(entry['name'], entry['buckets'], entry['description'], labels)
+                    else:
+                        metric = cls(entry['name'], entry['description'], labels)
+                    merged[key] = metric
+                metric.merge(entry)
+        return list(merged.values())
+
+    def snapshot(self):
+        metrics = self._collect()
+        return {metric.name + _format_labels(metric.labels): metric.snapshot() for metric in metrics}
+
+    def render_prometheus(self):
+        """輸出 Prometheus text exposition 格式（0.0.4）"""
+        metrics = self._collect()
+
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name in sorted(families):
+            family = families[name]
+            description = next((m.description for m in family if m.description), '')
+            if description:
+                lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {family[0].type}')
+            for metric in sorted(family, key=lambda m: m.labels):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 全域指標登錄表
+registry = MetricsRegistry()
+
+# 目前請求各階段的耗時，用於 Server-Timing 標頭；未開始記錄時為 None
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def begin_request_timings():
+    _request_timings.set([])
+
+
+def end_request_timings():
+    """結束記錄並回傳 [(階段, 秒數), ...]"""
+    timings = _request_timings.get()
+    _request_timings.set(None)
+    return timings or []
+
+
+@contextmanager
+def time_stage(stage):
+    """記錄檢測流程中一個階段的耗時（detection_stage_seconds{stage=...}）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.histogram(
+            'detection_stage_seconds', description='檢測流程各階段耗時', labels={'stage': stage}
+        ).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
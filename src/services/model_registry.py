@@ -0,0 +1,419 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from src.services.backends import create_backend
+from src.services.bear_detection import BearDetectionService
+from src.services.image_pipeline import UploadedImage
+from src.services.metrics import registry
+
+
+class ModelSpec:
+    """
+    模型版本設定
+
+    backend / model_path / api_url 未指定時沿用環境變數（DETECTION_BACKEND、MODEL_PATH、HF_API_URL）
+    """
+
+    FIELDS = ('version', 'backend', 'model_path', 'api_url')
+
+    def __init__(self, version, backend=None, model_path=None, api_url=None):
+        self.version = version
+        self.backend = backend
+        self.model_path = model_path
+        self.api_url = api_url
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Raises:
+            ValueError: 缺少版本名稱
+        """
+        if not isinstance(data, dict) or not data.get('version'):
+            raise ValueError('請提供模型版本名稱 version')
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def build(self):
+        backend = create_backend(self.backend, self.model_path, self.api_url)
+        return BearDetectionService(self.model_path, backend=backend, version=self.version)
+
+
+class ModelRegistry:
+    """
+    可熱切換的模型版本
+
+    新版本在背景執行緒建立並預熱完成後才以單一參照替換。請求與背景任務以 lease() 取得檢測服務並登記租約，
+    進行中的工作會在舊版本上完成；舊版本退役後，等最後一個租約歸還才釋放資源。
+
+    可另外指定影子版本：依 shadow_rate 抽樣的請求會在背景以影子版本推論，
+    記錄各版本的推論耗時與判定不一致的次數，不影響回應。
+
+    目前版本與預設信心度閾值寫入 state_path；pre-fork 的其他 worker 定期檢查該檔案，
+    各自在背景載入同一版本並套用同一閾值。
+    """
+
+    def __init__(self, initial_factory, state_path, check_interval=5.0, shadow_workers=2):
+        self.initial_factory = initial_factory
+        self.state_path = state_path
+        self.check_interval = check_interval
+        self.shadow_workers = shadow_workers
+        self._lock = threading.Lock()
+        self.active = None
+        self.shadow = None
+        self.shadow_rate = 0.0
+        # /api/set-confidence 設定的預設閾值；None 時沿用檢測服務本身的預設值
+        self.confidence_threshold = None
+        self.loading = None
+        self._state_mtime = None
+        self._checked_at = 0.0
+        self._shadow_executor = None
+        self._shadow_slots = None
+        # 各版本持有中的租約數；已退役但仍有租約的版本等租約歸還後才釋放
+        self._leases = {}
+        self._retired = set()
+        self._pid = os.getpid()
+
+    def get(self):
+        """目前的檢測服務（第一次呼叫時建立初始版本）"""
+        if self.active is None:
+            with self._lock:
+                if self.active is None:
+                    self.active = self._build_initial()
+        self._maybe_sync()
+        return self.active
+
+    def acquire(self):
+        """取得目前的檢測服務並登記租約，用完須呼叫 release()"""
+        self.get()
+        with self._lock:
+            # 在鎖內讀取並登記，避免剛好被切換、退役的版本在登記前就被釋放
+            detector = self.active
+            self._leases[detector] = self._leases.get(detector, 0) + 1
+        return detector
+
+    def release(self, detector):
+        """歸還租約；已退役的版本在最後一個租約歸還時釋放"""
+        with self._lock:
+            remaining = self._leases.get(detector, 0) - 1
+            if remaining > 0:
+                self._leases[detector] = remaining
+                return
+            self._leases.pop(detector, None)
+            if detector not in self._retired:
+                return
+            self._retired.discard(detector)
+        detector.close()
+
+    @contextmanager
+    def lease(self):
+        """with registry.lease() as detector: 期間版本切換也不會釋放該檢測服務"""
+        detector = self.acquire()
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def _build_initial(self):
+        # 重新啟動後沿用上次切換的版本與閾值
+        state = self._read_state() or {}
+        if state.get('confidence_threshold') is not None:
+            self.confidence_threshold = float(state['confidence_threshold'])
+        detector = None
+        if state.get('active'):
+            try:
+                detector = ModelSpec.from_dict(state['active']).build()
+            except Exception as e:
+                print(f"載入記錄的模型版本失敗，改用預設模型: {e}")
+        if detector is None:
+            detector = self.initial_factory()
+        self._apply_threshold(detector)
+        return detector
+
+    def _apply_threshold(self, detector):
+        if self.confidence_threshold is not None:
+            detector.set_confidence_threshold(self.confidence_threshold)
+
+    def set_confidence_threshold(self, threshold):
+        """設定預設信心度閾值並寫入版本記錄，其他 worker 下次同步時套用"""
+        self.get()
+        with self._lock:
+            self.confidence_threshold = threshold
+            self._apply_threshold(self.active)
+        state = self._read_state() or {}
+        state['confidence_threshold'] = threshold
+        self._save_state(state)
+
+    def after_fork(self):
+        """pre-fork worker 啟動時呼叫：重建後端資源，父行程的背景執行緒不存在於子行程"""
+        self._pid = os.getpid()
+        self.loading = None
+        self._state_mtime = None
+        self._shadow_executor = None
+        # 持有租約的執行緒不存在於子行程
+        self._leases = {}
+        self._retired = set()
+        for detector in (self.active, self.shadow):
+            if detector is not None:
+                detector.after_fork()
+
+    # ---- 版本切換 ----
+
+    def load(self, spec, shadow=False, shadow_rate=None):
+        """
+        在背景載入並預熱版本，完成後切換為目前版本（或影子版本）
+
+        Raises:
+            RuntimeError: 已有版本載入中
+        """
+        with self._lock:
+            if self.loading is not None and self.loading['status'] == 'loading':
+                raise RuntimeError(f"版本 {self.loading['version']} 載入中")
+            self.loading = {'version': spec.version, 'role': 'shadow' if shadow else 'active',
+                            'status': 'loading', 'error': None}
+            if shadow and shadow_rate is not None:
+                self.shadow_rate = shadow_rate
+
+        thread = threading.Thread(target=self._load, args=(spec, shadow, True), name='model-loader', daemon=True)
+        thread.start()
+        return self.loading
+
+    def _load(self, spec, shadow, publish=False):
+        started = time.perf_counter()
+        try:
+            detector = spec.build()
+            detector.backend.warmup()
+            if not shadow:
+                # 沿用 /api/set-confidence 設定的預設閾值
+                self._apply_threshold(detector)
+        except Exception as e:
+            print(f"模型版本 {spec.version} 載入失敗: {e}")
+            with self._lock:
+                self.loading = dict(self.loading, status='failed', error=str(e))
+            return
+
+        self._install(detector, shadow)
+        # 載入成功後才記錄，其他 worker 不會跟著載入失敗的版本
+        if publish:
+            self._write_state(spec, shadow)
+        with self._lock:
+            self.loading = dict(self.loading, status='ready', seconds=round(time.perf_counter() - started, 3))
+        print(f"模型版本 {spec.version} 已{'設為影子版本' if shadow else '切換上線'}")
+
+    def _install(self, detector, shadow):
+        with self._lock:
+            if shadow:
+                previous, self.shadow = self.shadow, detector
+            else:
+                previous, self.active = self.active, detector
+        if previous is not None and previous is not detector:
+            self._retire(previous)
+
+    def promote_shadow(self):
+        """
+        將已預熱的影子版本直接切換為目前版本
+
+        Raises:
+            RuntimeError: 沒有影子版本
+        """
+        with self._lock:
+            detector = self.shadow
+            if detector is None:
+                raise RuntimeError('沒有影子版本')
+            self._apply_threshold(detector)
+            previous, self.active, self.shadow = self.active, detector, None
+        state = self._read_state() or {}
+        state['active'], state['shadow'] = state.get('shadow') or {'version': detector.version}, None
+        self._save_state(state)
+        self._retire(previous)
+        return detector.version
+
+    def clear_shadow(self):
+        with self._lock:
+            previous, self.shadow = self.shadow, None
+        state = self._read_state() or {}
+        state['shadow'] = None
+        self._save_state(state)
+        if previous is not None:
+            self._retire(previous)
+
+    def _retire(self, detector):
+        # 仍有請求或背景任務持有租約時，等最後一個租約歸還後再釋放
+        with self._lock:
+            if self._leases.get(detector):
+                self._retired.add(detector)
+                return
+        detector.close()
+
+    # ---- 跨 worker 同步 ----
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, state):
+        state['shadow_rate'] = self.shadow_rate
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self._state_mtime = os.stat(self.state_path).st_mtime_ns
+
+    def _write_state(self, spec, shadow):
+        state = self._read_state() or {}
+        state['shadow' if shadow else 'active'] = spec.to_dict()
+        self._save_state(state)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._state_mtime:
+            return
+        self._state_mtime = mtime
+        state = self._read_state()
+        if not state:
+            return
+
+        self.shadow_rate = float(state.get('shadow_rate') or 0.0)
+        if state.get('confidence_threshold') is not None:
+            with self._lock:
+                self.confidence_threshold = float(state['confidence_threshold'])
+                self._apply_threshold(self.active)
+        try:
+            self._sync_role(state.get('active'), shadow=False)
+            self._sync_role(state.get('shadow'), shadow=True)
+        except RuntimeError:
+            # 正在載入其他版本，下次檢查時再同步
+            self._state_mtime = None
+
+    def _sync_role(self, data, shadow):
+        current = self.shadow if shadow else self.active
+        if data is None:
+            if shadow and current is not None:
+                with self._lock:
+                    self.shadow = None
+                self._retire(current)
+            return
+        version = data.get('version')
+        if current is not None and current.version == version:
+            return
+        if not shadow and self.shadow is not None and self.shadow.version == version:
+            # 其他 worker 提升了影子版本，本行程已預熱同一版本
+            with self._lock:
+                self._apply_threshold(self.shadow)
+                previous, self.active, self.shadow = self.active, self.shadow, None
+            self._retire(previous)
+            return
+        spec = ModelSpec.from_dict(data)
+        with self._lock:
+            if self.loading is not None and self.loading['status'] == 'loading':
+                raise RuntimeError('版本載入中')
+            self.loading = {'version': version, 'role': 'shadow' if shadow else 'active',
+                            'status': 'loading', 'error': None}
+        threading.Thread(target=self._load, args=(spec, shadow), name='model-loader', daemon=True).start()
+
+    # ---- 影子評估 ----
+
+    def maybe_shadow(self, image, primary_result, threshold=None):
+        """依抽樣比例在背景以影子版本推論同一張圖片，比較判定結果"""
+        shadow = self.shadow
+        # 標註框直接畫在 image.array 上，影子版本需由原始位元組重新解碼，沒有位元組的影格不抽樣
+        if shadow is None or image.data is None or 'error' in primary_result or random.random() >= self.shadow_rate:
+            return
+        executor = self._get_shadow_executor()
+        # 影子推論積壓時直接略過，不排隊
+        if not self._shadow_slots.acquire(blocking=False):
+            registry.counter('shadow_dropped_total', '影子推論忙碌而略過的請求數', {'version': shadow.version}).inc()
+            return
+        with self._lock:
+            if self.shadow is not shadow:
+                # 影子版本剛被清除或替換，可能已釋放
+                self._shadow_slots.release()
+                return
+            self._leases[shadow] = self._leases.get(shadow, 0) + 1
+        executor.submit(self._run_shadow, shadow, image, primary_result, threshold)
+
+    def _get_shadow_executor(self):
+        if self._shadow_executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._shadow_executor is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._shadow_executor = ThreadPoolExecutor(self.shadow_workers, thread_name_prefix='shadow')
+                    self._shadow_slots = threading.BoundedSemaphore(self.shadow_workers * 4)
+        return self._shadow_executor
+
+    def _run_shadow(self, shadow, image, primary_result, threshold):
+        try:
+            # 在影子執行緒重新解碼，請求路徑不必為抽樣保留未標註的副本
+            result = shadow.detect_bear(UploadedImage(image.data, image.filename), annotate=False, threshold=threshold)
+            labels = {'version': shadow.version}
+            registry.counter('shadow_comparisons_total', '影子版本比較次數', labels).inc()
+            if 'error' in result:
+                registry.counter('shadow_errors_total', '影子版本推論失敗次數', labels).inc()
+                return
+            primary_bear = bool(primary_result.get('bear_detected'))
+            shadow_bear = bool(result.get('bear_detected'))
+            if primary_bear != shadow_bear:
+                registry.counter(
+                    'shadow_disagreements_total', '影子版本與目前版本判定不一致的次數',
+                    {'version': shadow.version, 'shadow_verdict': 'bear' if shadow_bear else 'no_bear'}
+                ).inc()
+        finally:
+            self._shadow_slots.release()
+            self.release(shadow)
+
+    def snapshot(self):
+        def describe(detector):
+            if detector is None:
+                return None
+            latency = registry.histogram(
+                'model_inference_seconds', description='各模型版本的推論耗時',
+                labels={'version': detector.version}
+            ).snapshot()
+            return {
+                'version': detector.version,
+                'identity': detector.get_model_identity(),
+                'confidence_threshold': detector.confidence_threshold,
+                'inferences': latency['count'],
+                'mean_inference_seconds': latency['mean']
+            }
+
+        shadow = describe(self.shadow)
+        if shadow is not None:
+            labels = {'version': self.shadow.version}
+            comparisons = registry.counter('shadow_comparisons_total', '影子版本比較次數', labels).value
+            disagreements = sum(
+                registry.counter(
+                    'shadow_disagreements_total', '影子版本與目前版本判定不一致的次數',
+                    dict(labels, shadow_verdict=verdict)
+                ).value
+                for verdict in ('bear', 'no_bear')
+            )
+            shadow.update({
+                'sample_rate': self.shadow_rate,
+                'comparisons': comparisons,
+                'disagreements': disagreements,
+                'disagreement_rate': round(disagreements / comparisons, 4) if comparisons else None
+            })
+
+        return {
+            'active': describe(self.active),
+            'shadow': shadow,
+            'loading': self.loading
+        }
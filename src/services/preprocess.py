@@ -0,0 +1,99 @@
+import io
+
+from src.services.image_pipeline import UploadedImage
+from src.services.metrics import registry, time_stage
+
+PREPROCESS_FORMATS = {'jpeg': ('.jpg', 'image/jpeg'), 'webp': ('.webp', 'image/webp')}
+
+# 不需重新編碼即可直接送出的格式
+PASSTHROUGH_TYPES = ('image/jpeg', 'image/webp')
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def exif_orientation(data):
+    """讀取 EXIF 方向標記（只解析檔頭，不解碼像素），無法判斷時回傳 1"""
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            return img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+
+
+class Preprocessor:
+    """
+    送往遠端推論前的影像正規化
+
+    解碼一次（OpenCV 解碼時已套用 EXIF 方向），長邊縮放到模型輸入尺寸後重新編碼為
+    JPEG 或 WebP，大幅縮小上傳量；回傳的框再依縮放比例換算回原圖座標，
+    與標註使用的解碼陣列一致。解碼後的陣列保留在 UploadedImage 上，標註時不再解碼。
+    """
+
+    def __init__(self, max_side=640, fmt='jpeg', quality=90):
+        self.max_side = max_side
+        self.fmt = fmt
+        self.quality = quality
+        self.original_bytes = registry.counter(
+            'inference_payload_bytes_total', '送往推論後端的影像位元組數', {'stage': 'original'}
+        )
+        self.sent_bytes = registry.counter(
+            'inference_payload_bytes_total', '送往推論後端的影像位元組數', {'stage': 'sent'}
+        )
+
+    def prepare(self, image):
+        """
+        產生送往推論後端的影像
+
+        Returns:
+            tuple: (UploadedImage, 縮放比例)；比例為送出影像相對原圖的倍率
+        Raises:
+            ValueError: 無法解碼圖片
+        """
+        with time_stage('preprocess'):
+            payload, scale = self._prepare(image)
+        self.original_bytes.inc(len(image.data))
+        self.sent_bytes.inc(len(payload.data))
+        return payload, scale
+
+    def _prepare(self, image):
+        import cv2
+
+        array = image.array
+        height, width = array.shape[:2]
+        scale = min(1.0, self.max_side / float(max(height, width)))
+
+        # 已是小尺寸的 JPEG/WebP 且不需轉向時直接送出原始位元組
+        if scale == 1.0 and image.content_type in PASSTHROUGH_TYPES and exif_orientation(image.data) == 1:
+            return image, 1.0
+
+        if scale < 1.0:
+            array = cv2.resize(array, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        extension, _ = PREPROCESS_FORMATS[self.fmt]
+        if self.fmt == 'webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        ok, encoded = cv2.imencode(extension, array, params)
+        if not ok:
+            raise ValueError(f"無法編碼圖片: {image.filename}")
+
+        stem = image.filename.rsplit('.', 1)[0]
+        return UploadedImage(encoded.tobytes(), f"{stem}{extension}"), scale
+
+    @staticmethod
+    def rescale(predictions, scale):
+        """將縮放後影像上的框換算回原圖座標"""
+        if scale == 1.0 or not isinstance(predictions, list):
+            return predictions
+        inverse = 1.0 / scale
+        rescaled = []
+        for prediction in predictions:
+            box = prediction.get('box', {})
+            rescaled.append(dict(prediction, box={
+                key: (value * inverse if isinstance(value, (int, float)) else value)
+                for key, value in box.items()
+            }))
+        return rescaled
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from src.services.metrics import registry
+
+
+def make_cache_key(image_bytes, model_identity, confidence_threshold):
+    """以圖片內容雜湊、模型識別與信心度閾值組成快取鍵"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{digest}:{model_identity}:{float(confidence_threshold):.6f}"
+
+
+class ResultCache:
+    """
+    有容量上限與存活時間的 LRU 快取
+
+    值通常是既有 Detection 記錄的 id，重複上傳同一張圖片時可直接沿用。
+    其他用途的快取以 metric_prefix 與 description 區分命中率指標。
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, metric_prefix='result_cache', description='檢測結果快取'):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = registry.counter(f'{metric_prefix}_hits_total', f'{description}命中次數')
+        self.misses = registry.counter(f'{metric_prefix}_misses_total', f'{description}未命中次數')
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits.inc()
+                    return value
+                del self._entries[key]
+        self.misses.inc()
+        return None
+
+    def set(self, key, value, ttl_seconds=None):
+        """ttl_seconds 未指定時使用預設的存活時間"""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        hits = self.hits.value
+        misses = self.misses.value
+        total = hits + misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
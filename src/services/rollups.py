@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import datetime
+
+from src.models.detection import Detection, DetectionRollup, db
+
+# total 粒度使用固定的 bucket_start
+TOTAL_BUCKET = datetime(1970, 1, 1)
+
+SCOPES = ('all', 'camera', 'location')
+GRANULARITIES = ('total', 'hour', 'day')
+
+
+def bucket_start(detected_at, granularity):
+    if granularity == 'hour':
+        return detected_at.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return detected_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return TOTAL_BUCKET
+
+
+def _rollup_keys(camera_id, location, detected_at):
+    scope_keys = {'all': '', 'camera': camera_id, 'location': location}
+    for scope in SCOPES:
+        for granularity in GRANULARITIES:
+            yield scope, scope_keys[scope], granularity, bucket_start(detected_at, granularity)
+
+
+def _upsert(rows):
+    """以 INSERT ... ON CONFLICT DO UPDATE 累加計數（SQLite 與 PostgreSQL 皆支援）"""
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = DetectionRollup.__table__
+    statement = insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=['scope', 'scope_key', 'granularity', 'bucket_start'],
+        set_={
+            'total_count': table.c.total_count + statement.excluded.total_count,
+            'bear_count': table.c.bear_count + statement.excluded.bear_count
+        }
+    )
+    db.session.execute(statement)
+
+
+def record_detections(detections):
+    """
+    在目前的交易中累加一批檢測記錄的彙總（不會 commit）
+
+    呼叫端需在同一個 commit 中寫入檢測記錄，讓統計與明細保持一致。
+    """
+    counts = defaultdict(lambda: [0, 0])
+    for detection in detections:
+        for key in _rollup_keys(detection.camera_id, detection.location, detection.detected_at):
+            counts[key][0] += 1
+            counts[key][1] += 1 if detection.bear_detected else 0
+
+    _upsert([
+        {
+            'scope': scope,
+            'scope_key': scope_key,
+            'granularity': granularity,
+            'bucket_start': start,
+            'total_count': total,
+            'bear_count': bears
+        }
+        for (scope, scope_key, granularity, start), (total, bears) in counts.items()
+    ])
+
+
+def record_detection(detection):
+    record_detections([detection])
+
+
+def get_totals(scope='all', scope_key=''):
+    """取得某個範圍的總數 (total_count, bear_count)"""
+    rollup = DetectionRollup.query.filter_by(
+        scope=scope, scope_key=scope_key, granularity='total', bucket_start=TOTAL_BUCKET
+    ).first()
+    if rollup is None:
+        return 0, 0
+    return rollup.total_count, rollup.bear_count
+
+
+def get_series(scope='all', scope_key='', granularity='hour', start=None, end=None):
+    """取得時間區間內的彙總序列（end 不含，與其他時間範圍查詢一致）"""
+    query = DetectionRollup.query.filter_by(scope=scope, scope_key=scope_key, granularity=granularity)
+    if start is not None:
+        query = query.filter(DetectionRollup.bucket_start >= bucket_start(start, granularity))
+    if end is not None:
+        query = query.filter(DetectionRollup.bucket_start < end)
+    return query.order_by(DetectionRollup.bucket_start).all()
+
+
+def get_breakdown(scope):
+    """取得每台相機或每個位置的總數"""
+    return DetectionRollup.query.filter_by(scope=scope, granularity='total') \
+        .order_by(DetectionRollup.total_count.desc()).all()
+
+
+def rebuild_rollups(batch_size=10000):
+    """從既有檢測記錄重建彙總表，回傳處理的記錄數"""
+    DetectionRollup.query.delete()
+
+    counts = defaultdict(lambda: [0, 0])
+    processed = 0
+    rows = db.session.query(
+        Detection.camera_id, Detection.location, Detection.bear_detected, Detection.detected_at
+    ).yield_per(batch_size)
+    for camera_id, location, bear_detected, detected_at in rows:
+        for key in _rollup_keys(camera_id, location, detected_at):
+            counts[key][0] += 1
+            counts[key][1] += 1 if bear_detected else 0
+        processed += 1
+
+    items = list(counts.items())
+    for i in range(0, len(items), batch_size):
+        db.session.bulk_insert_mappings(DetectionRollup, [
+            {
+                'scope': scope,
+                'scope_key': scope_key,
+                'granularity': granularity,
+                'bucket_start': start,
+                'total_count': total,
+                'bear_count': bears
+            }
+            for (scope, scope_key, granularity, start), (total, bears) in items[i:i + batch_size]
+        ])
+    db.session.commit()
+    return processed
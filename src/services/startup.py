@@ -0,0 +1,85 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """
+    記錄啟動各階段耗時與模型就緒狀態
+
+    liveness (/api/health) 只要行程存活即可回應；readiness (/api/ready)
+    要等模型預熱完成才回報就緒。
+    """
+
+    STARTING = 'starting'
+    WARMING = 'warming'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._status = self.STARTING
+        self._error = None
+        self._thread = None
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._stages[name] = round(seconds * 1000.0, 2)
+
+    @contextmanager
+    def stage(self, name):
+        """以 with 區塊計時一個啟動階段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def set_status(self, status, error=None):
+        with self._lock:
+            self._status = status
+            self._error = error
+
+    @property
+    def is_ready(self):
+        return self._status == self.READY
+
+    def warm_up(self, warmup_fn, background=True):
+        """
+        執行模型預熱；background=True 時在背景執行緒進行，不阻擋服務啟動
+
+        預熱失敗不會讓行程結束，只會讓 readiness 回報 failed。
+        """
+        def run():
+            self.set_status(self.WARMING)
+            try:
+                with self.stage('model_load'):
+                    warmup_fn()
+            except Exception as e:
+                print(f"模型預熱失敗: {e}")
+                self.set_status(self.FAILED, str(e))
+                return
+            self.set_status(self.READY)
+            print(f"模型預熱完成，啟動耗時: {self.snapshot()['stages_ms']}")
+
+        if not background:
+            run()
+            return
+
+        self._thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        self._thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'status': self._status,
+                'error': self._error,
+                'stages_ms': dict(self._stages),
+                'uptime_seconds': round(time.perf_counter() - self.started_at, 3)
+            }
+
+
+# 全域啟動報告
+startup_report = StartupReport()
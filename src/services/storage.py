@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import threading
+import time
+
+DERIVED_DIR = '_derived'
+
+# 衍生圖的最長邊像素，full 只轉檔不縮放
+DERIVATIVE_SIZES = {'thumb': 160, 'small': 320, 'medium': 800, 'full': None}
+DERIVATIVE_FORMATS = {'webp': '.webp', 'jpeg': '.jpg'}
+
+# 未壓縮的點陣格式移到冷儲存時以 gzip 壓縮；JPEG、PNG、WebP、GIF 本身已壓縮，原樣搬移
+COMPRESSIBLE_EXTENSIONS = {'.bmp', '.tif', '.tiff'}
+
+
+def shard_dir(filename):
+    """依檔名雜湊分散到兩層子目錄（256 x 256），避免單一目錄累積數萬個檔案"""
+    digest = hashlib.md5(filename.encode('utf-8')).hexdigest()
+    return os.path.join(digest[:2], digest[2:4])
+
+
+def sharded_path(root, filename):
+    return os.path.join(root, shard_dir(filename), filename)
+
+
+def _is_safe_filename(filename):
+    return bool(filename) and filename == os.path.basename(filename) and not filename.startswith('.')
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class UploadStorage:
+    """
+    上傳圖片的分層儲存
+
+    - 熱儲存：root 下依檔名雜湊分層的目錄，舊版直接放在 root 的檔案仍可讀取
+    - 衍生圖：root/_derived 下的縮圖與 WebP，首次請求時產生或寫入後在背景產生
+    - 冷儲存：超過保留天數的原始圖片移到 cold_root（代替物件儲存），只有未壓縮的格式另外以 gzip 壓縮
+    """
+
+    def __init__(self, root, cold_root, quality=80, eager_sizes=('thumb',)):
+        self.root = root
+        self.cold_root = cold_root
+        self.quality = quality
+        self.eager_sizes = eager_sizes
+
+    def path_for(self, filename):
+        """新檔案的寫入位置"""
+        return sharded_path(self.root, filename)
+
+    def cold_path_for(self, filename):
+        path = sharded_path(self.cold_root, filename)
+        if os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            return path + '.gz'
+        return path
+
+    def locate(self, filename):
+        """
+        尋找檔案位置
+
+        Returns:
+            tuple: ('hot', 路徑) 或 ('cold', 冷儲存路徑，gzip 壓縮的以 .gz 結尾)；找不到時為 None
+        """
+        if not _is_safe_filename(filename):
+            return None
+        for path in (self.path_for(filename), os.path.join(self.root, filename)):
+            if os.path.isfile(path):
+                return 'hot', path
+        # 舊版冷儲存的檔案一律為 .gz
+        cold_path = sharded_path(self.cold_root, filename)
+        for path in (cold_path, cold_path + '.gz'):
+            if os.path.isfile(path):
+                return 'cold', path
+        return None
+
+    def resolve(self, filename, size=None, fmt=None):
+        """
+        解析 /api/uploads 請求的檔案；指定 size 或 fmt 時回傳衍生圖
+
+        Returns:
+            tuple: ('hot', 路徑) 或 ('cold', 冷儲存路徑)；找不到時為 None
+        Raises:
+            ValueError: 不支援的尺寸或格式
+        """
+        if size or fmt:
+            size = size or 'full'
+            fmt = fmt or 'webp'
+            if size not in DERIVATIVE_SIZES or fmt not in DERIVATIVE_FORMATS:
+                raise ValueError('不支援的圖片尺寸或格式')
+            path = self.get_derivative(filename, size, fmt)
+            return ('hot', path) if path is not None else None
+        return self.locate(filename)
+
+    def read(self, filename):
+        """讀取原始內容（冷儲存的壓縮檔會解壓縮），找不到時回傳 None"""
+        location = self.locate(filename)
+        if location is None:
+            return None
+        _, path = location
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            return f.read()
+
+    def derivative_path(self, filename, size, fmt):
+        stem = os.path.splitext(filename)[0]
+        derived_name = f"{stem}_{size}{DERIVATIVE_FORMATS[fmt]}"
+        return sharded_path(os.path.join(self.root, DERIVED_DIR), derived_name)
+
+    def get_derivative(self, filename, size='thumb', fmt='webp'):
+        """
+        取得衍生圖路徑，不存在時同步產生
+
+        Returns:
+            str: 衍生圖路徑；原始圖片不存在或無法解碼時為 None
+        """
+        path = self.derivative_path(filename, size, fmt)
+        if os.path.isfile(path):
+            return path
+
+        data = self.read(filename)
+        if data is None:
+            return None
+        encoded = self._render(data, DERIVATIVE_SIZES[size], fmt)
+        if encoded is None:
+            return None
+        # 同時有多個請求產生同一張衍生圖時，各自寫暫存檔再原子替換，結果相同
+        _atomic_write(path, encoded)
+        return path
+
+    def _render(self, data, max_side, fmt):
+        import cv2
+        import numpy as np
+
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        if max_side and max(height, width) > max_side:
+            scale = max_side / float(max(height, width))
+            image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+        if fmt == 'webp':
+            params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        else:
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        ok, encoded = cv2.imencode(DERIVATIVE_FORMATS[fmt], image, params)
+        return encoded.tobytes() if ok else None
+
+    def generate_derivatives(self, path):
+        """ArtifactWriter 寫入完成後的 listener：預先產生常用的衍生圖"""
+        filename = os.path.basename(path)
+        if DERIVED_DIR in path.split(os.sep) or mimetypes.guess_type(filename)[0] is None:
+            return
+        for size in self.eager_sizes:
+            try:
+                self.get_derivative(filename, size, 'webp')
+            except Exception:
+                # 衍生圖可在請求時重新產生，失敗不影響原始檔案
+                pass
+
+    def iter_hot_files(self):
+        """列出熱儲存中的所有檔案（不含衍生圖）"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and DERIVED_DIR in dirnames:
+                dirnames.remove(DERIVED_DIR)
+            for filename in filenames:
+                if _is_safe_filename(filename) and not filename.endswith('.tmp'):
+                    yield os.path.join(dirpath, filename)
+
+    def archive_originals(self, older_than_days, keep_sizes=('thumb',)):
+        """
+        將超過保留天數的原始圖片移到冷儲存（未壓縮的格式以 gzip 壓縮）
+
+        標註圖保留在熱儲存；移動前先產生縮圖，列表頁面不需要讀取冷儲存。
+
+        Returns:
+            dict: 移動的檔案數與釋放的位元組數
+        """
+        cutoff = time.time() - older_than_days * 86400
+        moved = 0
+        freed = 0
+        for path in list(self.iter_hot_files()):
+            filename = os.path.basename(path)
+            if '_detected' in os.path.splitext(filename)[0] or mimetypes.guess_type(filename)[0] is None:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime >= cutoff:
+                continue
+
+            for size in keep_sizes:
+                try:
+                    self.get_derivative(filename, size, 'webp')
+                except Exception:
+                    pass
+
+            cold_path = self.cold_path_for(filename)
+            os.makedirs(os.path.dirname(cold_path), exist_ok=True)
+            tmp_path = f"{cold_path}.tmp"
+            if cold_path.endswith('.gz'):
+                with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, cold_path)
+            # 保留原始修改時間，ETag / Last-Modified 不因搬移而改變
+            os.utime(cold_path, (stat.st_atime, stat.st_mtime))
+            os.remove(path)
+            moved += 1
+            freed += stat.st_size
+
+        return {'moved': moved, 'freed_bytes': freed}
+
+
+_src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 全域上傳儲存
+upload_storage = UploadStorage(
+    os.getenv('UPLOAD_ROOT') or os.path.join(_src_dir, 'static', 'uploads'),
+    os.getenv('COLD_STORAGE_ROOT') or os.path.join(_src_dir, 'cold_storage'),
+    quality=int(os.getenv('DERIVATIVE_QUALITY', 80))
+)
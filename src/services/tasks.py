@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.models.task import BackgroundTask, db
+
+
+class Task:
+    """背景任務的狀態與進度"""
+
+    PENDING = BackgroundTask.PENDING
+    RUNNING = BackgroundTask.RUNNING
+    DONE = BackgroundTask.DONE
+    FAILED = BackgroundTask.FAILED
+
+    def __init__(self, kind, params=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params or {}
+        self.status = self.PENDING
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def increment(self, key, amount=1):
+        with self._lock:
+            self.progress[key] = self.progress.get(key, 0) + amount
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'task_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'params': self.params,
+                'progress': dict(self.progress),
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at
+            }
+
+    def row_values(self):
+        """寫入 background_tasks 的欄位"""
+        with self._lock:
+            return {
+                'status': self.status,
+                'progress': json.dumps(self.progress, ensure_ascii=False),
+                'result': json.dumps(self.result, ensure_ascii=False, default=str) if self.result is not None else None,
+                'error': self.error,
+                'finished_at': self.finished_at,
+                'updated_at': time.time()
+            }
+
+
+class TaskRegistry:
+    """
+    長時間背景任務（影片、批次上傳）的執行池與進度查詢
+
+    任務狀態寫入 background_tasks 資料表，pre-fork 時由任何 worker 都能查詢；
+    狀態變更立即寫入，進度每 flush_interval 秒寫入一次，同時作為執行中任務的心跳。
+    心跳超過 stale_after 秒未更新的任務（所屬行程已停止）標記為失敗。
+    本行程的任務另外保留在記憶體中，查詢時直接回傳最新進度。
+    """
+
+    def __init__(self, app, workers=2, max_finished=200, flush_interval=2.0, stale_after=60.0,
+                 retention_seconds=7 * 86400):
+        self.app = app
+        self.workers = workers
+        self.max_finished = max_finished
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='background-task')
+        self._lock = threading.Lock()
+        self._tasks = OrderedDict()
+        self._flusher_pid = None
+
+    def submit(self, kind, fn, params=None):
+        """
+        排入背景任務
+
+        Args:
+            fn (callable): fn(task) 在應用程式 context 中執行，回傳值存為任務結果
+        """
+        task = Task(kind, params)
+        with self.app.app_context():
+            self._insert(task)
+        with self._lock:
+            self._tasks[task.id] = task
+            self._prune()
+        self._ensure_flusher()
+        self._executor.submit(self._run, task, fn)
+        return task
+
+    def _run(self, task, fn):
+        task.status = Task.RUNNING
+        with self.app.app_context():
+            self._save(task)
+            try:
+                task.result = fn(task)
+                task.status = Task.DONE
+            except Exception as e:
+                task.error = str(e)
+                task.status = Task.FAILED
+            finally:
+                task.finished_at = time.time()
+                self._save(task)
+
+    def _prune(self):
+        finished = [t.id for t in self._tasks.values() if t.is_finished]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._tasks[task_id]
+
+    def get(self, task_id):
+        """本行程的任務回傳記憶體中的 Task，其他 worker 的任務由資料表讀取"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is not None:
+            return task
+        return db.session.get(BackgroundTask, task_id)
+
+    # ---- 持久化 ----
+
+    def _insert(self, task):
+        now = time.time()
+        with db.engine.begin() as connection:
+            connection.execute(BackgroundTask.__table__.insert().values(
+                id=task.id,
+                kind=task.kind,
+                status=task.status,
+                params=json.dumps(task.params, ensure_ascii=False),
+                progress=json.dumps(task.progress),
+                created_at=task.created_at,
+                updated_at=now
+            ))
+
+    def _save(self, task, heartbeat=False):
+        table = BackgroundTask.__table__
+        statement = table.update().where(table.c.id == task.id)
+        if heartbeat:
+            # 心跳與任務結束同時寫入時，不可蓋掉已完成的狀態
+            statement = statement.where(table.c.status.in_((Task.PENDING, Task.RUNNING)))
+        with db.engine.begin() as connection:
+            connection.execute(statement.values(**task.row_values()))
+
+    def _ensure_flusher(self):
+        # fork 後的子行程重新啟動
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name='task-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self._flush()
+                    self._expire_stale()
+            except Exception as e:
+                print(f"背景任務狀態寫入失敗: {e}")
+
+    def _flush(self):
+        # 執行中的任務即使進度沒有變化也更新 updated_at，作為心跳
+        with self._lock:
+            tasks = [task for task in self._tasks.values() if not task.is_finished]
+        for task in tasks:
+            self._save(task, heartbeat=True)
+
+    def _expire_stale(self):
+        table = BackgroundTask.__table__
+        now = time.time()
+        with db.engine.begin() as connection:
+            connection.execute(
+                table.update()
+                .where(table.c.status.in_((Task.PENDING, Task.RUNNING)), table.c.updated_at < now - self.stale_after)
+                .values(status=Task.FAILED, error='執行任務的行程已停止', finished_at=now, updated_at=now)
+            )
+            connection.execute(
+                table.delete().where(table.c.finished_at < now - self.retention_seconds)
+            )
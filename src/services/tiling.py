@@ -0,0 +1,135 @@
+import numpy as np
+
+from src.services.backends.ops import merge_overlapping
+from src.services.image_pipeline import UploadedImage
+
+
+def tile_windows(width, height, tile_size, overlap):
+    """
+    以重疊的正方形切片覆蓋整張影像
+
+    最後一列/行的切片貼齊影像邊緣，不會超出範圍也不需要填充。
+
+    Returns:
+        ndarray: (切片數, 4) 的 xyxy 視窗座標
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return np.zeros(1, dtype=np.int64)
+        positions = np.arange(0, length - tile_size, stride)
+        return np.append(positions, length - tile_size)
+
+    xs = starts(width)
+    ys = starts(height)
+    x0, y0 = np.meshgrid(xs, ys)
+    x0 = x0.ravel()
+    y0 = y0.ravel()
+    return np.stack([
+        x0, y0, np.minimum(x0 + tile_size, width), np.minimum(y0 + tile_size, height)
+    ], axis=1)
+
+
+def to_arrays(predictions):
+    """Hugging Face 格式的預測列表轉為 (xyxy 框, 分數, 標籤) 陣列"""
+    boxes = np.array([
+        [p['box']['xmin'], p['box']['ymin'], p['box']['xmax'], p['box']['ymax']] for p in predictions
+    ], dtype=np.float32).reshape(-1, 4)
+    scores = np.array([p.get('score', 0.0) for p in predictions], dtype=np.float32)
+    labels = np.array([p.get('label', 'unknown') for p in predictions], dtype=object)
+    return boxes, scores, labels
+
+
+class SlicedInference:
+    """
+    高解析度影像的切片推論
+
+    將影像切成重疊的切片（可另外加上整張影像），整批送進推論後端，
+    各切片的框平移回原圖座標後，以 NMS 的順序把重複的框合併為聯集。
+    推論量與切片數成正比，每個切片都以模型原本的輸入尺寸推論。
+    """
+
+    def __init__(self, tile_size=640, overlap=0.2, hybrid=True, iou_threshold=0.5,
+                 match_metric='ios', encode_tiles=True):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        # 同時推論整張影像，近距離的大型目標不會被切片截斷
+        self.hybrid = hybrid
+        self.iou_threshold = iou_threshold
+        self.match_metric = match_metric
+        # 遠端 API 需要 JPEG；本地後端直接使用切片陣列
+        self.encode_tiles = encode_tiles
+
+    def identity(self):
+        return f"tiles:{self.tile_size}/{self.overlap}/{int(self.hybrid)}"
+
+    def applies_to(self, image):
+        height, width = image.array.shape[:2]
+        return max(height, width) > self.tile_size
+
+    def split(self, image):
+        """
+        切出推論用的影像列表
+
+        Returns:
+            tuple: ([UploadedImage, ...], 各影像在原圖的 (x, y) 位移)
+        """
+        array = image.array
+        height, width = array.shape[:2]
+        windows = tile_windows(width, height, self.tile_size, self.overlap)
+
+        stem = image.filename.rsplit('.', 1)[0]
+        tiles = [
+            UploadedImage.from_array(array[y0:y1, x0:x1], f"{stem}_tile{i}.jpg", encode=self.encode_tiles)
+            for i, (x0, y0, x1, y1) in enumerate(windows)
+        ]
+        offsets = windows[:, :2]
+        if self.hybrid:
+            tiles.append(image)
+            offsets = np.vstack([offsets, np.zeros((1, 2), dtype=offsets.dtype)])
+        return tiles, offsets
+
+    def merge(self, results, offsets):
+        """
+        合併各切片的預測
+
+        Args:
+            results (list): 每個切片的預測列表，失敗的項目為例外物件
+            offsets (ndarray): split 回傳的位移
+
+        Returns:
+            list: 原圖座標的 Hugging Face 格式預測列表
+        Raises:
+            Exception: 任一切片失敗時拋出第一個例外
+        """
+        # 失敗切片中的熊無從得知，略過後的「沒有熊」會被快取並作為重複影格沿用，因此整張影像視為失敗
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            raise failures[0]
+
+        parts = [
+            (to_arrays(predictions), offset)
+            for predictions, offset in zip(results, offsets)
+            if not isinstance(predictions, BaseException) and predictions
+        ]
+        if not parts:
+            return []
+
+        boxes = np.concatenate([b + np.tile(offset, 2).astype(np.float32) for (b, _, _), offset in parts])
+        scores = np.concatenate([s for (_, s, _), _ in parts])
+        labels = np.concatenate([l for (_, _, l), _ in parts])
+
+        _, class_ids = np.unique(labels, return_inverse=True)
+        merged, keep = merge_overlapping(boxes, scores, class_ids, self.iou_threshold, self.match_metric)
+        return [
+            {
+                'box': {
+                    'xmin': float(box[0]), 'ymin': float(box[1]),
+                    'xmax': float(box[2]), 'ymax': float(box[3])
+                },
+                'score': float(scores[i]),
+                'label': labels[i]
+            }
+            for box, i in zip(merged, keep)
+        ]
@@ -0,0 +1,229 @@
+import uuid
+from datetime import datetime, timedelta
+
+from src.services.detection_pipeline import save_detection
+from src.services.image_pipeline import UploadedImage, artifact_writer
+from src.services.storage import sharded_path
+
+
+class AdaptiveSampler:
+    """
+    自適應取樣間隔
+
+    靜態畫面以 idle_interval 秒取樣一次；偵測到動態或事件進行中時
+    縮短為 active_interval 秒。
+    """
+
+    def __init__(self, idle_interval=1.0, active_interval=0.25):
+        self.idle_interval = idle_interval
+        self.active_interval = active_interval
+        self.active = False
+
+    @property
+    def interval(self):
+        return self.active_interval if self.active else self.idle_interval
+
+
+class MotionGate:
+    """以縮小灰階影格的差異比例判斷畫面是否有動態"""
+
+    def __init__(self, threshold=0.01, pixel_delta=25, width=160):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.width = width
+        self._previous = None
+
+    def __call__(self, frame):
+        """回傳 (是否有動態, 變化像素比例)"""
+        import cv2
+        import numpy as np
+
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        previous, self._previous = self._previous, gray
+        if previous is None:
+            return True, 1.0
+
+        diff = cv2.absdiff(gray, previous)
+        score = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+        return score >= self.threshold, score
+
+
+def iter_frames(capture, sampler, max_seconds=None):
+    """
+    逐一產生取樣後的影格 (秒數, 影格)
+
+    未取樣的影格只 grab 不解碼；同一時間只保留一張影格，記憶體用量固定。
+    """
+    import cv2
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    index = 0
+    next_sample_at = 0.0
+    while True:
+        if not capture.grab():
+            break
+        timestamp = index / fps
+        index += 1
+        if max_seconds is not None and timestamp > max_seconds:
+            break
+        if timestamp < next_sample_at:
+            continue
+
+        ok, frame = capture.retrieve()
+        if not ok:
+            break
+        next_sample_at = timestamp + sampler.interval
+        yield timestamp, frame
+
+
+class EventAggregator:
+    """
+    將連續出現熊的影格合併為事件
+
+    間隔超過 gap_seconds 沒有再看到熊時結束事件；每個事件只保留信心度最高的影格。
+    """
+
+    def __init__(self, gap_seconds=10.0):
+        self.gap_seconds = gap_seconds
+        self.current = None
+
+    @property
+    def is_open(self):
+        return self.current is not None
+
+    def tick(self, timestamp):
+        """推進時間；事件逾時則結束並回傳"""
+        if self.current is not None and timestamp - self.current['end'] > self.gap_seconds:
+            return self.flush()
+        return None
+
+    def add(self, timestamp, result, image):
+        """加入一張已推論的影格，回傳因此結束的事件（若有）"""
+        closed = self.tick(timestamp)
+        if not result.get('bear_detected'):
+            return closed
+
+        confidence = result.get('confidence', 0.0)
+        if self.current is None:
+            self.current = {
+                'start': timestamp,
+                'end': timestamp,
+                'frames': 0,
+                'peak_confidence': -1.0
+            }
+        event = self.current
+        event['end'] = timestamp
+        event['frames'] += 1
+        if confidence > event['peak_confidence']:
+            event['peak_confidence'] = confidence
+            event['peak_time'] = timestamp
+            event['peak_image'] = image
+            event['peak_detections'] = result.get('detections', [])
+        return closed
+
+    def flush(self):
+        event, self.current = self.current, None
+        return event
+
+
+def process_video(task, detector, source, camera_id, location, upload_folder, started_at=None,
+                  sample_fps=1.0, active_fps=4.0, motion_threshold=0.01, keyframe_seconds=30.0,
+                  event_gap_seconds=10.0, max_seconds=None, tracker=None):
+    """
+    檢測影片或串流，每個熊出沒事件寫入一筆檢測記錄
+
+    Args:
+        task (Task): 用於回報進度的背景任務
+        source (str): 影片檔路徑或串流 URL
+        started_at (datetime): 影片第 0 秒對應的時間，預設為現在
+        tracker (EventTracker): 指定時寫入的檢測記錄併入該相機的熊出沒事件（/api/events）
+
+    Returns:
+        dict: 處理統計與事件列表
+    """
+    import cv2
+
+    started_at = started_at or datetime.utcnow()
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"無法開啟影片來源: {source}")
+
+    sampler = AdaptiveSampler(1.0 / sample_fps, 1.0 / active_fps)
+    gate = MotionGate(threshold=motion_threshold)
+    aggregator = EventAggregator(event_gap_seconds)
+    prefix = uuid.uuid4().hex
+    events = []
+    last_inference_at = None
+
+    def emit(event):
+        # 只保存事件中信心度最高的影格與其標註圖
+        image = event['peak_image']
+        artifact_writer.write(sharded_path(upload_folder, image.filename), image.data)
+        result_image_filename = detector.annotate(image, event['peak_detections'], upload_folder)
+        detection = save_detection(dict(
+            camera_id=camera_id,
+            location=location,
+            bear_detected=True,
+            confidence=event['peak_confidence'],
+            detected_at=started_at + timedelta(seconds=event['start']),
+            image_filename=image.filename,
+            result_image_filename=result_image_filename
+        ))
+        event_id = None
+        if tracker is not None:
+            event_id = tracker.observe(camera_id, location, None, None, detection,
+                                       {'detections': event['peak_detections']})
+        events.append({
+            'detection_id': detection.id,
+            'event_id': event_id,
+            'start_seconds': round(event['start'], 2),
+            'end_seconds': round(event['end'], 2),
+            'peak_seconds': round(event['peak_time'], 2),
+            'peak_confidence': event['peak_confidence'],
+            'frames': event['frames']
+        })
+        task.update(events=len(events))
+
+    try:
+        for timestamp, frame in iter_frames(capture, sampler, max_seconds):
+            task.increment('frames_sampled')
+            task.update(position_seconds=round(timestamp, 2))
+
+            moving, _ = gate(frame)
+            keyframe_due = last_inference_at is None or timestamp - last_inference_at >= keyframe_seconds
+            # 有動態時提高取樣頻率；事件進行中即使畫面靜止也以基本頻率持續推論
+            sampler.active = moving
+            if not moving and not keyframe_due and not aggregator.is_open:
+                task.increment('frames_skipped')
+                closed = aggregator.tick(timestamp)
+                if closed:
+                    emit(closed)
+                continue
+
+            image = UploadedImage.from_array(frame, f"{prefix}_{timestamp:08.2f}.jpg")
+            result = detector.detect_bear(image, upload_folder, annotate=False)
+            last_inference_at = timestamp
+            task.increment('inference_calls')
+            if not result.get('success', True):
+                task.increment('inference_errors')
+
+            closed = aggregator.add(timestamp, result, image)
+            if closed:
+                emit(closed)
+
+        closed = aggregator.flush()
+        if closed:
+            emit(closed)
+    finally:
+        capture.release()
+
+    progress = task.to_dict()['progress']
+    return {
+        'frames_sampled': progress.get('frames_sampled', 0),
+        'frames_skipped': progress.get('frames_skipped', 0),
+        'inference_calls': progress.get('inference_calls', 0),
+        'events': events
+    }
@@ -0,0 +1,29 @@
+# 生產環境 WSGI 入口，搭配 gunicorn.conf.py 以 pre-fork 模式啟動：
+#   gunicorn -c gunicorn.conf.py src.wsgi:app
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import app, startup_report  # noqa: E402
+from src.models.user import db  # noqa: E402
+import src.routes.detection as detection_routes  # noqa: E402
+from src.services.metrics import registry  # noqa: E402
+
+
+def init_worker():
+    """在每個 worker 子行程 fork 之後呼叫"""
+    # 父行程的資料庫連線不可在子行程沿用
+    with app.app_context():
+        db.engine.dispose()
+
+    detection_routes.model_registry.after_fork()
+    registry.after_fork()
+
+    job_pool = app.extensions.get('detection_jobs')
+    if job_pool is not None:
+        job_pool.ensure_started()
+
+
+__all__ = ['app', 'init_worker', 'startup_report']
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from src.services.admission import AdmissionController, AdmissionRejected, TokenBucket, _Waiter
+
+
+def test_token_bucket_allows_the_burst_then_refills_at_the_rate():
+    bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 權杖用完後需等待 1 / rate 秒
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.5) == 0.0
+
+
+def test_token_bucket_never_accumulates_more_than_the_burst():
+    bucket = TokenBucket(rate=10.0, burst=2, now=0.0)
+    bucket.take(0.0)
+    assert [bucket.take(100.0) for _ in range(3)] == [0.0, 0.0, pytest.approx(0.1)]
+
+
+def test_rate_limit_is_per_camera():
+    admission = AdmissionController(camera_rate=1.0, camera_burst=1)
+    admission.check_rate('cam1', 'normal')
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.check_rate('cam1', 'normal')
+    assert rejected.value.reason == 'rate_limited'
+    admission.check_rate('cam2', 'normal')
+
+
+def waiter(lane, bounded=True):
+    return _Waiter(lane, bounded, lambda: None)
+
+
+def test_freed_slot_goes_to_the_highest_priority_lane_first():
+    admission = AdmissionController(max_concurrent=1, queue_size=8)
+    running = waiter('normal')
+    bulk, normal, critical = waiter('bulk', bounded=False), waiter('normal'), waiter('critical')
+    with admission._lock:
+        for w in (running, bulk, normal, critical):
+            admission._enter(w)
+    assert running.granted and not (bulk.granted or normal.granted or critical.granted)
+
+    admission._release(0.1)
+    assert critical.granted and not normal.granted
+    admission._release(0.1)
+    assert normal.granted and not bulk.granted
+    admission._release(0.1)
+    assert bulk.granted
+
+
+def test_full_queue_sheds_the_latest_lowest_priority_waiter():
+    admission = AdmissionController(max_concurrent=1, queue_size=2)
+    running, first, second = waiter('normal'), waiter('normal'), waiter('normal')
+    with admission._lock:
+        for w in (running, first, second):
+            admission._enter(w)
+
+        # 同優先順序的請求不能擠掉等候者
+        late = waiter('normal')
+        admission._enter(late)
+        assert late.rejected == 'queue_full'
+
+        critical = waiter('critical')
+        admission._enter(critical)
+    assert second.rejected == 'preempted'
+    assert first.rejected is None and critical.rejected is None
+
+
+def test_unbounded_bulk_waiters_do_not_use_queue_slots():
+    admission = AdmissionController(max_concurrent=1, queue_size=1)
+    with admission._lock:
+        admission._enter(waiter('normal'))
+        for _ in range(5):
+            admission._enter(waiter('bulk', bounded=False))
+        normal = waiter('normal')
+        admission._enter(normal)
+    assert normal.rejected is None
+
+
+def test_queued_request_times_out():
+    admission = AdmissionController(max_concurrent=1, queue_size=4, max_wait=0.05)
+    with admission.slot():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.slot():
+                pass
+    assert rejected.value.reason == 'queue_timeout'
+
+
+def test_slot_is_handed_to_a_waiting_thread():
+    admission = AdmissionController(max_concurrent=1, queue_size=4, max_wait=5)
+    admitted = threading.Event()
+
+    def second_request():
+        with admission.slot():
+            admitted.set()
+
+    with admission.slot():
+        thread = threading.Thread(target=second_request)
+        thread.start()
+        assert not admitted.wait(0.05)
+    assert admitted.wait(2)
+    thread.join()
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_limits_are_split_across_prefork_workers():
+    admission = AdmissionController(max_concurrent=16, queue_size=64, camera_rate=5.0, camera_burst=20, workers=4)
+    stats = admission.stats()
+    assert (stats['max_concurrent'], stats['queue_size'], stats['camera_burst']) == (4, 16, 5)
+    assert stats['camera_rate'] == pytest.approx(1.25)
@@ -0,0 +1,68 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+from src.services.batching import MicroBatcher, _PendingItem
+
+
+def echo_batch(payloads):
+    return [payload * 2 for payload in payloads]
+
+
+def test_requests_are_dispatched_together():
+    sizes = []
+
+    def batch_fn(payloads):
+        sizes.append(len(payloads))
+        return echo_batch(payloads)
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=200, name='test_dispatch')
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [future.result(timeout=2) for future in futures] == [0, 2, 4, 6]
+    assert sizes == [4]
+    batcher.close()
+
+
+def test_submit_after_close_restarts_the_dispatcher():
+    batcher = MicroBatcher(echo_batch, max_wait_ms=1, name='test_restart')
+    assert batcher.submit(1).result(timeout=2) == 2
+    batcher.close()
+    batcher._thread.join(timeout=2)
+    assert batcher.submit(2).result(timeout=2) == 4
+    batcher.close()
+
+
+def test_requests_left_in_a_replaced_queue_are_failed():
+    batcher = MicroBatcher(echo_batch, max_wait_ms=1, name='test_replaced')
+    batcher.submit(1).result(timeout=2)
+    thread = batcher._thread
+    batcher.close()
+    thread.join(timeout=2)
+
+    # 模擬與 close() 競爭、在分派執行緒結束後才放進舊佇列的請求
+    stranded = _PendingItem(3)
+    batcher._queue.put(stranded)
+    assert batcher.submit(4).result(timeout=2) == 8
+    with pytest.raises(RuntimeError):
+        stranded.future.result(timeout=2)
+    batcher.close()
+
+
+def test_every_future_resolves_when_submit_races_with_close():
+    batcher = MicroBatcher(echo_batch, max_wait_ms=1, name='test_race')
+    futures = []
+
+    def submitter():
+        for i in range(200):
+            futures.append(batcher.submit(i))
+
+    thread = threading.Thread(target=submitter)
+    thread.start()
+    for _ in range(50):
+        batcher.close()
+    thread.join()
+    futures.append(batcher.submit(0))
+
+    _, not_done = wait(futures, timeout=5)
+    assert not not_done
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from src.models.detection import Detection, db
+from src.services import rollups
+from src.services.db_writer import DetectionWriter
+
+
+class RecordingWriter(DetectionWriter):
+    """記錄每次 commit 的批次大小"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commits = []
+
+    def _commit(self, batch):
+        super()._commit(batch)
+        self.commits.append(len(batch))
+
+
+def fields(camera_id='cam1', bear_detected=False):
+    return dict(camera_id=camera_id, location='trail', bear_detected=bear_detected,
+                confidence=0.5, detected_at=datetime(2025, 3, 1, 12))
+
+
+def test_flushes_when_the_batch_is_full(app):
+    # flush 間隔很長，只有湊滿 batch_size 才會立即 commit
+    writer = RecordingWriter(app, batch_size=4, flush_ms=10000)
+    started = time.monotonic()
+    futures = [writer.submit(fields()) for _ in range(4)]
+    detections = [future.result(timeout=5) for future in futures]
+
+    assert time.monotonic() - started < 5
+    assert writer.commits == [4]
+    assert len({detection.id for detection in detections}) == 4
+
+
+def test_flushes_a_partial_batch_after_the_interval(app):
+    writer = RecordingWriter(app, batch_size=100, flush_ms=50)
+    futures = [writer.submit(fields(bear_detected=i == 0)) for i in range(3)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert writer.commits == [3]
+    db.session.expire_all()
+    assert Detection.query.count() == 3
+    # 彙總與記錄在同一個交易中寫入
+    assert rollups.get_totals() == (3, 1)
+
+
+def test_a_bad_record_fails_alone(app):
+    writer = RecordingWriter(app, batch_size=3, flush_ms=10000)
+    good = [writer.submit(fields()) for _ in range(2)]
+    bad = writer.submit(fields(camera_id=None))
+
+    assert all(future.result(timeout=5).id for future in good)
+    with pytest.raises(Exception):
+        bad.result(timeout=5)
+    db.session.expire_all()
+    assert Detection.query.count() == 2
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.detection import Detection, db
+from src.services.detection_queries import decode_cursor, encode_cursor, query_detections
+
+
+def test_cursor_round_trip():
+    detected_at = datetime(2025, 3, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(detected_at, 42)) == (detected_at, 42)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', '', '!!!'])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once_with_tied_timestamps(app):
+    # 多筆記錄的 detected_at 相同時以 id 決定順序，分頁邊界落在同一時間內也不會重複或遺漏
+    same_time = datetime(2025, 3, 1, 12, 0, 0)
+    for i in range(23):
+        detected_at = same_time if i % 3 else same_time - timedelta(minutes=i)
+        db.session.add(Detection(camera_id='cam1', location='trail', bear_detected=False, detected_at=detected_at))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = query_detections(cursor=cursor, limit=5)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 23
+    assert len({row['id'] for row in seen}) == 23
+    keys = [(row['detected_at'], row['id']) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_last_page_has_no_cursor(app):
+    for _ in range(5):
+        db.session.add(Detection(camera_id='cam1', location='trail', bear_detected=True))
+    db.session.commit()
+
+    page, cursor = query_detections(limit=5)
+    assert len(page) == 5
+    assert cursor is None
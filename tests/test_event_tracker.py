@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from src.models.detection import Detection, DetectionEvent, db
+from src.services.event_tracker import EventTracker, FrameRecord, frame_hash, hamming_distances
+
+IDENTITY = ('model-v1', 0.5)
+
+
+def scene(bear=False):
+    """靜態畫面；bear=True 時在角落加入一隻很小的熊"""
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (31, 31), 0)
+    if bear:
+        cv2.ellipse(image, (600, 440), (12, 8), 0, 0, 360, (20, 20, 20), -1)
+    ok, encoded = cv2.imencode('.jpg', image)
+    return encoded.tobytes()
+
+
+def remember(tracker, camera_id, hash_value, seen_at, bear_detected):
+    tracker._camera(camera_id).frames.append(
+        FrameRecord(seen_at, hash_value, IDENTITY, 1, bear_detected, [])
+    )
+
+
+def test_small_bear_is_a_near_duplicate_of_the_empty_scene():
+    empty, with_bear = frame_hash(scene()), frame_hash(scene(bear=True))
+    assert hamming_distances(with_bear, [empty])[0] <= EventTracker().max_distance
+
+
+def test_cached_no_bear_verdict_expires_before_the_window():
+    tracker = EventTracker(window_seconds=60, negative_window_seconds=5)
+    remember(tracker, 'cam1', frame_hash(scene()), seen_at=0.0, bear_detected=False)
+    with_bear = frame_hash(scene(bear=True))
+
+    assert tracker.find_duplicate('cam1', with_bear, IDENTITY, now=3.0) is not None
+    # 超過 negative_window_seconds 後一定重新推論，小型熊不會一直被「沒有熊」的結果蓋掉
+    assert tracker.find_duplicate('cam1', with_bear, IDENTITY, now=6.0) is None
+
+
+def test_cached_bear_verdict_is_reused_for_the_whole_window():
+    tracker = EventTracker(window_seconds=60, negative_window_seconds=5)
+    remember(tracker, 'cam1', frame_hash(scene(bear=True)), seen_at=0.0, bear_detected=True)
+
+    assert tracker.find_duplicate('cam1', frame_hash(scene(bear=True)), IDENTITY, now=30.0) is not None
+
+
+def test_zero_negative_window_only_reuses_bear_verdicts():
+    tracker = EventTracker(negative_window_seconds=0)
+    remember(tracker, 'cam1', frame_hash(scene()), seen_at=0.0, bear_detected=False)
+
+    assert tracker.find_duplicate('cam1', frame_hash(scene(bear=True)), IDENTITY, now=0.5) is None
+
+
+def save_bear(camera_id, detected_at, confidence=0.9):
+    detection = Detection(camera_id=camera_id, location='trail', bear_detected=True,
+                          confidence=confidence, detected_at=detected_at)
+    db.session.add(detection)
+    db.session.commit()
+    return detection
+
+
+def test_video_events_are_merged_by_clip_time(app):
+    # 整段影片在幾秒內處理完，事件間隔必須以影片中的時間判斷
+    tracker = EventTracker(gap_seconds=120)
+    clip_start = datetime(2025, 1, 1, 6, 0, 0)
+    first = tracker.observe('cam1', 'trail', None, None,
+                            save_bear('cam1', clip_start + timedelta(minutes=5)), {'detections': []})
+    nearby = tracker.observe('cam1', 'trail', None, None,
+                             save_bear('cam1', clip_start + timedelta(minutes=6)), {'detections': []})
+    later = tracker.observe('cam1', 'trail', None, None,
+                            save_bear('cam1', clip_start + timedelta(minutes=50)), {'detections': []})
+
+    assert first == nearby
+    assert later != first
+    event = db.session.get(DetectionEvent, first)
+    assert event.detection_count == 2
+    assert event.ended_at == clip_start + timedelta(minutes=6)
+    assert db.session.get(DetectionEvent, later).detection_count == 1
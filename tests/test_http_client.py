@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+from src.services.async_http import AsyncResilientClient
+from src.services.http_client import CircuitBreaker, ResilientClient
+
+
+def open_breaker(breaker):
+    """讓熔斷器開啟；reset_timeout=0 時下一次檢查即進入 half_open"""
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_half_open_probe_records_unexpected_exception():
+    client = ResilientClient(max_retries=0, failure_threshold=1, reset_timeout=0.0)
+    open_breaker(client.breaker)
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+
+    def broken_post(url, **kwargs):
+        raise requests.exceptions.InvalidURL(url)
+
+    client.session.post = broken_post
+    with pytest.raises(requests.exceptions.InvalidURL):
+        client.post('http://upstream/')
+
+    # 探測失敗後重新開啟，逾時後可以再放行一個探測
+    assert client.breaker.allow_request()
+
+
+def async_client(handler, breaker):
+    client = AsyncResilientClient(max_retries=0, breaker=breaker)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client._semaphore = asyncio.Semaphore(client.max_in_flight)
+    return client
+
+
+def test_async_half_open_probe_records_non_transport_error():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    open_breaker(breaker)
+
+    def handler(request):
+        raise httpx.DecodingError('bad response')
+
+    async def run():
+        client = async_client(handler, breaker)
+        with pytest.raises(httpx.DecodingError):
+            await client.post('http://upstream/')
+        await client.close()
+
+    asyncio.run(run())
+    assert breaker.allow_request()
+
+
+def test_async_cancelled_probe_releases_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    open_breaker(breaker)
+
+    async def handler(request):
+        await asyncio.sleep(10)
+
+    async def run():
+        client = async_client(handler, breaker)
+        probe = asyncio.create_task(client.post('http://upstream/'))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        await client.close()
+
+    asyncio.run(run())
+    # 取消不計為上游失敗，熔斷器仍在 half_open 並可放行下一個探測
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
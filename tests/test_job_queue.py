@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from src.models.job import DetectionJob, db
+from src.services.database import ensure_columns
+from src.services.job_queue import JobWorkerPool
+
+
+def make_pool(app, **options):
+    return JobWorkerPool(app, detector_lease=None, stale_after=300, **options)
+
+
+def add_running_job(job_id, started_ago, heartbeat_ago, attempts=1):
+    now = datetime.utcnow()
+    db.session.add(DetectionJob(
+        id=job_id, status=DetectionJob.RUNNING, camera_id='cam1', location='trail',
+        image_filename=f'{job_id}.jpg', attempts=attempts,
+        started_at=now - timedelta(seconds=started_ago),
+        heartbeat_at=now - timedelta(seconds=heartbeat_ago) if heartbeat_ago is not None else None
+    ))
+    db.session.commit()
+
+
+def status(job_id):
+    db.session.expire_all()
+    return db.session.get(DetectionJob, job_id).status
+
+
+def test_slow_job_with_live_heartbeat_is_not_requeued(app):
+    add_running_job('slow', started_ago=3600, heartbeat_ago=5)
+    make_pool(app)._requeue_stale_jobs()
+    assert status('slow') == DetectionJob.RUNNING
+
+
+def test_job_without_heartbeat_is_requeued(app):
+    add_running_job('orphan', started_ago=3600, heartbeat_ago=600)
+    add_running_job('legacy', started_ago=3600, heartbeat_ago=None)
+    make_pool(app)._requeue_stale_jobs()
+    assert status('orphan') == DetectionJob.PENDING
+    assert status('legacy') == DetectionJob.PENDING
+
+
+def test_job_that_keeps_killing_its_worker_fails_after_max_attempts(app):
+    add_running_job('poison', started_ago=3600, heartbeat_ago=600, attempts=3)
+    make_pool(app, max_attempts=3)._requeue_stale_jobs()
+    job = db.session.get(DetectionJob, 'poison')
+    assert job.status == DetectionJob.FAILED
+    assert job.finished_at is not None
+
+
+def test_heartbeat_is_updated_while_the_job_runs(app):
+    @contextmanager
+    def slow_lease():
+        time.sleep(0.3)
+        raise RuntimeError('模型無法使用')
+        yield
+
+    pool = JobWorkerPool(app, slow_lease, stale_after=300, heartbeat_interval=0.05)
+    add_running_job('busy', started_ago=0, heartbeat_ago=0)
+    job = db.session.get(DetectionJob, 'busy')
+    claimed_heartbeat = job.heartbeat_at
+
+    pool._process(job)
+
+    db.session.expire_all()
+    job = db.session.get(DetectionJob, 'busy')
+    assert job.status == DetectionJob.FAILED
+    assert job.heartbeat_at > claimed_heartbeat
+
+
+def test_ensure_columns_adds_new_columns_to_an_existing_table(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text('CREATE TABLE detection_jobs (id VARCHAR(36) PRIMARY KEY)'))
+
+    ensure_columns(engine, DetectionJob.__table__)
+
+    columns = {column['name'] for column in sqlalchemy.inspect(engine).get_columns('detection_jobs')}
+    assert 'heartbeat_at' in columns
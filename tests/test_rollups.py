@@ -0,0 +1,63 @@
+import random
+from datetime import datetime, timedelta
+
+from src.models.detection import Detection, db
+from src.services import rollups
+
+
+def add_detections(count=200, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 3, 1)
+    detections = [
+        Detection(
+            camera_id=rng.choice(['cam1', 'cam2', 'cam3']),
+            location=rng.choice(['trail', 'village']),
+            bear_detected=rng.random() < 0.3,
+            confidence=rng.random(),
+            detected_at=start + timedelta(minutes=rng.randrange(3 * 24 * 60))
+        )
+        for _ in range(count)
+    ]
+    # 分成多個交易寫入，彙總在每次 commit 時累加
+    for i in range(0, count, 50):
+        batch = detections[i:i + 50]
+        db.session.add_all(batch)
+        rollups.record_detections(batch)
+        db.session.commit()
+    return detections
+
+
+def raw_counts(query):
+    return query.count(), query.filter(Detection.bear_detected.is_(True)).count()
+
+
+def test_totals_match_raw_rows(app):
+    add_detections()
+    assert rollups.get_totals() == raw_counts(Detection.query)
+    for camera_id in ('cam1', 'cam2', 'cam3'):
+        assert rollups.get_totals('camera', camera_id) == raw_counts(Detection.query.filter_by(camera_id=camera_id))
+    for location in ('trail', 'village'):
+        assert rollups.get_totals('location', location) == raw_counts(Detection.query.filter_by(location=location))
+
+
+def test_series_matches_raw_rows_and_excludes_end(app):
+    add_detections()
+    start, end = datetime(2025, 3, 1, 6), datetime(2025, 3, 2, 18)
+    series = rollups.get_series('camera', 'cam2', 'hour', start, end)
+
+    assert series[0].bucket_start >= start and series[-1].bucket_start < end
+    window = Detection.query.filter(
+        Detection.camera_id == 'cam2', Detection.detected_at >= start, Detection.detected_at < end
+    )
+    assert (sum(r.total_count for r in series), sum(r.bear_count for r in series)) == raw_counts(window)
+
+
+def test_rebuild_reproduces_incremental_rollups(app):
+    add_detections()
+    incremental = {(r.scope, r.scope_key, r.granularity, r.bucket_start): (r.total_count, r.bear_count)
+                   for r in rollups.DetectionRollup.query.all()}
+
+    assert rollups.rebuild_rollups(batch_size=64) == 200
+    rebuilt = {(r.scope, r.scope_key, r.granularity, r.bucket_start): (r.total_count, r.bear_count)
+               for r in rollups.DetectionRollup.query.all()}
+    assert rebuilt == incremental
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import requests
+
+from src.services.backends.ops import merge_overlapping
+from src.services.bear_detection import BearDetectionService
+from src.services.image_pipeline import UploadedImage
+from src.services.tiling import SlicedInference, tile_windows
+
+BEAR = {'box': {'xmin': 10, 'ymin': 10, 'xmax': 60, 'ymax': 60}, 'score': 0.9, 'label': 'bear'}
+
+
+class TileBackend:
+    """第 failing_tile 個切片推論失敗，其他切片沒有偵測到物體"""
+
+    def __init__(self, failing_tile):
+        self.failing_tile = failing_tile
+
+    def infer_batch(self, payloads):
+        return [
+            requests.exceptions.HTTPError('429 Error') if i == self.failing_tile else []
+            for i in range(len(payloads))
+        ]
+
+
+def test_merge_raises_when_any_tile_fails():
+    slicer = SlicedInference(tile_size=100, hybrid=False)
+    offsets = np.array([[0, 0], [80, 0]])
+    with pytest.raises(requests.exceptions.HTTPError):
+        slicer.merge([[BEAR], requests.exceptions.HTTPError('429 Error')], offsets)
+
+
+def test_partial_tile_failure_is_not_a_no_bear_verdict(monkeypatch):
+    monkeypatch.setenv('SLICED_INFERENCE', '1')
+    monkeypatch.setenv('BATCHING_ENABLED', '0')
+    monkeypatch.setenv('TILE_SIZE', '128')
+    detector = BearDetectionService(backend=TileBackend(failing_tile=1))
+    image = UploadedImage.from_array(np.zeros((256, 384, 3), dtype=np.uint8), 'frame.jpg', encode=False)
+
+    result = detector.detect_bear(image, annotate=False)
+
+    # 失敗的結果帶有 error，不會寫入結果快取或重複影格索引
+    assert result['success'] is False
+    assert 'error' in result
+
+
+def prediction(xmin, ymin, xmax, ymax, score=0.9, label='bear'):
+    return {'box': {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}, 'score': score, 'label': label}
+
+
+def test_tiles_cover_the_image_with_overlap():
+    windows = tile_windows(1000, 600, 400, 0.2)
+    assert windows[:, 0].min() == 0 and windows[:, 2].max() == 1000
+    assert windows[:, 1].min() == 0 and windows[:, 3].max() == 600
+    assert ((windows[:, 2] - windows[:, 0]) == 400).all()
+
+
+def test_box_cut_by_a_tile_seam_is_merged_into_one():
+    # 熊跨過 x=100 的切片邊界：左切片只看到左半部，右切片（位移 80）看到右半部，整張影像看到完整的框
+    slicer = SlicedInference(tile_size=100, hybrid=True, iou_threshold=0.5)
+    offsets = np.array([[0, 0], [80, 0], [0, 0]])
+    merged = slicer.merge([
+        [prediction(85, 20, 100, 60, score=0.6)],
+        [prediction(0, 20, 40, 60, score=0.7)],
+        [prediction(82, 18, 118, 62, score=0.9)],
+    ], offsets)
+
+    assert len(merged) == 1
+    assert merged[0]['box'] == {'xmin': 80.0, 'ymin': 18.0, 'xmax': 120.0, 'ymax': 62.0}
+    assert merged[0]['score'] == pytest.approx(0.9)
+
+
+def test_separate_bears_and_other_classes_are_not_merged():
+    boxes = np.array([[0, 0, 10, 10], [2, 2, 10, 10], [50, 50, 60, 60], [1, 1, 9, 9]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+    class_ids = np.array([0, 0, 0, 1])
+
+    merged, keep = merge_overlapping(boxes, scores, class_ids, iou_threshold=0.5)
+
+    assert sorted(keep.tolist()) == [0, 2, 3]
+    assert merged[list(keep).index(0)].tolist() == [0, 0, 10, 10]